@@ -0,0 +1,119 @@
+"""
+Per-request cost of opening database connections.
+
+Simulates requests from ``--threads`` worker threads: each one runs Django's
+``request_started`` and ``request_finished`` signals around a single query,
+as a view would. Compares a new connection per request (the
+``chatbot.settings`` default), persistent connections with health checks
+and, when psycopg 3 with ``psycopg_pool`` is installed, Django's connection
+pool, as configured by ``chatbot.settings_production``.
+
+    python -m benchmarks.db_connections --threads 16 --requests 2000
+"""
+
+import argparse
+import os
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+import django
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "chatbot.settings")
+django.setup()
+
+from django.core.signals import request_finished, request_started  # noqa: E402
+from django.db import connections  # noqa: E402
+from django.db.backends.postgresql.psycopg_any import is_psycopg3  # noqa: E402
+
+MODES = {
+    "new": {"CONN_MAX_AGE": 0, "CONN_HEALTH_CHECKS": False},
+    "persistent": {"CONN_MAX_AGE": 600, "CONN_HEALTH_CHECKS": True},
+    # Django's pool needs CONN_MAX_AGE = 0; the pool size follows --threads.
+    "pool": {"CONN_MAX_AGE": 0, "CONN_HEALTH_CHECKS": False},
+}
+
+
+def add_alias(mode: str, threads: int) -> str:
+    alias = f"bench_{mode}"
+    config = {**connections.settings["default"], **MODES[mode]}
+    if mode == "pool":
+        config["OPTIONS"] = {"pool": {"min_size": 2, "max_size": threads}}
+    connections.settings[alias] = config
+    return alias
+
+
+def request(alias: str) -> [float, int]:
+    """
+    One simulated request, returns its duration and the backend pid.
+    """
+    started = time.perf_counter()
+    request_started.send(sender=None)
+    try:
+        with connections[alias].cursor() as cursor:
+            cursor.execute("SELECT pg_backend_pid()")
+            pid = cursor.fetchone()[0]
+    finally:
+        request_finished.send(sender=None)
+    return time.perf_counter() - started, pid
+
+
+def run(alias: str, threads: int, requests: int) -> Dict:
+    durations: List[float] = []
+    pids = set()
+    lock = threading.Lock()
+
+    def worker(count: int):
+        try:
+            for _ in range(count):
+                elapsed, pid = request(alias)
+                with lock:
+                    durations.append(elapsed)
+                    pids.add(pid)
+        finally:
+            connections[alias].close()
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        share, extra = divmod(requests, threads)
+        futures = [executor.submit(worker, share + (i < extra)) for i in range(threads)]
+        for future in futures:
+            future.result()
+    elapsed = time.perf_counter() - started
+
+    if "pool" in connections[alias].settings_dict["OPTIONS"]:
+        connections[alias].close_pool()
+
+    durations.sort()
+    return {
+        "rps": len(durations) / elapsed,
+        "p50_ms": statistics.median(durations) * 1000,
+        "p95_ms": durations[int(len(durations) * 0.95) - 1] * 1000,
+        "connections": len(pids),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args()
+
+    modes = list(MODES)
+    if not is_psycopg3:
+        print("psycopg 3 is not installed, skipping the pool mode.")
+        modes.remove("pool")
+
+    print(f"{'mode':<11} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'connections':>12}")
+    for mode in modes:
+        result = run(add_alias(mode, args.threads), args.threads, args.requests)
+        print(
+            f"{mode:<11} {result['rps']:>8.0f} {result['p50_ms']:>8.2f} "
+            f"{result['p95_ms']:>8.2f} {result['connections']:>12}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,277 @@
+"""
+Local stand-in for the OpenAI Responses API.
+
+Serves ``POST /v1/responses`` (plain and ``stream=true``) with configurable
+latency, jitter, token rate and error injection, so the message endpoint can
+be load tested without paying for real OpenAI calls. Point the app at it with
+``OPENAI_BASE_URL=http://127.0.0.1:<port>/v1``.
+
+    python -m benchmarks.fake_openai --port 8001 --latency 0.3 --jitter 0.1
+"""
+
+import argparse
+import itertools
+import json
+import random
+import sys
+import threading
+import time
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List
+
+WORDS = (
+    "remote work improves focus but weakens mentoring and shared culture "
+    "so what evidence would change your mind about the trade off"
+).split()
+
+
+@dataclass
+class FakeConfig:
+    latency: float = 0.2
+    jitter: float = 0.05
+    tokens_per_second: float = 0.0
+    reply_tokens: int = 60
+    error_rate: float = 0.0
+    error_status: int = 500
+    fail_first: int = 0
+
+
+def estimate_tokens(payload) -> int:
+    return max(len(json.dumps(payload)) // 4, 1)
+
+
+def reply_words(request: Dict, config: FakeConfig) -> List[str]:
+    system = request["input"][0]["content"] if request.get("input") else ""
+    if system.startswith("Extract the topic"):
+        user = next(
+            m["content"] for m in reversed(request["input"]) if m["role"] == "user"
+        )
+        text = json.dumps(
+            {
+                "topic": " ".join(user.split()[:4]) or "und",
+                "bot_stance": "con",
+                "response": "Let's debate that, what is your strongest argument?",
+            }
+        )
+        return [text]
+
+    count = min(config.reply_tokens, request.get("max_output_tokens") or 10**6)
+    words = itertools.islice(itertools.cycle(WORDS), count)
+    return [w if i == 0 else f" {w}" for i, w in enumerate(words)]
+
+
+def response_body(request: Dict, text: str, output_tokens: int, status: str):
+    input_tokens = estimate_tokens(request.get("input", []))
+    output = []
+    if status == "completed":
+        output = [
+            {
+                "type": "message",
+                "id": "msg_fake",
+                "status": "completed",
+                "role": "assistant",
+                "content": [{"type": "output_text", "text": text, "annotations": []}],
+            }
+        ]
+    return {
+        "id": "resp_fake",
+        "object": "response",
+        "created_at": int(time.time()),
+        "status": status,
+        "model": request.get("model", "fake"),
+        "output": output,
+        "parallel_tool_calls": True,
+        "tool_choice": "auto",
+        "tools": [],
+        "usage": {
+            "input_tokens": input_tokens,
+            "input_tokens_details": {"cached_tokens": 0},
+            "output_tokens": output_tokens,
+            "output_tokens_details": {"reasoning_tokens": 0},
+            "total_tokens": input_tokens + output_tokens,
+        },
+    }
+
+
+class FakeOpenAIHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    @property
+    def config(self) -> FakeConfig:
+        return self.server.config
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        count = self.server.count_request()
+
+        if not self.path.rstrip("/").endswith("/responses"):
+            return self.send_json(404, {"error": {"message": "Not found"}})
+
+        time.sleep(self.first_byte_delay())
+
+        failing = count <= self.config.fail_first
+        if failing or random.random() < self.config.error_rate:
+            return self.send_json(
+                self.config.error_status,
+                {"error": {"message": "Injected failure", "type": "server_error"}},
+            )
+
+        words = reply_words(request, self.config)
+        if request.get("stream"):
+            return self.stream(request, words)
+
+        if self.config.tokens_per_second > 0:
+            time.sleep(len(words) / self.config.tokens_per_second)
+        text = "".join(words)
+        self.send_json(200, response_body(request, text, len(words), "completed"))
+
+    def first_byte_delay(self) -> float:
+        jitter = random.uniform(-self.config.jitter, self.config.jitter)
+        return max(self.config.latency + jitter, 0)
+
+    def send_json(self, status: int, payload: Dict):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def stream(self, request: Dict, words: List[str]):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        sequence = itertools.count()
+        self.send_event(
+            "response.created",
+            {
+                "response": response_body(request, "", 0, "in_progress"),
+                "sequence_number": next(sequence),
+            },
+        )
+        for word in words:
+            if self.config.tokens_per_second > 0:
+                time.sleep(1 / self.config.tokens_per_second)
+            self.send_event(
+                "response.output_text.delta",
+                {
+                    "item_id": "msg_fake",
+                    "output_index": 0,
+                    "content_index": 0,
+                    "delta": word,
+                    "logprobs": [],
+                    "sequence_number": next(sequence),
+                },
+            )
+        self.send_event(
+            "response.completed",
+            {
+                "response": response_body(
+                    request, "".join(words), len(words), "completed"
+                ),
+                "sequence_number": next(sequence),
+            },
+        )
+        self.wfile.write(b"0\r\n\r\n")
+
+    def send_event(self, event: str, data: Dict):
+        payload = json.dumps({"type": event, **data})
+        chunk = f"event: {event}\ndata: {payload}\n\n".encode()
+        self.wfile.write(f"{len(chunk):x}\r\n".encode() + chunk + b"\r\n")
+        self.wfile.flush()
+
+
+class FakeOpenAIServer(ThreadingHTTPServer):
+    """
+    Threaded fake server; ``config`` can be changed while it runs
+    """
+
+    daemon_threads = True
+
+    def __init__(self, config: FakeConfig = None, host="127.0.0.1", port=0):
+        super().__init__((host, port), FakeOpenAIHandler)
+        self.config = config or FakeConfig()
+        self.requests = 0
+        self.lock = threading.Lock()
+
+    def handle_error(self, request, client_address):
+        # Clients giving up on slow replies is expected, e.g. timeout tests.
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+    def count_request(self) -> int:
+        with self.lock:
+            self.requests += 1
+            return self.requests
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self) -> "FakeOpenAIServer":
+        threading.Thread(
+            target=self.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True
+        ).start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+def add_config_arguments(parser: argparse.ArgumentParser):
+    defaults = FakeConfig()
+    parser.add_argument("--latency", type=float, default=defaults.latency)
+    parser.add_argument("--jitter", type=float, default=defaults.jitter)
+    parser.add_argument(
+        "--tokens-per-second", type=float, default=defaults.tokens_per_second
+    )
+    parser.add_argument("--reply-tokens", type=int, default=defaults.reply_tokens)
+    parser.add_argument("--error-rate", type=float, default=defaults.error_rate)
+    parser.add_argument("--error-status", type=int, default=defaults.error_status)
+    parser.add_argument(
+        "--fail-first",
+        type=int,
+        default=defaults.fail_first,
+        help="Fail the first N requests with --error-status",
+    )
+
+
+def config_from_arguments(args) -> FakeConfig:
+    return FakeConfig(
+        latency=args.latency,
+        jitter=args.jitter,
+        tokens_per_second=args.tokens_per_second,
+        reply_tokens=args.reply_tokens,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+        fail_first=args.fail_first,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    add_config_arguments(parser)
+    args = parser.parse_args()
+
+    server = FakeOpenAIServer(config_from_arguments(args), args.host, args.port)
+    print(f"Fake OpenAI listening on {server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,316 @@
+"""
+Load driver for ``POST /conversation/message``.
+
+Runs the new-conversation and continued-conversation scenarios in process
+(through Django's test client, against the configured database) at each
+concurrency level, with OpenAI replaced by ``benchmarks.fake_openai``. Reports
+latency percentiles and histogram, request rate and DB queries per request,
+stores the results in ``benchmarks/results/`` keyed by git commit and compares
+them with the previous run.
+
+    python -m benchmarks.load --concurrency 1,8,32 --requests 200
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import django
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "chatbot.settings")
+django.setup()
+
+from django.conf import settings  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.test import Client  # noqa: E402
+
+import lms  # noqa: E402
+from benchmarks.fake_openai import (  # noqa: E402
+    FakeOpenAIServer,
+    add_config_arguments,
+    config_from_arguments,
+)
+from conversation.models import Conversation  # noqa: E402
+
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+HISTOGRAM_BUCKETS_MS = [5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000]
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class Scenario:
+    """
+    A scenario posts ``requests`` messages from ``concurrency`` workers
+    """
+
+    name = None
+
+    def __init__(self, path: str, concurrency: int):
+        self.path = path
+        self.concurrency = concurrency
+        self.created = []
+        self.lock = threading.Lock()
+
+    def setup(self):
+        pass
+
+    def payload(self, worker: int) -> Dict:
+        raise NotImplementedError
+
+    def record(self, response):
+        if response.status_code == 201:
+            with self.lock:
+                self.created.append(response.json()["conversation_id"])
+
+    def cleanup(self):
+        Conversation.objects.filter(conversation_id__in=self.created).delete()
+
+
+class NewConversation(Scenario):
+    name = "new"
+
+    def payload(self, worker: int) -> Dict:
+        return {"conversation_id": None, "message": "Remote work is better"}
+
+
+class ContinuedConversation(Scenario):
+    """
+    Each worker talks to its own conversation, so turns never conflict
+    """
+
+    name = "continued"
+
+    def setup(self):
+        self.conversations = [
+            str(
+                Conversation.objects.create(
+                    topic="remote work", stance="con"
+                ).conversation_id
+            )
+            for _ in range(self.concurrency)
+        ]
+        self.created.extend(self.conversations)
+
+    def payload(self, worker: int) -> Dict:
+        return {
+            "conversation_id": self.conversations[worker],
+            "message": "But commuting wastes hours every week",
+        }
+
+    def record(self, response):
+        pass
+
+
+SCENARIOS = {s.name: s for s in (NewConversation, ContinuedConversation)}
+
+
+def percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    index = min(int(round(pct / 100 * (len(ordered) - 1))), len(ordered) - 1)
+    return ordered[index]
+
+
+def histogram(latencies_ms: List[float]) -> Dict[str, int]:
+    buckets = {f"le_{b}": 0 for b in HISTOGRAM_BUCKETS_MS}
+    buckets["le_inf"] = 0
+    for value in latencies_ms:
+        for bound in HISTOGRAM_BUCKETS_MS:
+            if value <= bound:
+                buckets[f"le_{bound}"] += 1
+                break
+        else:
+            buckets["le_inf"] += 1
+    return buckets
+
+
+def run_scenario(scenario: Scenario, total_requests: int) -> Dict:
+    scenario.setup()
+    connection.close()
+    per_worker = [
+        total_requests // scenario.concurrency
+        + (1 if i < total_requests % scenario.concurrency else 0)
+        for i in range(scenario.concurrency)
+    ]
+
+    def worker(index: int):
+        client = Client(HTTP_HOST="localhost")
+        samples = []
+        for _ in range(per_worker[index]):
+            counter = QueryCounter()
+            started = time.perf_counter()
+            with connection.execute_wrapper(counter):
+                response = client.post(
+                    scenario.path,
+                    scenario.payload(index),
+                    content_type="application/json",
+                )
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            scenario.record(response)
+            samples.append((elapsed_ms, response.status_code, counter.count))
+        connection.close()
+        return samples
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=scenario.concurrency) as pool:
+        results = list(pool.map(worker, range(scenario.concurrency)))
+    wall = time.perf_counter() - started
+
+    samples = [sample for worker_samples in results for sample in worker_samples]
+    ok = [s for s in samples if s[1] == 201]
+    latencies = [s[0] for s in ok] or [0.0]
+    scenario.cleanup()
+
+    return {
+        "scenario": scenario.name,
+        "concurrency": scenario.concurrency,
+        "requests": len(samples),
+        "errors": len(samples) - len(ok),
+        "rps": round(len(samples) / wall, 2),
+        "latency_ms": {
+            "p50": round(percentile(latencies, 50), 2),
+            "p90": round(percentile(latencies, 90), 2),
+            "p99": round(percentile(latencies, 99), 2),
+            "mean": round(statistics.fmean(latencies), 2),
+            "max": round(max(latencies), 2),
+        },
+        "histogram_ms": histogram(latencies),
+        "queries_per_request": round(
+            statistics.fmean([s[2] for s in ok]) if ok else 0, 2
+        ),
+    }
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def store(report: Dict) -> Path:
+    RESULTS_DIR.mkdir(exist_ok=True)
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S")
+    path = RESULTS_DIR / f"{stamp}-{report['commit']}.json"
+    path.write_text(json.dumps(report, indent=2))
+    return path
+
+
+def previous_result(current: Path) -> Optional[Path]:
+    results = sorted(p for p in RESULTS_DIR.glob("*.json") if p != current)
+    return results[-1] if results else None
+
+
+def print_report(report: Dict, baseline: Optional[Dict]):
+    previous = {}
+    if baseline:
+        previous = {(r["scenario"], r["concurrency"]): r for r in baseline["runs"]}
+        print(f"Compared with {baseline['commit']} ({baseline['created_at']})")
+
+    header = (
+        f"{'scenario':<10} {'conc':>5} {'req':>6} {'err':>5} {'rps':>8} "
+        f"{'p50':>9} {'p90':>9} {'p99':>9} {'queries':>8}"
+    )
+    print(header)
+    for run in report["runs"]:
+        latency = run["latency_ms"]
+        print(
+            f"{run['scenario']:<10} {run['concurrency']:>5} {run['requests']:>6} "
+            f"{run['errors']:>5} {run['rps']:>8} {latency['p50']:>9} "
+            f"{latency['p90']:>9} {latency['p99']:>9} "
+            f"{run['queries_per_request']:>8}"
+        )
+        before = previous.get((run["scenario"], run["concurrency"]))
+        if before:
+            print(
+                f"{'':<10} {'':>5} {'':>6} {'':>5} "
+                f"{delta(run['rps'], before['rps']):>8} "
+                f"{delta(latency['p50'], before['latency_ms']['p50']):>9} "
+                f"{delta(latency['p90'], before['latency_ms']['p90']):>9} "
+                f"{delta(latency['p99'], before['latency_ms']['p99']):>9} "
+                f"{delta(run['queries_per_request'], before['queries_per_request']):>8}"
+            )
+
+
+def delta(current: float, before: float) -> str:
+    if not before:
+        return "n/a"
+    return f"{(current - before) / before * 100:+.1f}%"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--scenario", choices=[*SCENARIOS, "all"], default="all", help="Scenario"
+    )
+    parser.add_argument("--concurrency", default="1,8,32")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--path", default="/conversation/message")
+    parser.add_argument(
+        "--base-url", help="Use a running fake server instead of starting one"
+    )
+    parser.add_argument("--no-store", action="store_true")
+    add_config_arguments(parser)
+    args = parser.parse_args()
+
+    server = None
+    fake_config = config_from_arguments(args)
+    if args.base_url:
+        settings.OPENAI_BASE_URL = args.base_url
+    else:
+        server = FakeOpenAIServer(fake_config).start()
+        settings.OPENAI_BASE_URL = server.base_url
+    lms.reset_clients()
+
+    scenarios = list(SCENARIOS) if args.scenario == "all" else [args.scenario]
+    levels = [int(level) for level in args.concurrency.split(",")]
+    report = {
+        "commit": git_commit(),
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "path": args.path,
+        "fake_openai": None if args.base_url else asdict(fake_config),
+        "runs": [],
+    }
+    try:
+        for name in scenarios:
+            for level in levels:
+                scenario = SCENARIOS[name](args.path, level)
+                report["runs"].append(run_scenario(scenario, args.requests))
+    finally:
+        if server:
+            server.stop()
+
+    baseline = None
+    if not args.no_store:
+        path = store(report)
+        print(f"Results stored in {path}")
+        previous = previous_result(path)
+        if previous:
+            baseline = json.loads(previous.read_text())
+
+    print(f"Connection pool: {lms.pool.stats.snapshot()}")
+    print_report(report, baseline)
+
+
+if __name__ == "__main__":
+    main()
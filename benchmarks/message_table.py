@@ -0,0 +1,135 @@
+"""
+Insert throughput and index size of the ``message`` table layouts.
+
+Seeds scratch copies of the table on the configured PostgreSQL database with
+messages interleaved across conversations, as turns arrive in production, and
+compares random (uuid4) with time-ordered (uuid7) primary keys under the
+legacy index set and the current one.
+
+    python -m benchmarks.message_table --rows 200000 --conversations 5000
+"""
+
+import argparse
+import os
+import random
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import django
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "chatbot.settings")
+django.setup()
+
+from django.db import connection  # noqa: E402
+
+from conversation.utils import uuid7  # noqa: E402
+
+TABLE = "bench_message"
+
+LAYOUTS = {
+    "legacy": [
+        "(conversation_id)",
+        "(role)",
+        "(created_at)",
+        "(conversation_id, created_at)",
+    ],
+    "current": ["(conversation_id, created_at, message_id) INCLUDE (role)"],
+}
+
+KEYS = {"uuid4": uuid.uuid4, "uuid7": uuid7}
+
+INSERT = f"""
+    INSERT INTO {TABLE}
+        (message_id, conversation_id, role, message, created_at, updated_at)
+    SELECT * FROM UNNEST(
+        %s::uuid[], %s::uuid[], %s::varchar(10)[], %s::text[],
+        %s::timestamptz[], %s::timestamptz[]
+    )
+"""
+
+
+def create_table(layout: str):
+    with connection.cursor() as cursor:
+        cursor.execute(f"DROP TABLE IF EXISTS {TABLE}")
+        cursor.execute(
+            f"""
+            CREATE UNLOGGED TABLE {TABLE} (
+                message_id uuid PRIMARY KEY,
+                conversation_id uuid NOT NULL,
+                role varchar(10) NOT NULL,
+                message text NOT NULL,
+                created_at timestamptz NOT NULL,
+                updated_at timestamptz NOT NULL
+            )
+            """
+        )
+        for i, columns in enumerate(LAYOUTS[layout]):
+            cursor.execute(f"CREATE INDEX {TABLE}_{i} ON {TABLE} {columns}")
+
+
+def seed(key, rows: int, conversations: int, batch_size: int) -> float:
+    """
+    Insert ``rows`` messages and return the elapsed seconds
+    """
+    conversation_ids = [key() for _ in range(conversations)]
+    start = datetime.now(timezone.utc)
+    elapsed = 0.0
+    for offset in range(0, rows, batch_size):
+        count = min(batch_size, rows - offset)
+        created = [start + timedelta(milliseconds=offset + i) for i in range(count)]
+        batch = (
+            [str(key()) for _ in range(count)],
+            [str(random.choice(conversation_ids)) for _ in range(count)],
+            [random.choice(("user", "system")) for _ in range(count)],
+            ["Remote work improves focus but weakens mentoring."] * count,
+            created,
+            created,
+        )
+        began = time.perf_counter()
+        with connection.cursor() as cursor:
+            cursor.execute(INSERT, batch)
+        elapsed += time.perf_counter() - began
+    return elapsed
+
+
+def index_sizes() -> dict:
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            SELECT pg_relation_size('{TABLE}_pkey'),
+                   pg_indexes_size('{TABLE}')
+            """
+        )
+        primary_key, total = cursor.fetchone()
+    return {"pkey_mb": primary_key / 2**20, "indexes_mb": total / 2**20}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=200000)
+    parser.add_argument("--conversations", type=int, default=5000)
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+
+    if connection.vendor != "postgresql":
+        parser.error("index sizes are only measured on PostgreSQL")
+
+    print(f"{'layout':<8} {'keys':<6} {'rows/s':>10} {'pkey MB':>9} {'indexes MB':>11}")
+    try:
+        for layout in LAYOUTS:
+            for name, key in KEYS.items():
+                create_table(layout)
+                elapsed = seed(key, args.rows, args.conversations, args.batch_size)
+                sizes = index_sizes()
+                print(
+                    f"{layout:<8} {name:<6} {args.rows / elapsed:>10.0f} "
+                    f"{sizes['pkey_mb']:>9.1f} {sizes['indexes_mb']:>11.1f}"
+                )
+    finally:
+        with connection.cursor() as cursor:
+            cursor.execute(f"DROP TABLE IF EXISTS {TABLE}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Latency of debate replies routed across backends of different speeds.
+
+Sends ``--requests`` replies from ``--threads`` threads through an
+``OpenAIClient`` over ``LocalBackend`` instances, one per ``--latencies``
+value, and reports the requests each backend served and the latency
+percentiles. Halfway through, the first backend becomes ``--degrade`` times
+slower. Runs once with the latency-aware router and once choosing a random
+backend per attempt (``explore=1``) for comparison.
+
+    python -m benchmarks.router --latencies 0.02,0.05,0.1 --requests 600
+"""
+
+import argparse
+import os
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+import django
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "chatbot.settings")
+django.setup()
+
+from lms import OpenAIClient  # noqa: E402
+from lms.backends import LocalBackend  # noqa: E402
+from lms.policy import CircuitBreaker, LatencyPolicy  # noqa: E402
+from lms.router import Router  # noqa: E402
+
+
+def run(
+    latencies: List[float], explore: float, requests: int, threads: int, degrade: float
+) -> Dict:
+    backends = [
+        LocalBackend(f"backend-{i}", latency=latency)
+        for i, latency in enumerate(latencies)
+    ]
+    router = Router(backends, explore=explore)
+    policy = LatencyPolicy(
+        deadline=30,
+        attempt_timeout=10,
+        connect_timeout=1,
+        max_retries=2,
+        backoff=0.01,
+        backoff_max=0.1,
+        hedge_percentile=0,
+        hedge_min_samples=1,
+        breaker=CircuitBreaker(0, 30),
+    )
+    client = OpenAIClient(policy=policy, router=router)
+    served = {backend.name: 0 for backend in backends}
+    lock = threading.Lock()
+    original = router.acquire
+
+    def acquire(operation):
+        state = original(operation)
+        with lock:
+            served[state.backend.name] += 1
+        return state
+
+    router.acquire = acquire
+
+    def reply(i: int) -> float:
+        if i == requests // 2:
+            backends[0].latency *= degrade
+        started = time.perf_counter()
+        client.debate_reply("Remote work", "con", [], f"Argument {i}")
+        return time.perf_counter() - started
+
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        timings = sorted(executor.map(reply, range(requests)))
+    return {
+        "served": served,
+        "p50": statistics.median(timings) * 1000,
+        "p95": timings[int(len(timings) * 0.95) - 1] * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--latencies", default="0.02,0.05,0.1")
+    parser.add_argument("--requests", type=int, default=600)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--degrade", type=float, default=10)
+    parser.add_argument("--explore", type=float, default=0.05)
+    args = parser.parse_args()
+
+    latencies = [float(value) for value in args.latencies.split(",")]
+    for label, explore in (("router", args.explore), ("random", 1.0)):
+        result = run(latencies, explore, args.requests, args.threads, args.degrade)
+        served = ", ".join(f"{name}={n}" for name, n in result["served"].items())
+        print(
+            f"{label:<7} p50 {result['p50']:>6.1f} ms  "
+            f"p95 {result['p95']:>6.1f} ms  {served}"
+        )
+
+
+if __name__ == "__main__":
+    main()
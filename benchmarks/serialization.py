@@ -0,0 +1,108 @@
+"""
+Per-request cost of parsing, validating and rendering the message API body.
+
+Times each step of ``POST /conversation/message`` outside the database and
+OpenAI phases, through the DRF serializers, parser and renderer
+(``FAST_SERIALIZATION=0``) and through the fast path, and checks that both
+produce the same bytes.
+
+    python -m benchmarks.serialization --number 20000
+"""
+
+import argparse
+import io
+import json
+import os
+import timeit
+from datetime import datetime, timedelta, timezone
+
+import django
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "chatbot.settings")
+django.setup()
+
+from django.test import override_settings  # noqa: E402
+from rest_framework.parsers import JSONParser  # noqa: E402
+from rest_framework.renderers import JSONRenderer  # noqa: E402
+
+from chatbot import fastjson  # noqa: E402
+from conversation.models import Conversation, Message  # noqa: E402
+from conversation.serializer import (  # noqa: E402
+    ConversationResponseSerializer,
+    validate_message_request,
+)
+
+BODY = json.dumps(
+    {
+        "conversation_id": "0190b4e1-7a62-7b3c-8d2f-6f1f4b1f3a11",
+        "message": "Remote work makes teams less productive, don't you think?",
+    }
+).encode()
+
+
+def conversation_with_window(size: int) -> Conversation:
+    conversation = Conversation(topic="Remote work", stance="con")
+    started = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    for i in range(size):
+        message = Message(
+            conversation=conversation,
+            role=Message.Role.SYSTEM if i % 2 else Message.Role.USER,
+            message=f"Argument {i}: " + "remote work " * 30,
+            created_at=started + timedelta(seconds=i),
+        )
+        conversation.push_recent_messages(message)
+    return conversation
+
+
+def steps(parser, renderer, conversation):
+    def parse():
+        return parser.parse(io.BytesIO(BODY))
+
+    def validate():
+        return validate_message_request(parse())
+
+    def render():
+        return renderer.render(ConversationResponseSerializer.build(conversation))
+
+    def request():
+        validate()
+        return render()
+
+    return {"parse": parse, "validate": validate, "render": render, "all": request}
+
+
+def measure(fast: bool, number: int, conversation) -> dict:
+    parser = fastjson.FastJSONParser() if fast else JSONParser()
+    renderer = fastjson.FastJSONRenderer() if fast else JSONRenderer()
+    with override_settings(FAST_SERIALIZATION=fast):
+        timings = {
+            name: min(timeit.repeat(step, number=number, repeat=3)) / number * 1e6
+            for name, step in steps(parser, renderer, conversation).items()
+        }
+        timings["body"] = steps(parser, renderer, conversation)["all"]()
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--number", type=int, default=20000)
+    parser.add_argument("--window", type=int, default=20)
+    args = parser.parse_args()
+
+    conversation = conversation_with_window(args.window)
+    drf = measure(False, args.number, conversation)
+    fast = measure(True, args.number, conversation)
+    if drf["body"] != fast["body"]:
+        raise SystemExit("The fast path rendered a different body.")
+
+    backend = "orjson" if fastjson.orjson else "json"
+    print(f"{'step':<10} {'drf us':>8} {f'fast ({backend}) us':>18} {'speedup':>8}")
+    for name in ("parse", "validate", "render", "all"):
+        print(
+            f"{name:<10} {drf[name]:>8.1f} {fast[name]:>18.1f} "
+            f"{drf[name] / fast[name]:>7.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
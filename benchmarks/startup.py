@@ -0,0 +1,93 @@
+"""
+Import cost of starting the app, from ``python -X importtime``.
+
+Each run is a fresh interpreter that sets Django up and loads the URL
+configuration, as a worker does before serving its first request. Reports
+the total import time (best of ``--runs``) and the slowest top-level
+imports for each settings module. Modules loaded with
+``importlib.import_module`` (settings, app configs, URL modules) get no line
+of their own; the imports they run do.
+
+    python -m benchmarks.startup --runs 5
+"""
+
+import argparse
+import os
+import re
+import subprocess
+import sys
+from typing import Dict, List
+
+STARTUP = (
+    "import sys, django; django.setup(); "
+    "from django.urls import get_resolver; get_resolver().url_patterns; "
+    "print(*sys.modules, sep='\\n')"
+)
+
+# import time: <self us> | <cumulative us> | <indented module name>
+LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def import_times(settings_module: str) -> Dict:
+    """
+    One startup under ``settings_module``: the total import time in ms, the
+    modules imported and the cumulative ms of each top-level import.
+    """
+    env = {
+        **os.environ,
+        "DJANGO_SETTINGS_MODULE": settings_module,
+        "DJANGO_SECRET_KEY": os.getenv("DJANGO_SECRET_KEY", "startup-benchmark"),
+    }
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", STARTUP],
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    total, top_level = 0, {}
+    for line in result.stderr.splitlines():
+        match = LINE.match(line)
+        if not match:
+            continue
+        own, cumulative, indent, name = match.groups()
+        total += int(own)
+        if len(indent) == 1:
+            top_level[name] = int(cumulative) / 1000
+    return {
+        "total_ms": total / 1000,
+        "modules": set(result.stdout.split()),
+        "top_level": top_level,
+    }
+
+
+def best_of(settings_module: str, runs: int) -> Dict:
+    return min(
+        (import_times(settings_module) for _ in range(runs)),
+        key=lambda result: result["total_ms"],
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument(
+        "--settings",
+        default="chatbot.settings,chatbot.settings_production",
+        help="Comma-separated settings modules",
+    )
+    args = parser.parse_args()
+
+    settings_modules: List[str] = args.settings.split(",")
+    for settings_module in settings_modules:
+        result = best_of(settings_module, args.runs)
+        print(f"{settings_module}: {result['total_ms']:.0f} ms")
+        slowest = sorted(result["top_level"].items(), key=lambda item: -item[1])
+        for name, cumulative in slowest[: args.top]:
+            print(f"  {cumulative:>8.1f} ms  {name}")
+
+
+if __name__ == "__main__":
+    main()
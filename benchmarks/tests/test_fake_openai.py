@@ -0,0 +1,48 @@
+import asyncio
+
+import httpx
+import pytest
+
+from benchmarks.fake_openai import FakeConfig, FakeOpenAIServer
+from lms import AsyncOpenAIClient, OpenAIClient
+
+
+@pytest.fixture
+def server(settings):
+    server = FakeOpenAIServer(FakeConfig(latency=0, jitter=0, reply_tokens=5))
+    server.start()
+    settings.OPENAI_BASE_URL = server.base_url
+    yield server
+    server.stop()
+
+
+def test_openai_client_talks_to_fake_server(server):
+    client = OpenAIClient()
+
+    topic, stance, response = client.get_topic_and_stance("Remote work is better")
+    reply = client.debate_reply(topic, stance, [], "Commutes are a waste")
+
+    assert topic == "Remote work is better"
+    assert stance == "con"
+    assert response
+    assert reply == "remote work improves focus but"
+    assert server.requests == 2
+
+
+def test_async_client_streams_from_fake_server(server):
+    client = AsyncOpenAIClient()
+
+    async def collect():
+        return [d async for d in client.stream_debate_reply("AI", "pro", [], "Hi")]
+
+    assert "".join(asyncio.run(collect())) == "remote work improves focus but"
+
+
+def test_error_injection(server):
+    server.config.error_rate = 1.0
+    server.config.error_status = 503
+
+    resp = httpx.post(f"{server.base_url}/responses", json={"input": []})
+
+    assert resp.status_code == 503
+    assert resp.json()["error"]["message"] == "Injected failure"
@@ -0,0 +1,107 @@
+"""
+Drop-in ``JSONRenderer`` and ``JSONParser`` for the message API.
+
+Both produce exactly what DRF's classes produce, through ``orjson`` (in
+requirements.txt) and through the standard library when it is missing.
+Anything the fast path cannot handle identically (indented output, charsets
+other than UTF-8, integers of 19 digits or more, invalid JSON) is handed to
+the DRF class, which also builds the error messages. They are meant for
+bodies of strings, integers, lists and dicts: orjson writes float exponents
+differently (``1e16`` instead of ``1e+16``).
+
+``FAST_SERIALIZATION=0`` turns the fast path off.
+"""
+
+import io
+import json
+import re
+
+from django.conf import settings
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils import encoders
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# DRF escapes the JavaScript line terminators, which JSON allows unescaped.
+LINE_SEPARATORS = (
+    ("\u2028".encode(), b"\\u2028"),
+    ("\u2029".encode(), b"\\u2029"),
+)
+
+# orjson reads integers beyond 64 bits as floats, the standard library keeps
+# them exact.
+LONG_NUMBER = re.compile(rb"\d{19}")
+
+encoder = encoders.JSONEncoder(
+    ensure_ascii=False, allow_nan=False, separators=(",", ":")
+)
+
+
+def loads(body: bytes):
+    """
+    ``json.loads`` for request bodies, through orjson when it gives the same
+    result.
+    """
+    if orjson is not None and settings.FAST_SERIALIZATION:
+        if not LONG_NUMBER.search(body):
+            try:
+                return orjson.loads(body)
+            except orjson.JSONDecodeError:
+                pass
+    return json.loads(body)
+
+
+class FastJSONRenderer(JSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (
+            not settings.FAST_SERIALIZATION
+            or self.ensure_ascii
+            or not self.compact
+            or not self.strict
+            or self.get_indent(accepted_media_type, renderer_context or {})
+        ):
+            return super().render(data, accepted_media_type, renderer_context)
+        if data is None:
+            return b""
+
+        if orjson is None:
+            ret = encoder.encode(data).encode()
+        else:
+            try:
+                ret = orjson.dumps(
+                    data,
+                    default=encoder.default,
+                    option=orjson.OPT_PASSTHROUGH_DATETIME,
+                )
+            except TypeError:
+                return super().render(data, accepted_media_type, renderer_context)
+
+        for separator, escaped in LINE_SEPARATORS:
+            if separator in ret:
+                ret = ret.replace(separator, escaped)
+        return ret
+
+
+class FastJSONParser(JSONParser):
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get("encoding", settings.DEFAULT_CHARSET)
+        if (
+            orjson is None
+            or not settings.FAST_SERIALIZATION
+            or not self.strict
+            or encoding.lower() not in ("utf-8", "utf8")
+        ):
+            return super().parse(stream, media_type, parser_context)
+
+        body = stream.read()
+        if not LONG_NUMBER.search(body):
+            try:
+                return orjson.loads(body)
+            except orjson.JSONDecodeError:
+                pass
+        return super().parse(io.BytesIO(body), media_type, parser_context)
@@ -0,0 +1,443 @@
+"""
+In-process metrics in the Prometheus text format.
+
+Per-request timings live in a context variable, so they follow a request
+through async views and ``sync_to_async`` calls. ``MetricsMiddleware`` turns
+them into a ``Server-Timing`` header, and every measurement also feeds the
+process-wide histograms and counters served on ``/metrics``.
+
+With several worker processes, set ``METRICS_DIR`` to a directory they share:
+each process writes its values there every ``METRICS_FLUSH_INTERVAL``
+seconds, and ``/metrics`` adds up the files of all of them. Counters and
+histograms of exited processes keep counting, so totals never go back;
+gauges only count the processes still running. Without it, each process
+exposes its own numbers.
+"""
+
+import atexit
+import glob
+import json
+import math
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from django.conf import settings
+from django.db.backends.signals import connection_created
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+QUERY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1)
+
+
+class Metric:
+    kind = None
+    # Whether the values of an exited process still count.
+    cumulative = True
+
+    def __init__(self, name: str, help_text: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = labelnames
+        self.lock = threading.Lock()
+        registry.append(self)
+
+    def key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def label_text(self, key: Tuple[str, ...], extra: str = "") -> str:
+        pairs = [f'{n}="{escape(v)}"' for n, v in zip(self.labelnames, key)]
+        if extra:
+            pairs.append(extra)
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+    def render(self, values: Optional[Dict] = None) -> List[str]:
+        """
+        Text of ``values``, by default this process's
+        """
+        lines = [
+            f"# HELP {self.name} {self.help_text}",
+            f"# TYPE {self.name} {self.kind}",
+        ]
+        return lines + self.samples(self.snapshot() if values is None else values)
+
+    def snapshot(self) -> Dict[Tuple[str, ...], object]:
+        raise NotImplementedError
+
+    def merge(self, total: Dict, values: Dict):
+        for key, value in values.items():
+            total[key] = total.get(key, 0) + value
+
+    def samples(self, values: Dict) -> List[str]:
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.values = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self.key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        with self.lock:
+            return self.values.get(self.key(labels), 0)
+
+    def snapshot(self) -> Dict[Tuple[str, ...], float]:
+        with self.lock:
+            return dict(self.values)
+
+    def samples(self, values: Dict) -> List[str]:
+        return [
+            f"{self.name}{self.label_text(k)} {number(v)}"
+            for k, v in sorted(values.items())
+        ]
+
+    def clear(self):
+        with self.lock:
+            self.values.clear()
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, *args, buckets=LATENCY_BUCKETS, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.buckets = tuple(buckets)
+        # labels -> [count per bucket, sum, count]
+        self.values = {}
+
+    def observe(self, value: float, **labels):
+        key = self.key(labels)
+        with self.lock:
+            series = self.values.setdefault(key, [[0] * len(self.buckets), 0.0, 0])
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+            series[1] += value
+            series[2] += 1
+
+    def count(self, **labels) -> int:
+        with self.lock:
+            return self.values.get(self.key(labels), [None, 0.0, 0])[2]
+
+    def snapshot(self) -> Dict[Tuple[str, ...], List]:
+        with self.lock:
+            return {k: [list(b), s, c] for k, (b, s, c) in self.values.items()}
+
+    def merge(self, total: Dict, values: Dict):
+        for key, (buckets, value_sum, count) in values.items():
+            series = total.setdefault(key, [[0] * len(self.buckets), 0.0, 0])
+            series[0] = [a + b for a, b in zip(series[0], buckets)]
+            series[1] += value_sum
+            series[2] += count
+
+    def samples(self, values: Dict) -> List[str]:
+        lines = []
+        for key, (buckets, total, count) in sorted(values.items()):
+            for bound, in_bucket in zip(self.buckets, buckets):
+                le = self.label_text(key, f'le="{number(bound)}"')
+                lines.append(f"{self.name}_bucket{le} {in_bucket}")
+            inf = self.label_text(key, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{inf} {count}")
+            lines.append(f"{self.name}_sum{self.label_text(key)} {number(total)}")
+            lines.append(f"{self.name}_count{self.label_text(key)} {count}")
+        return lines
+
+    def clear(self):
+        with self.lock:
+            self.values.clear()
+
+
+class Gauges(Metric):
+    """
+    Gauges read from ``collect()`` at scrape time, one per returned key.
+    """
+
+    kind = "gauge"
+    cumulative = False
+
+    def __init__(self, *args, collect: Callable[[], Dict[str, float]], **kwargs):
+        super().__init__(*args, **kwargs)
+        self.collect = collect
+
+    def snapshot(self) -> Dict[Tuple[str, ...], float]:
+        return {(key,): value for key, value in self.collect().items()}
+
+    def samples(self, values: Dict) -> List[str]:
+        return [
+            f"{self.name}{self.label_text(key)} {number(value)}"
+            for key, value in sorted(values.items())
+        ]
+
+    def clear(self):
+        pass
+
+
+def escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def number(value: float) -> str:
+    if isinstance(value, float) and math.isinf(value):
+        return "+Inf"
+    return repr(value)
+
+
+registry: List[Metric] = []
+
+requests = Histogram(
+    "chatbot_http_request_duration_seconds",
+    "HTTP request latency.",
+    ("method", "view", "status"),
+)
+phases = Histogram(
+    "chatbot_request_phase_duration_seconds",
+    "Time spent per request in each phase (db, openai, serialize).",
+    ("phase", "view"),
+)
+db_queries = Histogram(
+    "chatbot_db_query_duration_seconds",
+    "Database query latency.",
+    buckets=QUERY_BUCKETS,
+)
+openai_requests = Histogram(
+    "chatbot_openai_request_duration_seconds",
+    "OpenAI Responses API call latency.",
+    ("operation",),
+)
+openai_errors = Counter(
+    "chatbot_openai_errors_total",
+    "OpenAI Responses API calls that raised.",
+    ("operation",),
+)
+openai_tokens = Counter(
+    "chatbot_openai_tokens_total",
+    "Tokens reported in the Responses API usage field.",
+    ("operation", "kind"),
+)
+
+
+class RequestTimings:
+    """
+    Durations and counts of one request, keyed by phase.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.durations: Dict[str, float] = {}
+        self.counts: Dict[str, int] = {}
+
+    def add(self, phase: str, seconds: float):
+        with self.lock:
+            self.durations[phase] = self.durations.get(phase, 0.0) + seconds
+            self.counts[phase] = self.counts.get(phase, 0) + 1
+
+    def server_timing(self, total: float) -> str:
+        with self.lock:
+            entries = [
+                f'{phase};dur={seconds * 1000:.1f};desc="{self.counts[phase]}x"'
+                for phase, seconds in self.durations.items()
+            ]
+        return ", ".join(entries + [f"total;dur={total * 1000:.1f}"])
+
+
+current: ContextVar[Optional[RequestTimings]] = ContextVar(
+    "request_timings", default=None
+)
+
+
+def record(phase: str, seconds: float):
+    timings = current.get()
+    if timings is not None:
+        timings.add(phase, seconds)
+
+
+@contextmanager
+def timed(phase: str) -> Iterator[None]:
+    """
+    Time the block as ``phase`` of the current request.
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(phase, time.perf_counter() - started)
+
+
+@contextmanager
+def openai_call(operation: str) -> Iterator[None]:
+    """
+    Time an OpenAI call; ``operation`` is the ``OpenAIClient`` method name.
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        openai_errors.inc(operation=operation)
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        record(f"openai.{operation}", elapsed)
+        openai_requests.observe(elapsed, operation=operation)
+
+
+def record_usage(operation: str, usage):
+    """
+    Count the tokens of a Responses API ``usage`` object.
+    """
+    if usage is None:
+        return
+    openai_tokens.inc(int(usage.input_tokens or 0), operation=operation, kind="input")
+    openai_tokens.inc(int(usage.output_tokens or 0), operation=operation, kind="output")
+
+
+def db_wrapper(execute, sql, params, many, context):
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        elapsed = time.perf_counter() - started
+        db_queries.observe(elapsed)
+        record("db", elapsed)
+
+
+def instrument_connection(connection, **kwargs):
+    if db_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(db_wrapper)
+
+
+connection_created.connect(instrument_connection, dispatch_uid="chatbot.metrics")
+
+
+def render() -> str:
+    """
+    All metrics in the Prometheus text format, added up over the processes
+    sharing ``METRICS_DIR`` when it is set.
+    """
+    totals = aggregate(settings.METRICS_DIR) if settings.METRICS_DIR else {}
+    return (
+        "\n".join(
+            line
+            for metric in registry
+            for line in metric.render(totals.get(metric.name))
+        )
+        + "\n"
+    )
+
+
+_process_name: Tuple[int, str] = (0, "")
+_flusher_pid = 0
+_flusher_lock = threading.Lock()
+
+
+def process_file(directory: str) -> str:
+    """
+    This process's file in ``directory``. The name is unique per process, so
+    a new process reusing the pid of an exited one does not overwrite it.
+    """
+    global _process_name
+    pid, name = _process_name
+    if pid != os.getpid():
+        name = f"{os.getpid()}-{uuid.uuid4().hex}.json"
+        _process_name = (os.getpid(), name)
+    return os.path.join(directory, name)
+
+
+def flush(directory: str):
+    """
+    Write this process's values to its file in ``directory``.
+    """
+    data = {
+        "pid": os.getpid(),
+        "metrics": {
+            metric.name: [[list(k), v] for k, v in metric.snapshot().items()]
+            for metric in registry
+        },
+    }
+    path = process_file(directory)
+    partial = f"{path}.partial"
+    with open(partial, "w") as f:
+        json.dump(data, f)
+    os.replace(partial, path)
+
+
+def aggregate(directory: str) -> Dict[str, Dict]:
+    """
+    Values of every metric added up over the files in ``directory``, after
+    flushing this process's own.
+    """
+    flush(directory)
+    by_name = {metric.name: metric for metric in registry}
+    totals = {name: {} for name in by_name}
+    for path in glob.glob(os.path.join(directory, "*.json")):
+        try:
+            with open(path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            # Removed meanwhile.
+            continue
+
+        running = is_running(data["pid"])
+        for name, values in data["metrics"].items():
+            metric = by_name.get(name)
+            if metric is not None and (metric.cumulative or running):
+                metric.merge(totals[name], {tuple(k): v for k, v in values})
+    return totals
+
+
+def is_running(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def start_flusher():
+    """
+    Flush to ``METRICS_DIR`` every ``METRICS_FLUSH_INTERVAL`` seconds and at
+    exit, from a daemon thread started once per process.
+    """
+    global _flusher_pid
+    directory = settings.METRICS_DIR
+    if not directory or _flusher_pid == os.getpid():
+        return
+    with _flusher_lock:
+        if _flusher_pid == os.getpid():
+            return
+        _flusher_pid = os.getpid()
+    os.makedirs(directory, exist_ok=True)
+
+    def run():
+        while True:
+            time.sleep(settings.METRICS_FLUSH_INTERVAL)
+            try:
+                flush(directory)
+            except OSError:
+                # Retried at the next interval.
+                pass
+
+    threading.Thread(target=run, name="metrics-flush", daemon=True).start()
+    atexit.register(flush, directory)
+
+
+def reset():
+    """
+    Clear all recorded values, for tests.
+    """
+    for metric in registry:
+        metric.clear()
@@ -0,0 +1,68 @@
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.db import connection
+
+from chatbot import metrics
+
+
+class MetricsMiddleware:
+    """
+    Time each request and its database, OpenAI and serialization phases.
+    The phases are sent back in a ``Server-Timing`` header and recorded in
+    the ``/metrics`` histograms.
+
+    For streamed responses the header only covers the work done before the
+    stream started.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+
+        # Connections opened before this module was loaded missed the
+        # connection_created signal.
+        metrics.instrument_connection(connection)
+        timings, token, started = self.start()
+        try:
+            response = self.get_response(request)
+        finally:
+            metrics.current.reset(token)
+        return self.finish(request, response, timings, started)
+
+    async def __acall__(self, request):
+        timings, token, started = self.start()
+        try:
+            response = await self.get_response(request)
+        finally:
+            metrics.current.reset(token)
+        return self.finish(request, response, timings, started)
+
+    @staticmethod
+    def start():
+        metrics.start_flusher()
+        timings = metrics.RequestTimings()
+        return timings, metrics.current.set(timings), time.perf_counter()
+
+    @staticmethod
+    def finish(request, response, timings, started):
+        total = time.perf_counter() - started
+        match = request.resolver_match
+        view = match.view_name if match else "unmatched"
+
+        metrics.requests.observe(
+            total, method=request.method, view=view, status=response.status_code
+        )
+        for phase, seconds in timings.durations.items():
+            metrics.phases.observe(seconds, phase=phase, view=view)
+        response["Server-Timing"] = timings.server_timing(total)
+        return response
@@ -1,3 +1,4 @@
+import json
 import os
 from pathlib import Path
 
@@ -23,6 +24,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "chatbot.middleware.MetricsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -91,8 +93,122 @@ STATIC_URL = "static/"
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 API_KEY = os.getenv("OPENAI_KEY", "")
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL") or None
 OPENAI_MODEL = "gpt-4.1-mini"
 OPENAI_TEMPERATURE = 0.7
 OPENAI_MAX_OUTPUT_TOKENS = 400
+# Detect the topic and reply in one structured call on conversations whose
+# topic is still undefined, instead of two sequential calls.
+OPENAI_COMBINED_TURN = os.getenv("OPENAI_COMBINED_TURN", "1") == "1"
 
 SWAGGER_USE_COMPAT_RENDERERS = False
+
+# Plain-dict validation and rendering for the message endpoints, see
+# chatbot/fastjson.py. Output is the same as through the serializers.
+FAST_SERIALIZATION = os.getenv("FAST_SERIALIZATION", "1") == "1"
+
+# Routes for the Django admin and the Swagger UI; chatbot.settings_production
+# leaves both out, with their apps, unless enabled.
+ADMIN_ENABLED = os.getenv("ADMIN_ENABLED", "1") == "1"
+API_DOCS_ENABLED = os.getenv("API_DOCS_ENABLED", "1") == "1"
+
+# /metrics answers METRICS_ALLOWED_IPS (addresses or networks) and requests
+# with "Authorization: Bearer <METRICS_TOKEN>". With several worker processes,
+# METRICS_DIR is a directory they share, emptied at startup, where their
+# values are added up (chatbot.metrics).
+METRICS_ALLOWED_IPS = [
+    ip for ip in os.getenv("METRICS_ALLOWED_IPS", "127.0.0.1,::1").split(",") if ip
+]
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+METRICS_DIR = os.getenv("METRICS_DIR", "")
+METRICS_FLUSH_INTERVAL = float(os.getenv("METRICS_FLUSH_INTERVAL", "5"))
+
+MESSAGE_CONFLICT_RETRIES = int(os.getenv("MESSAGE_CONFLICT_RETRIES", "1"))
+
+OPENAI_POOL_MAX_CONNECTIONS = int(os.getenv("OPENAI_POOL_MAX_CONNECTIONS", "20"))
+OPENAI_POOL_MAX_KEEPALIVE = int(os.getenv("OPENAI_POOL_MAX_KEEPALIVE", "10"))
+OPENAI_POOL_KEEPALIVE_EXPIRY = float(os.getenv("OPENAI_POOL_KEEPALIVE_EXPIRY", "30"))
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "60"))
+OPENAI_CONNECT_TIMEOUT = float(os.getenv("OPENAI_CONNECT_TIMEOUT", "5"))
+# Latency policy (lms.policy): OPENAI_TIMEOUT bounds each attempt and
+# OPENAI_DEADLINE all attempts of one call. Hedging is off with a percentile
+# of 0; each backend's breaker is off with OPENAI_BREAKER_FAILURES=0.
+OPENAI_DEADLINE = float(os.getenv("OPENAI_DEADLINE", "90"))
+OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "2"))
+OPENAI_RETRY_BACKOFF = float(os.getenv("OPENAI_RETRY_BACKOFF", "0.25"))
+OPENAI_RETRY_BACKOFF_MAX = float(os.getenv("OPENAI_RETRY_BACKOFF_MAX", "4"))
+OPENAI_HEDGE_PERCENTILE = float(os.getenv("OPENAI_HEDGE_PERCENTILE", "0"))
+OPENAI_HEDGE_MIN_SAMPLES = int(os.getenv("OPENAI_HEDGE_MIN_SAMPLES", "20"))
+OPENAI_BREAKER_FAILURES = int(os.getenv("OPENAI_BREAKER_FAILURES", "5"))
+OPENAI_BREAKER_RESET = float(os.getenv("OPENAI_BREAKER_RESET", "30"))
+# LLM backends (lms.backends) and the router across them (lms.router). An
+# empty list is one OpenAI backend from OPENAI_KEY and OPENAI_BASE_URL.
+LLM_BACKENDS = json.loads(os.getenv("LLM_BACKENDS") or "[]")
+LLM_ROUTER_ALPHA = float(os.getenv("LLM_ROUTER_ALPHA", "0.2"))
+LLM_ROUTER_EXPLORE = float(os.getenv("LLM_ROUTER_EXPLORE", "0.05"))
+# Admission control (lms.admission), shared by all processes through the
+# database. Each limit is off at 0.
+ADMISSION_RPS = float(os.getenv("ADMISSION_RPS", "0"))
+ADMISSION_BURST = int(os.getenv("ADMISSION_BURST", "10"))
+ADMISSION_MAX_IN_FLIGHT = int(os.getenv("ADMISSION_MAX_IN_FLIGHT", "0"))
+ADMISSION_MAX_WAIT = float(os.getenv("ADMISSION_MAX_WAIT", "2"))
+ADMISSION_SLOT_LEASE = float(os.getenv("ADMISSION_SLOT_LEASE", "120"))
+ADMISSION_CONVERSATION_INTERVAL = float(
+    os.getenv("ADMISSION_CONVERSATION_INTERVAL", "0")
+)
+
+TOPIC_PRECLASSIFIER_ENABLED = os.getenv("TOPIC_PRECLASSIFIER_ENABLED", "1") == "1"
+TOPIC_CACHE_MAX_ENTRIES = int(os.getenv("TOPIC_CACHE_MAX_ENTRIES", "1024"))
+TOPIC_CACHE_TTL = float(os.getenv("TOPIC_CACHE_TTL", "3600"))
+
+# Reply cache (lms.reply_cache), off by default.
+REPLY_CACHE_ENABLED = os.getenv("REPLY_CACHE_ENABLED", "0") == "1"
+REPLY_CACHE_MAX_ENTRIES = int(os.getenv("REPLY_CACHE_MAX_ENTRIES", "2048"))
+REPLY_CACHE_TTL = float(os.getenv("REPLY_CACHE_TTL", "3600"))
+REPLY_CACHE_OPENING_SHARE = float(os.getenv("REPLY_CACHE_OPENING_SHARE", "0.5"))
+REPLY_CACHE_HISTORY = int(os.getenv("REPLY_CACHE_HISTORY", "4"))
+
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "1000"))
+HISTORY_MAX_MESSAGES = int(os.getenv("HISTORY_MAX_MESSAGES", "20"))
+HISTORY_RECENT_TURNS = int(os.getenv("HISTORY_RECENT_TURNS", "2"))
+HISTORY_SUMMARY_EVERY_TURNS = int(os.getenv("HISTORY_SUMMARY_EVERY_TURNS", "4"))
+HISTORY_SUMMARY_MAX_TOKENS = int(os.getenv("HISTORY_SUMMARY_MAX_TOKENS", "200"))
+# Messages kept denormalized on ``Conversation.recent_messages``; must stay
+# above HISTORY_MAX_MESSAGES for the window to serve the whole history.
+CONVERSATION_RECENT_WINDOW = int(os.getenv("CONVERSATION_RECENT_WINDOW", "20"))
+
+# conversation/<id>/messages pages.
+MESSAGES_PAGE_SIZE = int(os.getenv("MESSAGES_PAGE_SIZE", "50"))
+MESSAGES_PAGE_MAX = int(os.getenv("MESSAGES_PAGE_MAX", "200"))
+
+TOPIC_STATS_DAYS = int(os.getenv("TOPIC_STATS_DAYS", "7"))
+TOPIC_STATS_MAX_DAYS = int(os.getenv("TOPIC_STATS_MAX_DAYS", "366"))
+TOPIC_STATS_LIMIT = int(os.getenv("TOPIC_STATS_LIMIT", "10"))
+TOPIC_STATS_MAX_LIMIT = int(os.getenv("TOPIC_STATS_MAX_LIMIT", "100"))
+
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "8"))
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "500"))
+
+# Message jobs (conversation.jobs). A running job whose worker has not
+# finished it within JOB_LEASE seconds is handed to another worker, so the
+# lease must cover the OpenAI calls of one turn.
+JOB_CONCURRENCY = int(os.getenv("JOB_CONCURRENCY", "8"))
+JOB_LEASE = float(os.getenv("JOB_LEASE", "300"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "0.5"))
+# Long polls wait for a LISTEN/NOTIFY wake-up (conversation.job_events), or
+# read the job every JOB_POLL_INTERVAL without it. A waiting request holds a
+# worker thread under WSGI, so long waits are for the ASGI deployment.
+JOB_LISTEN = os.getenv("JOB_LISTEN", "1") == "1"
+JOB_LONG_POLL_MAX = float(os.getenv("JOB_LONG_POLL_MAX", "25"))
+JOB_LONG_POLL_MAX_WSGI = float(os.getenv("JOB_LONG_POLL_MAX_WSGI", "2"))
+
+CONVERSATION_RETENTION_DAYS = int(os.getenv("CONVERSATION_RETENTION_DAYS", "180"))
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", str(BASE_DIR / "archives"))
+EXPORT_STATE_FILE = os.getenv(
+    "EXPORT_STATE_FILE", str(BASE_DIR / "archives" / "export-state.json")
+)
+# Seconds an incremental export stays behind the clock. updated_at is taken
+# before the turn's transaction commits, so it must exceed the longest write
+# transaction (lock waits included) plus the clock skew between hosts.
+EXPORT_LAG = float(os.getenv("EXPORT_LAG", "300"))
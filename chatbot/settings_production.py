@@ -0,0 +1,96 @@
+"""
+Production profile, selected with
+``DJANGO_SETTINGS_MODULE=chatbot.settings_production``.
+
+Same as ``chatbot.settings`` with debug off, so queries are not kept in
+memory, and with reused database connections: persistent connections with
+health checks by default, or Django's psycopg 3 connection pool with
+``DB_POOL=1`` (``psycopg[pool]``, in requirements.txt).
+
+The admin and the Swagger UI are off unless ``ADMIN_ENABLED=1`` or
+``API_DOCS_ENABLED=1``, so the JSON API starts without loading them or the
+session and message machinery only the admin uses.
+"""
+
+import os
+
+from chatbot.settings import *  # noqa: F401,F403
+from chatbot.settings import DATABASES, INSTALLED_APPS, MIDDLEWARE, TEMPLATES
+
+DEBUG = False
+
+SECRET_KEY = os.environ["DJANGO_SECRET_KEY"]
+ALLOWED_HOSTS = os.getenv("DJANGO_ALLOWED_HOSTS", "").split(",")
+
+SESSION_COOKIE_SECURE = True
+CSRF_COOKIE_SECURE = True
+
+ADMIN_ENABLED = os.getenv("ADMIN_ENABLED", "0") == "1"
+API_DOCS_ENABLED = os.getenv("API_DOCS_ENABLED", "0") == "1"
+
+if not ADMIN_ENABLED:
+    # Staff still authenticate to the export endpoint with HTTP Basic.
+    INSTALLED_APPS = [
+        app
+        for app in INSTALLED_APPS
+        if app
+        not in (
+            "django.contrib.admin",
+            "django.contrib.sessions",
+            "django.contrib.messages",
+        )
+    ]
+    MIDDLEWARE = [
+        middleware
+        for middleware in MIDDLEWARE
+        if middleware
+        not in (
+            "django.contrib.sessions.middleware.SessionMiddleware",
+            "django.contrib.auth.middleware.AuthenticationMiddleware",
+            "django.contrib.messages.middleware.MessageMiddleware",
+        )
+    ]
+    TEMPLATES = [
+        {
+            **TEMPLATES[0],
+            "OPTIONS": {
+                "context_processors": [
+                    "django.template.context_processors.request",
+                ],
+            },
+        }
+    ]
+    REST_FRAMEWORK = {
+        "DEFAULT_AUTHENTICATION_CLASSES": [
+            "rest_framework.authentication.BasicAuthentication",
+        ],
+    }
+
+if not API_DOCS_ENABLED:
+    INSTALLED_APPS = [app for app in INSTALLED_APPS if app != "drf_yasg"]
+
+if os.getenv("DB_POOL", "0") == "1":
+    # One pool per process, shared by its threads. Size it to the gunicorn
+    # threads; CONN_MAX_AGE must stay 0 with a pool.
+    DATABASES = {
+        "default": {
+            **DATABASES["default"],
+            "OPTIONS": {
+                "pool": {
+                    "min_size": int(os.getenv("DB_POOL_MIN_SIZE", "2")),
+                    "max_size": int(os.getenv("DB_POOL_MAX_SIZE", "16")),
+                    "timeout": float(os.getenv("DB_POOL_TIMEOUT", "10")),
+                }
+            },
+        }
+    }
+else:
+    # One connection per thread, kept between requests and checked before
+    # reuse when a request starts.
+    DATABASES = {
+        "default": {
+            **DATABASES["default"],
+            "CONN_MAX_AGE": int(os.getenv("DB_CONN_MAX_AGE", "600")),
+            "CONN_HEALTH_CHECKS": True,
+        }
+    }
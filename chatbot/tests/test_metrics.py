@@ -0,0 +1,195 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from chatbot import metrics
+from lms import OpenAIClient
+
+
+class MetricsTestCase(TestCase):
+    def setUp(self):
+        metrics.reset()
+        self.addCleanup(metrics.reset)
+
+
+class RegistryTests(MetricsTestCase):
+    def test_histogram_renders_cumulative_buckets(self):
+        histogram = metrics.Histogram(
+            "test_duration_seconds", "Test.", ("view",), buckets=(0.1, 1)
+        )
+        self.addCleanup(metrics.registry.remove, histogram)
+        histogram.observe(0.05, view="a")
+        histogram.observe(0.5, view="a")
+        histogram.observe(5, view="a")
+
+        self.assertEqual(
+            histogram.render(),
+            [
+                "# HELP test_duration_seconds Test.",
+                "# TYPE test_duration_seconds histogram",
+                'test_duration_seconds_bucket{view="a",le="0.1"} 1',
+                'test_duration_seconds_bucket{view="a",le="1"} 2',
+                'test_duration_seconds_bucket{view="a",le="+Inf"} 3',
+                'test_duration_seconds_sum{view="a"} 5.55',
+                'test_duration_seconds_count{view="a"} 3',
+            ],
+        )
+
+    def test_openai_call_records_latency_errors_and_usage(self):
+        with self.assertRaises(TimeoutError):
+            with metrics.openai_call("debate_reply"):
+                raise TimeoutError()
+        metrics.record_usage(
+            "debate_reply", SimpleNamespace(input_tokens=12, output_tokens=30)
+        )
+
+        self.assertEqual(metrics.openai_requests.count(operation="debate_reply"), 1)
+        self.assertEqual(metrics.openai_errors.value(operation="debate_reply"), 1)
+        self.assertEqual(
+            metrics.openai_tokens.value(operation="debate_reply", kind="output"), 30
+        )
+
+
+class MetricsMiddlewareTests(MetricsTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+
+    @patch("openai.OpenAI")
+    @patch("conversation.views.get_client")
+    def test_message_request_reports_phases(self, get_client, MockOpenAI):
+        resp = MockOpenAI.return_value.responses.create.return_value
+        resp.output_text = '{"topic": "taxes", "bot_stance": "con", "response": "Why?"}'
+        resp.usage = SimpleNamespace(input_tokens=40, output_tokens=12)
+        get_client.return_value = OpenAIClient()
+
+        response = self.client.post(
+            reverse("send-message"),
+            {"conversation_id": None, "message": "Taxes should be lower"},
+            format="json",
+        )
+
+        timing = response["Server-Timing"]
+        for phase in ("db;", "openai.get_topic_and_stance;", "serialize;", "total;"):
+            self.assertIn(phase, timing)
+        self.assertEqual(
+            metrics.requests.count(method="POST", view="send-message", status=201),
+            1,
+        )
+        self.assertEqual(
+            metrics.openai_tokens.value(operation="get_topic_and_stance", kind="input"),
+            40,
+        )
+
+    def test_metrics_endpoint_renders_prometheus_text(self):
+        self.client.get(reverse("metrics"))
+
+        response = self.client.get(reverse("metrics"))
+
+        self.assertTrue(response["Content-Type"].startswith("text/plain"))
+        body = response.content.decode()
+        self.assertIn("# TYPE chatbot_http_request_duration_seconds histogram", body)
+        self.assertIn(
+            'chatbot_http_request_duration_seconds_count{method="GET",'
+            'view="metrics",status="200"} 1',
+            body,
+        )
+        self.assertIn('chatbot_openai_pool{stat="requests"}', body)
+        self.assertIn('chatbot_topic_detection{stat="hits"}', body)
+
+    @override_settings(METRICS_ALLOWED_IPS=["10.0.0.0/8"], METRICS_TOKEN="")
+    def test_metrics_endpoint_rejects_other_addresses(self):
+        allowed = self.client.get(reverse("metrics"), REMOTE_ADDR="10.1.2.3")
+        rejected = self.client.get(reverse("metrics"), REMOTE_ADDR="203.0.113.9")
+
+        self.assertEqual(allowed.status_code, 200)
+        self.assertEqual(rejected.status_code, 403)
+
+    @override_settings(METRICS_ALLOWED_IPS=[], METRICS_TOKEN="secret")
+    def test_metrics_endpoint_accepts_the_token(self):
+        url = reverse("metrics")
+
+        self.assertEqual(self.client.get(url).status_code, 403)
+        self.assertEqual(
+            self.client.get(url, HTTP_AUTHORIZATION="Bearer wrong").status_code, 403
+        )
+        self.assertEqual(
+            self.client.get(url, HTTP_AUTHORIZATION="Bearer secret").status_code, 200
+        )
+
+
+class MultiprocessTests(MetricsTestCase):
+    def setUp(self):
+        super().setUp()
+        self.directory = self.enterContext(tempfile.TemporaryDirectory())
+        self.counter = metrics.Counter("test_total", "Test.", ("kind",))
+        self.histogram = metrics.Histogram(
+            "test_duration_seconds", "Test.", buckets=(0.1, 1)
+        )
+        self.gauge = metrics.Gauges(
+            "test_gauge", "Test.", ("stat",), collect=lambda: {"size": 2}
+        )
+        for metric in (self.counter, self.histogram, self.gauge):
+            self.addCleanup(metrics.registry.remove, metric)
+
+    def other_process(self, pid):
+        """
+        What another worker with ``pid`` flushed: the same values as this one.
+        """
+        data = {
+            "pid": pid,
+            "metrics": {
+                metric.name: [[list(k), v] for k, v in metric.snapshot().items()]
+                for metric in (self.counter, self.histogram, self.gauge)
+            },
+        }
+        Path(self.directory, f"{pid}-other.json").write_text(json.dumps(data))
+
+    def test_values_are_added_up_across_processes(self):
+        self.counter.inc(3, kind="a")
+        self.histogram.observe(0.5)
+        exited = subprocess.Popen([sys.executable, "-c", ""])
+        exited.wait()
+        self.other_process(exited.pid)
+        self.other_process(os.getppid())
+
+        with override_settings(METRICS_DIR=self.directory):
+            body = metrics.render()
+
+        self.assertIn('test_total{kind="a"} 9', body)
+        self.assertIn('test_duration_seconds_bucket{le="1"} 3', body)
+        self.assertIn("test_duration_seconds_count 3", body)
+        # Gauges of the exited process are left out.
+        self.assertIn('test_gauge{stat="size"} 4', body)
+
+    def test_flush_writes_this_process_file(self):
+        self.counter.inc(kind="a")
+
+        metrics.flush(self.directory)
+
+        (name,) = os.listdir(self.directory)
+        data = json.loads(Path(self.directory, name).read_text())
+        self.assertEqual(data["pid"], os.getpid())
+        self.assertEqual(data["metrics"]["test_total"], [[["a"], 1]])
+
+    @patch("chatbot.metrics.atexit.register")
+    @patch("chatbot.metrics.threading.Thread")
+    def test_flusher_starts_once_per_process(self, Thread, register):
+        self.addCleanup(setattr, metrics, "_flusher_pid", metrics._flusher_pid)
+
+        with override_settings(METRICS_DIR=self.directory):
+            metrics.start_flusher()
+            metrics.start_flusher()
+
+        Thread.assert_called_once()
+        register.assert_called_once_with(metrics.flush, self.directory)
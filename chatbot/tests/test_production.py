@@ -0,0 +1,76 @@
+import importlib
+import runpy
+import sys
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+from django.conf import settings
+
+import lms
+
+GUNICORN_CONF = Path(__file__).resolve().parents[2] / "gunicorn.conf.py"
+
+
+def load_profile(monkeypatch, **env):
+    monkeypatch.setenv("DJANGO_SECRET_KEY", "secret")
+    for name, value in env.items():
+        monkeypatch.setenv(name, value)
+    sys.modules.pop("chatbot.settings_production", None)
+    return importlib.import_module("chatbot.settings_production")
+
+
+def test_profile_keeps_connections_with_health_checks(monkeypatch):
+    profile = load_profile(monkeypatch, DJANGO_ALLOWED_HOSTS="api.example.com")
+
+    assert profile.DEBUG is False
+    assert profile.ALLOWED_HOSTS == ["api.example.com"]
+    assert profile.DATABASES["default"]["CONN_MAX_AGE"] == 600
+    assert profile.DATABASES["default"]["CONN_HEALTH_CHECKS"] is True
+
+
+def test_profile_uses_the_connection_pool_on_request(monkeypatch):
+    profile = load_profile(monkeypatch, DB_POOL="1", DB_POOL_MAX_SIZE="32")
+
+    default = profile.DATABASES["default"]
+    assert default["OPTIONS"]["pool"]["max_size"] == 32
+    assert not default.get("CONN_MAX_AGE")
+
+
+def test_profile_leaves_out_admin_and_docs_unless_enabled(monkeypatch):
+    lean = load_profile(monkeypatch)
+
+    assert "drf_yasg" not in lean.INSTALLED_APPS
+    assert "django.contrib.admin" not in lean.INSTALLED_APPS
+    assert "django.contrib.sessions.middleware.SessionMiddleware" not in (
+        lean.MIDDLEWARE
+    )
+
+    full = load_profile(monkeypatch, ADMIN_ENABLED="1", API_DOCS_ENABLED="1")
+
+    assert full.INSTALLED_APPS == settings.INSTALLED_APPS
+    assert full.MIDDLEWARE == settings.MIDDLEWARE
+
+
+def test_profile_requires_a_secret_key(monkeypatch):
+    monkeypatch.delenv("DJANGO_SECRET_KEY", raising=False)
+    sys.modules.pop("chatbot.settings_production", None)
+
+    with pytest.raises(KeyError):
+        importlib.import_module("chatbot.settings_production")
+
+
+def test_gunicorn_post_fork_drops_inherited_clients():
+    conf = runpy.run_path(str(GUNICORN_CONF))
+
+    lms._shared["sync"] = (0, object())
+    with patch("django.db.connections.close_all") as close_all:
+        conf["post_fork"](None, None)
+
+    close_all.assert_called_once_with()
+    assert lms._shared == {}
+    assert conf["worker_class"] == "gthread"
+    longest_turn = (
+        3 * settings.OPENAI_DEADLINE * (settings.MESSAGE_CONFLICT_RETRIES + 1)
+    )
+    assert conf["graceful_timeout"] == conf["timeout"] > longest_turn
@@ -0,0 +1,35 @@
+import os
+
+from benchmarks.startup import best_of
+
+# Best of three production startups. Raise it with the measured cost when an
+# import is added on purpose.
+IMPORT_TIME_BUDGET_MS = float(os.getenv("STARTUP_IMPORT_BUDGET_MS", "600"))
+
+
+def test_production_startup_skips_optional_imports():
+    modules = best_of("chatbot.settings_production", 1)["modules"]
+
+    assert "openai" not in modules
+    assert "drf_yasg" not in modules
+    assert "django.contrib.sessions.middleware" not in modules
+    assert "django.contrib.admin.apps" not in modules
+
+
+def test_development_startup_still_loads_admin_and_docs():
+    modules = best_of("chatbot.settings", 1)["modules"]
+
+    assert "drf_yasg.views" in modules
+    assert "django.contrib.admin.apps" in modules
+    assert "openai" not in modules
+
+
+def test_production_startup_stays_within_the_import_budget():
+    result = best_of("chatbot.settings_production", 3)
+
+    slowest = sorted(result["top_level"].items(), key=lambda item: -item[1])[:5]
+    report = ", ".join(f"{name} {ms:.0f} ms" for name, ms in slowest)
+    assert result["total_ms"] <= IMPORT_TIME_BUDGET_MS, (
+        f"startup imports took {result['total_ms']:.0f} ms, over the "
+        f"{IMPORT_TIME_BUDGET_MS:.0f} ms budget; slowest: {report}"
+    )
@@ -15,25 +15,41 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 
-from django.contrib import admin
+from django.conf import settings
 from django.urls import path, include
-from drf_yasg.views import get_schema_view
-from drf_yasg import openapi
-from rest_framework import permissions
-
-schema_view = get_schema_view(
-    openapi.Info(
-        title="Chatbot",
-        default_version="v1",
-        description="Kavak Technical test",
-        contact=openapi.Contact(email="vicherver@gmail.com"),
-    ),
-    public=True,
-    permission_classes=[permissions.AllowAny],
-)
+
+from chatbot.views import metrics_view
 
 urlpatterns = [
-    path("admin/", admin.site.urls),
     path("conversation/", include("conversation.urls")),
-    path("", schema_view.with_ui("swagger", cache_timeout=0), name="schema-swagger-ui"),
+    path("metrics", metrics_view, name="metrics"),
 ]
+
+# Imported only when enabled, to keep them out of the startup cost.
+if settings.ADMIN_ENABLED:
+    from django.contrib import admin
+
+    urlpatterns.append(path("admin/", admin.site.urls))
+
+if settings.API_DOCS_ENABLED:
+    from drf_yasg import openapi
+    from drf_yasg.views import get_schema_view
+    from rest_framework import permissions
+
+    schema_view = get_schema_view(
+        openapi.Info(
+            title="Chatbot",
+            default_version="v1",
+            description="Kavak Technical test",
+            contact=openapi.Contact(email="vicherver@gmail.com"),
+        ),
+        public=True,
+        permission_classes=[permissions.AllowAny],
+    )
+    urlpatterns.append(
+        path(
+            "",
+            schema_view.with_ui("swagger", cache_timeout=0),
+            name="schema-swagger-ui",
+        )
+    )
@@ -0,0 +1,36 @@
+import hmac
+import ipaddress
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+
+from chatbot import metrics
+
+
+def metrics_view(request):
+    """
+    Prometheus scrape endpoint, for ``METRICS_ALLOWED_IPS`` or requests with
+    ``Authorization: Bearer <METRICS_TOKEN>``.
+    """
+    if not scrape_allowed(request):
+        return HttpResponseForbidden()
+    return HttpResponse(
+        metrics.render(), content_type="text/plain; version=0.0.4; charset=utf-8"
+    )
+
+
+def scrape_allowed(request) -> bool:
+    if settings.METRICS_TOKEN:
+        expected = f"Bearer {settings.METRICS_TOKEN}"
+        received = request.headers.get("Authorization", "")
+        if hmac.compare_digest(received.encode(), expected.encode()):
+            return True
+
+    try:
+        address = ipaddress.ip_address(request.META.get("REMOTE_ADDR", ""))
+    except ValueError:
+        return False
+    return any(
+        address in ipaddress.ip_network(network, strict=False)
+        for network in settings.METRICS_ALLOWED_IPS
+    )
@@ -0,0 +1,24 @@
+import pytest
+
+from lms import classifier, reply_cache
+
+
+@pytest.fixture(autouse=True)
+def reset_lms_caches():
+    """
+    The LLM caches are process-wide, clear them so tests stay independent.
+    """
+    classifier.topic_cache().clear()
+    reply_cache.reply_cache().clear()
+    yield
+    classifier.topic_cache().clear()
+    reply_cache.reply_cache().clear()
+
+
+@pytest.fixture(autouse=True)
+def no_job_listener(settings):
+    """
+    The job listener holds a connection to the test database for the rest of
+    the run; tests that need it start and stop it themselves.
+    """
+    settings.JOB_LISTEN = False
@@ -0,0 +1,217 @@
+import contextvars
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from django.conf import settings
+from django.db import connections, transaction
+from rest_framework import status
+from rest_framework.exceptions import APIException, NotFound, ValidationError
+
+from conversation.models import Conversation, Message, TopicDailyStat
+from conversation.serializer import (
+    ConversationResponseSerializer,
+    validate_message_request,
+)
+from conversation.views import ConversationConflict, MessageView
+from lms import OpenAIClient, get_client
+
+
+@dataclass(eq=False)
+class Turn:
+    index: int
+    conversation_id: Optional[uuid.UUID]
+    message: str
+    attempts: int = 0
+    messages: List[Message] = field(default_factory=list)
+    conversation: Optional[Conversation] = None
+    created: bool = False
+    history: List[Message] = field(default_factory=list)
+    fields: Dict = field(default_factory=dict)
+    reply: str = ""
+    result: Optional[Dict] = None
+
+    def fail(self, error: APIException):
+        self.result = {"status": error.status_code, "detail": error.detail}
+
+
+class ReplyFailed(APIException):
+    status_code = status.HTTP_502_BAD_GATEWAY
+    default_detail = "Could not generate a reply."
+    default_code = "reply_failed"
+
+
+def run_batch(
+    items: List[Dict],
+    client: OpenAIClient = None,
+    concurrency: int = None,
+) -> List[Dict]:
+    """
+    Run independent turns through the ``MessageView`` pipeline and return one
+    result per item, in input order: the usual response body with
+    ``status: 201``, or ``status`` and ``detail`` when the item failed. Each
+    item is validated as a ``MessageView`` body; an invalid one fails with
+    400 and the serializer errors.
+
+    Turns run in rounds. Each round reads its conversations with one query,
+    calls OpenAI for all of them with at most ``concurrency`` calls in flight
+    (``BATCH_CONCURRENCY`` by default) and stores them with one bulk insert
+    per table plus the versioned conversation updates. Items for the same
+    conversation go in successive rounds, so they see each other's replies.
+    Items that lose a race with another writer are retried like
+    ``MessageView`` does.
+    """
+    client = client or get_client()
+    concurrency = concurrency or settings.BATCH_CONCURRENCY
+    turns = [new_turn(index, item) for index, item in enumerate(items)]
+    pending = [turn for turn in turns if turn.result is None]
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        while pending:
+            current, pending = next_round(pending)
+            load_conversations(current)
+            ready = [turn for turn in current if turn.result is None]
+            # Replies are generated in the pool, the turns are read and
+            # stored in this thread. Each call gets a copy of the context so
+            # its timings count towards the request.
+            futures = [
+                executor.submit(
+                    contextvars.copy_context().run, generate_reply, client, turn
+                )
+                for turn in ready
+            ]
+            for future in futures:
+                future.result()
+            conflicts = commit_turns([turn for turn in ready if turn.result is None])
+            pending = retry_conflicts(conflicts) + pending
+
+    return [turn.result for turn in turns]
+
+
+def new_turn(index: int, item) -> Turn:
+    try:
+        item = validate_message_request(item)
+    except ValidationError as e:
+        turn = Turn(index, None, "")
+        turn.fail(e)
+        return turn
+    return Turn(index, item.get("conversation_id"), item["message"])
+
+
+def next_round(pending: List[Turn]) -> [List[Turn], List[Turn]]:
+    """
+    Split off the first pending turn of each conversation.
+    """
+    current, later, seen = [], [], set()
+    for turn in pending:
+        if turn.conversation_id and turn.conversation_id in seen:
+            later.append(turn)
+        else:
+            seen.add(turn.conversation_id)
+            current.append(turn)
+    return current, later
+
+
+def load_conversations(turns: List[Turn]):
+    ids = [turn.conversation_id for turn in turns if turn.conversation_id]
+    conversations = Conversation.objects.in_bulk(ids)
+    for turn in turns:
+        if not turn.conversation_id:
+            turn.conversation, turn.created = Conversation(), True
+        elif turn.conversation_id in conversations:
+            turn.conversation, turn.created = conversations[turn.conversation_id], False
+            turn.history = MessageView.get_history(turn.conversation)
+        else:
+            turn.fail(NotFound("Conversation not found."))
+
+
+def generate_reply(client: OpenAIClient, turn: Turn):
+    try:
+        turn.fields, turn.reply = MessageView.generate_reply(
+            client, turn.conversation, turn.created, turn.history, turn.message
+        )
+    except APIException as e:
+        turn.fail(e)
+    except Exception:
+        turn.fail(ReplyFailed())
+    finally:
+        # Admission control queries the database from this pool thread. The
+        # pool ends with the request, so its connections would never be
+        # closed by Django's request handlers.
+        connections.close_all()
+
+
+def commit_turns(turns: List[Turn]) -> List[Turn]:
+    """
+    Store the turns and return the ones whose conversation changed since it
+    was read; nothing of those is kept.
+    """
+    if not turns:
+        return []
+
+    with transaction.atomic():
+        messages = Message.objects.bulk_create(
+            message
+            for turn in turns
+            for message in (
+                Message(
+                    conversation=turn.conversation,
+                    role=Message.Role.USER,
+                    message=turn.message,
+                ),
+                Message(
+                    conversation=turn.conversation,
+                    role=Message.Role.SYSTEM,
+                    message=turn.reply,
+                ),
+            )
+        )
+
+        created, conflicts, linked = [], [], []
+        for turn, user, bot in zip(turns, messages[::2], messages[1::2]):
+            turn.messages = [user, bot]
+            turn.conversation.push_recent_messages(user, bot)
+            fields = {
+                **turn.fields,
+                "recent_messages": turn.conversation.recent_messages,
+            }
+            if turn.conversation.link_topic(fields):
+                linked.append(turn)
+            if turn.created:
+                for name, value in fields.items():
+                    setattr(turn.conversation, name, value)
+                created.append(turn.conversation)
+            elif not turn.conversation.update_if_unchanged(**fields):
+                conflicts.append(turn)
+        Conversation.objects.bulk_create(created)
+        TopicDailyStat.record(
+            *(turn.conversation for turn in linked if turn not in conflicts)
+        )
+
+        if conflicts:
+            Message.objects.filter(
+                message_id__in=[
+                    m.message_id for turn in conflicts for m in turn.messages
+                ]
+            ).delete()
+
+    for turn in turns:
+        if turn not in conflicts:
+            turn.result = {
+                "status": status.HTTP_201_CREATED,
+                **ConversationResponseSerializer.build(turn.conversation),
+            }
+    return conflicts
+
+
+def retry_conflicts(conflicts: List[Turn]) -> List[Turn]:
+    retry = []
+    for turn in conflicts:
+        turn.attempts += 1
+        if turn.attempts > settings.MESSAGE_CONFLICT_RETRIES:
+            turn.fail(ConversationConflict())
+        else:
+            turn.history, turn.fields, turn.reply, turn.messages = [], {}, "", []
+            retry.append(turn)
+    return retry
@@ -0,0 +1,89 @@
+import json
+from datetime import datetime, timezone as dt_timezone
+from typing import Dict, Iterator, Optional
+
+from django.db.models import Prefetch
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from conversation.models import Conversation, Message
+
+
+def ordered_messages() -> Prefetch:
+    """
+    Prefetch of a conversation's messages in history order, for querysets
+    serialized with ``serialize_conversation``.
+    """
+    return Prefetch(
+        "messages",
+        queryset=Message.objects.order_by("created_at", "message_id").only(
+            "message_id", "conversation_id", "role", "message", "created_at"
+        ),
+    )
+
+
+def serialize_message(message: Message) -> Dict:
+    return {
+        "message_id": str(message.message_id),
+        "role": message.role,
+        "message": message.message,
+        "created_at": message.created_at.isoformat(),
+    }
+
+
+def serialize_conversation(conversation: Conversation) -> Dict:
+    """
+    Full conversation with its messages, oldest first. Expects the messages
+    to be prefetched through ``ordered_messages``.
+    """
+    return {
+        "conversation_id": str(conversation.conversation_id),
+        "topic": conversation.topic,
+        "stance": conversation.stance,
+        "summary": conversation.summary,
+        "created_at": conversation.created_at.isoformat(),
+        "updated_at": conversation.updated_at.isoformat(),
+        "messages": [serialize_message(m) for m in conversation.messages.all()],
+    }
+
+
+def ndjson_line(data: Dict) -> str:
+    return json.dumps(data, ensure_ascii=False) + "\n"
+
+
+def parse_bound(value: str) -> datetime:
+    """
+    ISO 8601 date or datetime; naive values are taken as UTC.
+    """
+    parsed = parse_datetime(value)
+    if parsed is None:
+        parsed = parse_datetime(f"{value}T00:00:00")
+    if parsed is None:
+        raise ValueError(f"Invalid date or datetime: {value!r}")
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed, dt_timezone.utc)
+    return parsed
+
+
+def export_lines(
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    chunk_size: int = 500,
+) -> Iterator[str]:
+    """
+    NDJSON lines for the conversations updated in ``[since, until)``, in
+    update order. Conversations are read through a server-side cursor and
+    their messages prefetched one chunk at a time, so memory stays flat
+    whatever the table size.
+    """
+    qs = Conversation.objects.defer("recent_messages").order_by(
+        "updated_at", "conversation_id"
+    )
+    if since:
+        qs = qs.filter(updated_at__gte=since)
+    if until:
+        qs = qs.filter(updated_at__lt=until)
+
+    conversations = qs.prefetch_related(ordered_messages())
+    for conversation in conversations.iterator(chunk_size=chunk_size):
+        yield ndjson_line(serialize_conversation(conversation))
@@ -0,0 +1,129 @@
+"""
+Wake job long polls when the job finishes, with Postgres LISTEN/NOTIFY.
+
+``notify_finished`` sends the job id on ``CHANNEL`` from the transaction that
+finishes the job; Postgres delivers it on commit. Each web process runs one
+listener thread on its own connection, which wakes the requests waiting for
+that job, so a long poll reads the job again only once it finished. While
+the listener is not connected, waiters fall back to reading the job every
+``JOB_POLL_INTERVAL``.
+"""
+
+import os
+import select
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, Set
+
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connection, connections
+
+CHANNEL = "message_job"
+
+# Seconds between checks for stop() while no notification arrives, and
+# before reconnecting after the connection was lost.
+LISTEN_TIMEOUT = 1
+RECONNECT_DELAY = 1
+
+
+def notify_finished(job_id):
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT pg_notify(%s, %s)", [CHANNEL, str(job_id)])
+
+
+class JobListener:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.waiters: Dict[str, Set[Callable[[], None]]] = {}
+        self.connected = False
+        self.pid = 0
+        self.thread = None
+        self.stopping = threading.Event()
+
+    def start(self):
+        """
+        Start the listener thread, once per process.
+        """
+        with self.lock:
+            if self.pid == os.getpid():
+                return
+            self.pid = os.getpid()
+            self.connected = False
+            self.stopping = threading.Event()
+            self.thread = threading.Thread(
+                target=self.run, name="job-listener", daemon=True
+            )
+            self.thread.start()
+
+    def stop(self):
+        with self.lock:
+            thread, self.pid = self.thread, 0
+            self.stopping.set()
+        if thread is not None:
+            thread.join()
+
+    @contextmanager
+    def waiting(self, job_id, wake: Callable[[], None]):
+        """
+        Call ``wake`` when the job finishes, and whenever the listener
+        (re)connects, as notifications may have been missed, in the block.
+        """
+        key = str(job_id)
+        with self.lock:
+            self.waiters.setdefault(key, set()).add(wake)
+        try:
+            yield
+        finally:
+            with self.lock:
+                self.waiters[key].discard(wake)
+                if not self.waiters[key]:
+                    del self.waiters[key]
+
+    def wake(self, job_id: str = None):
+        with self.lock:
+            if job_id is None:
+                wakes = [w for waiters in self.waiters.values() for w in waiters]
+            else:
+                wakes = list(self.waiters.get(job_id, ()))
+        for wake in wakes:
+            wake()
+
+    def run(self):
+        stopping = self.stopping
+        while not stopping.is_set():
+            try:
+                self.listen(stopping)
+            except DatabaseError:
+                pass
+            self.connected = False
+            self.wake()
+            stopping.wait(RECONNECT_DELAY)
+
+    def listen(self, stopping: threading.Event):
+        db = connections.create_connection(DEFAULT_DB_ALIAS)
+        try:
+            with db.cursor() as cursor:
+                cursor.execute(f"LISTEN {CHANNEL}")
+            self.connected = True
+            self.wake()
+            for job_id in notifications(db.connection, stopping):
+                self.wake(job_id)
+        finally:
+            db.close()
+
+
+def notifications(raw, stopping: threading.Event) -> Iterator[str]:
+    """
+    Payloads received on a psycopg 3 or psycopg2 connection until
+    ``stopping`` is set.
+    """
+    while not stopping.is_set():
+        if callable(getattr(raw, "notifies", None)):
+            for notify in raw.notifies(timeout=LISTEN_TIMEOUT):
+                yield notify.payload
+        elif select.select([raw], [], [], LISTEN_TIMEOUT)[0]:
+            raw.poll()
+            while raw.notifies:
+                yield raw.notifies.pop(0).payload
+
+
+listener = JobListener()
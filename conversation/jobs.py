@@ -0,0 +1,193 @@
+from datetime import timedelta
+from typing import List
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from chatbot import metrics
+from conversation import job_events
+from conversation.models import Conversation, Message, MessageJob, TopicDailyStat
+from conversation.views import ConversationConflict, MessageView
+from lms import OpenAIClient
+
+jobs = metrics.Counter(
+    "chatbot_message_jobs_total",
+    "Message jobs queued (again, after a failed attempt) and finished.",
+    ("status",),
+)
+
+
+class JobLost(Exception):
+    """
+    The job was handed to another worker after its lease expired.
+    """
+
+
+def submit_job(conversation_id, user_text: str) -> MessageJob:
+    """
+    Store the user message and queue the reply. The message goes into the
+    conversation window with a version bump, so a concurrent ``MessageView``
+    turn on the same conversation retries and sees it.
+    """
+    attempts = settings.MESSAGE_CONFLICT_RETRIES + 1
+    for attempt in range(attempts):
+        conversation, created = MessageView.get_conversation(conversation_id)
+        if not created:
+            MessageView.get_history(conversation)
+
+        try:
+            with transaction.atomic():
+                message = Message.objects.create(
+                    conversation=conversation,
+                    role=Message.Role.USER,
+                    message=user_text,
+                )
+                conversation.push_recent_messages(message)
+                if created:
+                    conversation.topic, conversation.stance = "Undefined", "und"
+                    conversation.save(force_insert=True)
+                elif not conversation.update_if_unchanged(
+                    recent_messages=conversation.recent_messages
+                ):
+                    raise ConversationConflict()
+                job = MessageJob.objects.create(
+                    conversation=conversation,
+                    message=message,
+                    new_conversation=created,
+                )
+        except ConversationConflict:
+            if attempt == attempts - 1:
+                raise
+        else:
+            jobs.inc(status=MessageJob.Status.QUEUED)
+            return job
+
+
+def claim_jobs(limit: int) -> List[MessageJob]:
+    """
+    Mark up to ``limit`` of the oldest queued jobs, and running jobs whose
+    lease expired, as running for this worker. ``SKIP LOCKED`` lets
+    concurrent workers claim disjoint jobs without waiting on each other.
+    """
+    now = timezone.now()
+    expired = now - timedelta(seconds=settings.JOB_LEASE)
+    with transaction.atomic():
+        claimed = list(
+            MessageJob.objects.select_related("message")
+            .select_for_update(skip_locked=True, of=("self",))
+            .filter(
+                Q(status=MessageJob.Status.QUEUED)
+                | Q(status=MessageJob.Status.RUNNING, claimed_at__lt=expired)
+            )
+            .order_by("created_at")[:limit]
+        )
+        MessageJob.objects.filter(job_id__in=[job.job_id for job in claimed]).update(
+            status=MessageJob.Status.RUNNING,
+            claimed_at=now,
+            attempts=F("attempts") + 1,
+        )
+
+    for job in claimed:
+        job.status, job.claimed_at = MessageJob.Status.RUNNING, now
+        job.attempts += 1
+    return claimed
+
+
+def run_job(client: OpenAIClient, job: MessageJob):
+    """
+    Generate and store the reply of a claimed job. Failed attempts go back
+    to the queue until ``JOB_MAX_ATTEMPTS`` is reached.
+
+    Runs in a worker thread, so its database connection is closed like at
+    the end of a request.
+    """
+    close_old_connections()
+    try:
+        if job.attempts > settings.JOB_MAX_ATTEMPTS:
+            finish(job, MessageJob.Status.FAILED, "Too many attempts.")
+            return
+        try:
+            reply_to(client, job)
+        except JobLost:
+            pass
+        except Exception as e:
+            if job.attempts >= settings.JOB_MAX_ATTEMPTS:
+                finish(job, MessageJob.Status.FAILED, str(e) or type(e).__name__)
+            else:
+                finish(job, MessageJob.Status.QUEUED)
+    finally:
+        close_old_connections()
+
+
+def reply_to(client: OpenAIClient, job: MessageJob):
+    """
+    The ``MessageView`` read, LLM and commit phases for the job's message,
+    retried on conflicts.
+    """
+    attempts = settings.MESSAGE_CONFLICT_RETRIES + 1
+    for attempt in range(attempts):
+        conversation = Conversation.objects.get(conversation_id=job.conversation_id)
+        # Leave out this message and user messages submitted after it.
+        history = [
+            m
+            for m in MessageView.get_history(conversation)
+            if m.role == Message.Role.SYSTEM or m.created_at < job.message.created_at
+        ]
+        # A job submitted later for the same conversation may have set the
+        # topic already.
+        created = job.new_conversation and MessageView.undefined_topic(conversation)
+        fields, bot_response = MessageView.generate_reply(
+            client, conversation, created, history, job.message.message
+        )
+
+        try:
+            commit_reply(job, conversation, fields, bot_response)
+            return
+        except ConversationConflict:
+            if attempt == attempts - 1:
+                raise
+
+
+def commit_reply(
+    job: MessageJob, conversation: Conversation, fields, bot_response: str
+):
+    with transaction.atomic():
+        reply = Message.objects.create(
+            conversation=conversation,
+            role=Message.Role.SYSTEM,
+            message=bot_response,
+        )
+        conversation.push_recent_messages(reply)
+        fields = {**fields, "recent_messages": conversation.recent_messages}
+        linked = conversation.link_topic(fields)
+        if not conversation.update_if_unchanged(**fields):
+            raise ConversationConflict()
+        if linked:
+            TopicDailyStat.record(conversation)
+        if not finish(job, MessageJob.Status.DONE, reply=reply):
+            raise JobLost(job.job_id)
+
+
+def finish(job: MessageJob, status: str, error: str = "", reply=None) -> bool:
+    """
+    Store the outcome of the job unless another worker claimed it since.
+    """
+    updated = MessageJob.objects.filter(
+        job_id=job.job_id,
+        status=MessageJob.Status.RUNNING,
+        attempts=job.attempts,
+    ).update(
+        status=status,
+        error=error,
+        reply=reply,
+        finished_at=timezone.now() if status != MessageJob.Status.QUEUED else None,
+    )
+    if updated:
+        job.status, job.error, job.reply = status, error, reply
+        jobs.inc(status=status)
+        if job.finished:
+            # Sent when the transaction commits.
+            job_events.notify_finished(job.job_id)
+    return bool(updated)
@@ -0,0 +1,156 @@
+import gzip
+import os
+import time
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+
+from conversation.export import ndjson_line, ordered_messages, serialize_conversation
+from conversation.models import Conversation, Message, MessageJob
+from lms.admission import purge_conversation_buckets
+
+
+class Command(BaseCommand):
+    help = (
+        "Archive conversations inactive for longer than the retention period "
+        "into gzipped NDJSON files, then delete them. Finished message jobs "
+        "past the retention period and idle admission buckets are deleted too."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--older-than-days",
+            type=int,
+            default=settings.CONVERSATION_RETENTION_DAYS,
+        )
+        parser.add_argument("--output-dir", default=settings.ARCHIVE_DIR)
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=500,
+            help="Conversations per archive file and delete transaction",
+        )
+        parser.add_argument(
+            "--sleep",
+            type=float,
+            default=0.5,
+            help="Seconds to wait between chunks",
+        )
+        parser.add_argument(
+            "--max-chunks", type=int, help="Stop after this many chunks"
+        )
+
+    def handle(self, *args, older_than_days, output_dir, chunk_size, **options):
+        """
+        Each chunk is archived and deleted before the next one is read, so an
+        interrupted run loses nothing and the next run picks up where it
+        stopped. A crash between the two steps can leave a conversation in
+        two archives; ``conversation_id`` identifies the duplicates.
+        """
+        cutoff = timezone.now() - timedelta(days=older_than_days)
+        output_dir = Path(output_dir)
+        output_dir.mkdir(parents=True, exist_ok=True)
+
+        archived = deleted = chunks = 0
+        last_id = None
+        while options["max_chunks"] is None or chunks < options["max_chunks"]:
+            qs = Conversation.objects.filter(updated_at__lt=cutoff)
+            if last_id:
+                qs = qs.filter(conversation_id__gt=last_id)
+            batch = list(
+                qs.order_by("conversation_id")
+                .defer("recent_messages")
+                .prefetch_related(ordered_messages())[:chunk_size]
+            )
+            if not batch:
+                break
+            last_id = batch[-1].conversation_id
+
+            self.write_archive(output_dir / f"conversations-{last_id}.ndjson.gz", batch)
+            archived += len(batch)
+            deleted += self.delete(batch, cutoff)
+            chunks += 1
+            time.sleep(options["sleep"])
+
+        jobs = self.purge_jobs(cutoff, chunk_size)
+        purge_conversation_buckets()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Archived {archived} conversations in {chunks} files to "
+                f"{output_dir}, deleted {deleted} and {jobs} finished jobs."
+            )
+        )
+
+    @staticmethod
+    def write_archive(path: Path, conversations):
+        """
+        Written under a temporary name and renamed once synced, so a file
+        with the final name is always complete.
+        """
+        partial = path.with_name(path.name + ".partial")
+        with open(partial, "wb") as raw:
+            with gzip.open(raw, "wt", encoding="utf-8") as archive:
+                for conversation in conversations:
+                    archive.write(ndjson_line(serialize_conversation(conversation)))
+            raw.flush()
+            os.fsync(raw.fileno())
+        os.replace(partial, path)
+
+    @staticmethod
+    def delete(conversations, cutoff) -> int:
+        """
+        Delete the archived conversations that are still inactive, with plain
+        DELETE statements instead of Django's in-memory cascade. Locking the
+        rows first makes a concurrent turn wait and then fail its version
+        check.
+        """
+        with transaction.atomic():
+            ids = list(
+                Conversation.objects.select_for_update()
+                .filter(
+                    conversation_id__in=[c.conversation_id for c in conversations],
+                    updated_at__lt=cutoff,
+                )
+                .values_list("conversation_id", flat=True)
+            )
+            # Jobs are transient and not archived.
+            delete_rows(MessageJob, "conversation", ids)
+            delete_rows(Message, "conversation", ids)
+            delete_rows(Conversation, "conversation_id", ids)
+        return len(ids)
+
+    @staticmethod
+    def purge_jobs(cutoff, chunk_size: int) -> int:
+        """
+        Delete jobs finished before ``cutoff`` in conversations still kept,
+        ``chunk_size`` at a time.
+        """
+        purged = 0
+        while True:
+            ids = list(
+                MessageJob.objects.filter(
+                    status__in=[MessageJob.Status.DONE, MessageJob.Status.FAILED],
+                    finished_at__lt=cutoff,
+                ).values_list("job_id", flat=True)[:chunk_size]
+            )
+            if not ids:
+                return purged
+            purged += delete_rows(MessageJob, "job_id", ids)
+
+
+def delete_rows(model, field: str, values) -> int:
+    """
+    Delete the rows of ``model`` whose ``field`` is one of ``values`` in one
+    statement, without loading them or sending delete signals.
+    """
+    if not values:
+        return 0
+    table = connection.ops.quote_name(model._meta.db_table)
+    column = connection.ops.quote_name(model._meta.get_field(field).column)
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {table} WHERE {column} = ANY(%s)", [values])
+        return cursor.rowcount
@@ -0,0 +1,86 @@
+import gzip
+import json
+import os
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from conversation.export import export_lines, parse_bound
+
+
+class Command(BaseCommand):
+    help = "Export conversations with their messages as NDJSON."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--output",
+            default="-",
+            help="File to write, gzipped if it ends in .gz; '-' for stdout",
+        )
+        parser.add_argument("--since", help="Only conversations updated since")
+        parser.add_argument("--until", help="Only conversations updated before")
+        parser.add_argument(
+            "--incremental",
+            action="store_true",
+            help="Start where the last incremental export stopped",
+        )
+        parser.add_argument("--state-file", default=settings.EXPORT_STATE_FILE)
+        parser.add_argument(
+            "--lag",
+            type=float,
+            default=settings.EXPORT_LAG,
+            help="Seconds an incremental export stays behind the clock",
+        )
+        parser.add_argument("--chunk-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        try:
+            since = options["since"] and parse_bound(options["since"])
+            until = options["until"] and parse_bound(options["until"])
+        except ValueError as e:
+            raise CommandError(e) from e
+
+        state_file = Path(options["state_file"])
+        if options["incremental"]:
+            if since:
+                raise CommandError("--since cannot be combined with --incremental.")
+            since = self.read_state(state_file)
+            # Rows updated while the export runs, or committed later with an
+            # earlier updated_at, are left for the next one.
+            until = until or timezone.now() - timedelta(seconds=options["lag"])
+
+        lines = export_lines(since, until, options["chunk_size"])
+        count = self.write(options["output"], lines)
+
+        if options["incremental"]:
+            self.write_state(state_file, until)
+        self.stderr.write(f"Exported {count} conversations.")
+
+    def write(self, output: str, lines) -> int:
+        count = 0
+        if output == "-":
+            for count, line in enumerate(lines, 1):
+                self.stdout.write(line, ending="")
+            return count
+
+        opener = gzip.open if output.endswith(".gz") else open
+        with opener(output, "wt", encoding="utf-8") as export:
+            for count, line in enumerate(lines, 1):
+                export.write(line)
+        return count
+
+    @staticmethod
+    def read_state(state_file: Path):
+        if not state_file.exists():
+            return None
+        return parse_bound(json.loads(state_file.read_text())["exported_until"])
+
+    @staticmethod
+    def write_state(state_file: Path, until):
+        state_file.parent.mkdir(parents=True, exist_ok=True)
+        partial = state_file.with_name(state_file.name + ".partial")
+        partial.write_text(json.dumps({"exported_until": until.isoformat()}))
+        os.replace(partial, state_file)
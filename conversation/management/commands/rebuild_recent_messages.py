@@ -0,0 +1,67 @@
+import operator
+from functools import reduce
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from conversation.models import Conversation, Message
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild Conversation.recent_messages from the message table, e.g. "
+        "after the migration or after CONVERSATION_RECENT_WINDOW changed."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument(
+            "--only-empty",
+            action="store_true",
+            help="Skip conversations that already have a window",
+        )
+
+    def handle(self, *args, batch_size, only_empty, **options):
+        rebuilt = skipped = 0
+        last_id = None
+        while True:
+            qs = Conversation.objects.order_by("conversation_id")
+            if last_id:
+                qs = qs.filter(conversation_id__gt=last_id)
+            batch = list(
+                qs.only("conversation_id", "version", "recent_messages")[:batch_size]
+            )
+            if not batch:
+                break
+            last_id = batch[-1].conversation_id
+            if only_empty:
+                batch = [c for c in batch if not c.recent_messages]
+            if not batch:
+                continue
+
+            messages = Message.get_last_messages_by_conversation(
+                [c.conversation_id for c in batch],
+                settings.CONVERSATION_RECENT_WINDOW,
+            )
+            for conversation in batch:
+                conversation.set_recent_messages(
+                    messages.get(conversation.conversation_id, [])
+                )
+            # Same version check as a turn, without bumping the version: a
+            # turn committed meanwhile already wrote a fresher window.
+            unchanged = reduce(
+                operator.or_,
+                (Q(pk=c.pk, version=c.version) for c in batch),
+            )
+            updated = Conversation.objects.filter(unchanged).bulk_update(
+                batch, ["recent_messages"], batch_size=batch_size
+            )
+            rebuilt += updated
+            skipped += len(batch) - updated
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Rebuilt {rebuilt} conversations, skipped {skipped} that changed."
+            )
+        )
@@ -0,0 +1,76 @@
+import signal
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from conversation.jobs import claim_jobs, run_job
+from lms import get_client
+
+
+class Command(BaseCommand):
+    help = (
+        "Process message jobs submitted to message/jobs. Several workers can "
+        "run side by side; each claims its own jobs."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=settings.JOB_CONCURRENCY,
+            help="Jobs processed at the same time",
+        )
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=settings.JOB_POLL_INTERVAL,
+            help="Seconds to wait for new jobs when the queue is empty",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Exit once the queue is empty instead of waiting for jobs",
+        )
+
+    def handle(self, *args, concurrency, poll_interval, once, **options):
+        """
+        Jobs are claimed only while a thread is free, so queued jobs stay
+        available to other workers. SIGTERM and SIGINT stop claiming and let
+        the running jobs finish.
+        """
+        stop = threading.Event()
+        if threading.current_thread() is threading.main_thread():
+            for signum in (signal.SIGTERM, signal.SIGINT):
+                signal.signal(signum, lambda *_: stop.set())
+
+        client = get_client()
+        processed = 0
+        running = set()
+        with ThreadPoolExecutor(
+            max_workers=concurrency, thread_name_prefix="message-job"
+        ) as executor:
+            while not stop.is_set():
+                close_old_connections()
+                claimed = claim_jobs(concurrency - len(running))
+                for job in claimed:
+                    running.add(executor.submit(run_job, client, job))
+
+                if not running:
+                    if once:
+                        break
+                    stop.wait(poll_interval)
+                    continue
+
+                done, running = wait(
+                    running,
+                    timeout=None if len(running) == concurrency else poll_interval,
+                    return_when=FIRST_COMPLETED,
+                )
+                processed += len(done)
+
+            processed += len(wait(running).done)
+
+        self.stdout.write(self.style.SUCCESS(f"Processed {processed} jobs."))
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-18 19:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("conversation", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="conversation",
+            name="version",
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
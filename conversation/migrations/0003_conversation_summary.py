@@ -0,0 +1,23 @@
+# Generated by Django 5.2.5 on 2026-10-18 19:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("conversation", "0002_conversation_version"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="conversation",
+            name="summarized_until",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="conversation",
+            name="summary",
+            field=models.TextField(blank=True, default=""),
+        ),
+    ]
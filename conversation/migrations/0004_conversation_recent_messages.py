@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-18 19:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("conversation", "0003_conversation_summary"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="conversation",
+            name="recent_messages",
+            field=models.JSONField(blank=True, default=list),
+        ),
+    ]
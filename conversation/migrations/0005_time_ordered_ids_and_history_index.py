@@ -0,0 +1,78 @@
+# Generated by Django 5.2.5 on 2026-10-18 19:32
+
+import conversation.utils
+import django.db.models.deletion
+from django.contrib.postgres.operations import (
+    AddIndexConcurrently,
+    RemoveIndexConcurrently,
+)
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # CREATE/DROP INDEX CONCURRENTLY cannot run inside a transaction.
+    atomic = False
+
+    dependencies = [
+        ("conversation", "0004_conversation_recent_messages"),
+    ]
+
+    # The history index is built before the indexes it replaces are dropped,
+    # both without locking the table against writes.
+    operations = [
+        AddIndexConcurrently(
+            model_name="message",
+            index=models.Index(
+                fields=["conversation", "created_at", "message_id"],
+                name="message_conv_created_id_idx",
+            ),
+        ),
+        RemoveIndexConcurrently(
+            model_name="message",
+            name="message_convers_5aa82f_idx",
+        ),
+        migrations.AlterField(
+            model_name="conversation",
+            name="conversation_id",
+            field=models.UUIDField(
+                default=conversation.utils.uuid7,
+                editable=False,
+                primary_key=True,
+                serialize=False,
+            ),
+        ),
+        migrations.AlterField(
+            model_name="message",
+            name="conversation",
+            field=models.ForeignKey(
+                db_index=False,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="messages",
+                to="conversation.conversation",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="message",
+            name="created_at",
+            field=models.DateTimeField(auto_now_add=True),
+        ),
+        migrations.AlterField(
+            model_name="message",
+            name="message_id",
+            field=models.UUIDField(
+                default=conversation.utils.uuid7,
+                editable=False,
+                primary_key=True,
+                serialize=False,
+            ),
+        ),
+        migrations.AlterField(
+            model_name="message",
+            name="role",
+            field=models.CharField(
+                choices=[("system", "System"), ("user", "User")],
+                default="user",
+                max_length=10,
+            ),
+        ),
+    ]
@@ -0,0 +1,85 @@
+# Generated by Django 5.2.5 on 2026-10-18 20:14
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("conversation", "0006_message_job"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Topic",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("name", models.TextField(unique=True)),
+                ("label", models.TextField()),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                "db_table": "topic",
+            },
+        ),
+        migrations.AddField(
+            model_name="conversation",
+            name="canonical_topic",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="conversations",
+                to="conversation.topic",
+            ),
+        ),
+        migrations.CreateModel(
+            name="TopicDailyStat",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("day", models.DateField()),
+                ("stance", models.CharField(max_length=5)),
+                ("conversations", models.PositiveIntegerField(default=0)),
+                (
+                    "topic",
+                    models.ForeignKey(
+                        db_index=False,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="daily_stats",
+                        to="conversation.topic",
+                    ),
+                ),
+            ],
+            options={
+                "db_table": "topic_daily_stat",
+                "indexes": [
+                    models.Index(
+                        fields=["day", "stance"], name="topic_daily_stat_day_idx"
+                    )
+                ],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("topic", "day", "stance"),
+                        name="topic_daily_stat_unique",
+                    )
+                ],
+            },
+        ),
+    ]
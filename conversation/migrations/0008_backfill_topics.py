@@ -0,0 +1,89 @@
+import re
+import unicodedata
+from collections import Counter
+
+from django.db import migrations
+from django.utils import timezone
+
+BATCH_SIZE = 2000
+
+# Frozen copy of ``RECORD_TOPIC_STATS``: adds to conversations counted since
+# the tables were created.
+RECORD_TOPIC_STATS = """
+INSERT INTO topic_daily_stat AS s (topic_id, day, stance, conversations)
+VALUES (%(topic)s, %(day)s, %(stance)s, %(count)s)
+ON CONFLICT (topic_id, day, stance) DO UPDATE SET
+    conversations = s.conversations + EXCLUDED.conversations
+"""
+
+
+def normalize(message):
+    # Frozen copy of ``lms.classifier.normalize``.
+    text = unicodedata.normalize("NFKD", message.casefold())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    text = re.sub(r"[^\w\s]", " ", text)
+    return " ".join(text.split())
+
+
+def canonical_name(topic, stance):
+    # Frozen copy of ``Topic.canonical_name``.
+    if topic in ("Undefined", "und") or stance not in ("pro", "con"):
+        return None
+    return normalize(topic) or None
+
+
+def backfill_topics(apps, schema_editor):
+    """
+    Link existing conversations to their canonical topic and count them per
+    topic, day and stance, as ``Conversation.link_topic`` does for new ones.
+    """
+    Conversation = apps.get_model("conversation", "Conversation")
+    Topic = apps.get_model("conversation", "Topic")
+
+    topics = {topic.name: topic.pk for topic in Topic.objects.all()}
+    counts = Counter()
+    pending = []
+    conversations = (
+        Conversation.objects.filter(canonical_topic__isnull=True)
+        .only("topic", "stance", "created_at")
+        .order_by("pk")
+    )
+    for conversation in conversations.iterator(chunk_size=BATCH_SIZE):
+        name = canonical_name(conversation.topic, conversation.stance)
+        if name is None:
+            continue
+        if name not in topics:
+            topics[name] = Topic.objects.create(name=name, label=conversation.topic).pk
+        conversation.canonical_topic_id = topics[name]
+        day = timezone.localdate(conversation.created_at)
+        counts[topics[name], day, conversation.stance] += 1
+        pending.append(conversation)
+        if len(pending) == BATCH_SIZE:
+            Conversation.objects.bulk_update(pending, ["canonical_topic"])
+            pending = []
+    Conversation.objects.bulk_update(pending, ["canonical_topic"])
+
+    with schema_editor.connection.cursor() as cursor:
+        cursor.executemany(
+            RECORD_TOPIC_STATS,
+            [
+                {"topic": topic, "day": day, "stance": stance, "count": count}
+                for (topic, day, stance), count in counts.items()
+            ],
+        )
+
+
+def clear_topics(apps, schema_editor):
+    apps.get_model("conversation", "TopicDailyStat").objects.all().delete()
+    apps.get_model("conversation", "Conversation").objects.update(canonical_topic=None)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("conversation", "0007_topic"),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_topics, clear_topics),
+    ]
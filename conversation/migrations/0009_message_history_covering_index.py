@@ -0,0 +1,33 @@
+# Generated by Django 5.2.5 on 2026-10-18 20:30
+
+from django.contrib.postgres.operations import (
+    AddIndexConcurrently,
+    RemoveIndexConcurrently,
+)
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # CREATE/DROP INDEX CONCURRENTLY cannot run inside a transaction.
+    atomic = False
+
+    dependencies = [
+        ("conversation", "0008_backfill_topics"),
+    ]
+
+    # The covering index is built before the index it replaces is dropped,
+    # both without locking the table against writes.
+    operations = [
+        AddIndexConcurrently(
+            model_name="message",
+            index=models.Index(
+                fields=["conversation", "created_at", "message_id"],
+                include=("role",),
+                name="message_history_covering_idx",
+            ),
+        ),
+        RemoveIndexConcurrently(
+            model_name="message",
+            name="message_conv_created_id_idx",
+        ),
+    ]
@@ -1,6 +1,84 @@
-import uuid
-from django.db import models
-from django.db.models import QuerySet
+from collections import Counter
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from uuid import UUID
+
+from django.conf import settings
+from django.db import connection, models, transaction
+from django.db.models import F, Q, QuerySet, Sum, Window
+from django.db.models.functions import RowNumber
+from django.utils import timezone
+
+from conversation.utils import uuid7
+from lms.classifier import normalize
+
+# Id of the topic named ``name``, inserted if missing. Without a write when
+# it exists, so popular topics do not leave a dead row per conversation.
+RESOLVE_TOPIC = """
+WITH created AS (
+    INSERT INTO topic (name, label, created_at)
+    VALUES (%(name)s, %(label)s, clock_timestamp())
+    ON CONFLICT (name) DO NOTHING
+    RETURNING id
+)
+SELECT id FROM created
+UNION ALL
+SELECT id FROM topic WHERE name = %(name)s
+"""
+
+# Add ``count`` conversations to a topic, day and stance.
+RECORD_TOPIC_STATS = """
+INSERT INTO topic_daily_stat AS s (topic_id, day, stance, conversations)
+VALUES (%(topic)s, %(day)s, %(stance)s, %(count)s)
+ON CONFLICT (topic_id, day, stance) DO UPDATE SET
+    conversations = s.conversations + EXCLUDED.conversations
+"""
+
+
+class Topic(models.Model):
+    """
+    Canonical debate topic. Topics that normalize to the same ``name``
+    ("Remote work", "remote  WORK!") share one row; ``label`` keeps the
+    first spelling.
+    """
+
+    name = models.TextField(unique=True)
+    label = models.TextField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = "topic"
+
+    def __str__(self):
+        return self.label
+
+    @staticmethod
+    def canonical_name(topic: str, stance: str) -> Optional[str]:
+        """
+        Normalized topic name, ``None`` while the topic or the stance is
+        undefined
+        """
+        if topic in ("Undefined", "und") or stance not in ("pro", "con"):
+            return None
+        return normalize(topic) or None
+
+    @classmethod
+    def resolve(cls, topic: str, stance: str) -> Optional[int]:
+        """
+        Id of the canonical topic, created on first use, in one query
+        """
+        name = cls.canonical_name(topic, stance)
+        if name is None:
+            return None
+        with connection.cursor() as cursor:
+            # A topic inserted by a transaction still in progress is not
+            # visible yet; the second attempt runs once it committed.
+            for _ in range(2):
+                cursor.execute(RESOLVE_TOPIC, {"name": name, "label": topic})
+                row = cursor.fetchone()
+                if row:
+                    return row[0]
+        raise cls.DoesNotExist(name)
 
 
 class Conversation(models.Model):
@@ -8,11 +86,21 @@ class Conversation(models.Model):
     Represents a user conversation.
     """
 
-    conversation_id = models.UUIDField(
-        primary_key=True, default=uuid.uuid4, editable=False
-    )
+    conversation_id = models.UUIDField(primary_key=True, default=uuid7, editable=False)
     topic = models.TextField()
     stance = models.CharField(max_length=5)
+    version = models.PositiveIntegerField(default=0)
+    summary = models.TextField(blank=True, default="")
+    summarized_until = models.DateTimeField(null=True, blank=True)
+    recent_messages = models.JSONField(default=list, blank=True)
+    # Set once topic and stance are both defined, see ``link_topic``.
+    canonical_topic = models.ForeignKey(
+        Topic,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="conversations",
+    )
     created_at = models.DateTimeField(auto_now_add=True, db_index=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -20,9 +108,102 @@ class Conversation(models.Model):
         return f"Conversation {self.conversation_id}"
 
     def set_topic_and_stance(self, topic, stance):
-        self.topic = topic
-        self.stance = stance
-        self.save()
+        fields = {"topic": topic, "stance": stance}
+        linked = self.link_topic(fields)
+        for name, value in fields.items():
+            setattr(self, name, value)
+        with transaction.atomic():
+            self.save()
+            if linked:
+                TopicDailyStat.record(self)
+
+    def link_topic(self, fields: Dict) -> bool:
+        """
+        Add the canonical topic to ``fields`` when they define the topic and
+        stance of a conversation that has none linked yet. When it did, the
+        conversation is counted with ``TopicDailyStat.record`` once the
+        fields are stored, in the same transaction.
+        """
+        if self.canonical_topic_id:
+            return False
+        topic_id = Topic.resolve(
+            fields.get("topic", self.topic), fields.get("stance", self.stance)
+        )
+        if topic_id is None:
+            return False
+        fields["canonical_topic_id"] = topic_id
+        return True
+
+    def update_if_unchanged(self, **fields) -> bool:
+        """
+        Persist ``fields`` only if the row still has the version this instance
+        was read with, bumping the version on success (optimistic concurrency).
+        """
+        fields["updated_at"] = timezone.now()
+        updated = Conversation.objects.filter(
+            conversation_id=self.conversation_id, version=self.version
+        ).update(version=F("version") + 1, **fields)
+        if not updated:
+            return False
+
+        for name, value in fields.items():
+            setattr(self, name, value)
+        self.version += 1
+        return True
+
+    def get_recent_messages(self) -> List["Message"]:
+        """
+        Unsaved ``Message`` instances for the denormalized window of recent
+        messages, oldest first.
+        """
+        return [
+            Message(
+                message_id=entry["message_id"],
+                conversation=self,
+                role=entry["role"],
+                message=entry["message"],
+                created_at=datetime.fromisoformat(entry["created_at"]),
+            )
+            for entry in self.recent_messages
+        ]
+
+    def set_recent_messages(self, messages: List["Message"]):
+        """
+        Replace the window with the last ``CONVERSATION_RECENT_WINDOW`` of
+        ``messages`` (oldest first). Only changes the instance.
+        """
+        size = settings.CONVERSATION_RECENT_WINDOW
+        self.recent_messages = [self.window_entry(m) for m in messages[-size:]]
+
+    def push_recent_messages(self, *messages: "Message"):
+        """
+        Append ``messages`` to the window, dropping the oldest entries past
+        ``CONVERSATION_RECENT_WINDOW``. Only changes the instance.
+        """
+        size = settings.CONVERSATION_RECENT_WINDOW
+        window = self.recent_messages + [self.window_entry(m) for m in messages]
+        self.recent_messages = window[-size:]
+
+    def get_unsummarized_recent_messages(self, quantity: int) -> List["Message"]:
+        """
+        The last ``quantity`` messages of the window not yet folded into the
+        summary, oldest first.
+        """
+        messages = [
+            m
+            for m in self.get_recent_messages()
+            if not self.summarized_until or m.created_at > self.summarized_until
+        ]
+        return messages[-quantity:] if quantity > 0 else []
+
+    @staticmethod
+    def window_entry(message: "Message") -> Dict[str, str]:
+        return {
+            "message_id": str(message.message_id),
+            "role": message.role,
+            "message": message.message,
+            "created_at": message.created_at.isoformat(),
+        }
 
 
 class Message(models.Model):
@@ -34,27 +215,33 @@ class Message(models.Model):
         SYSTEM = "system", "System"
         USER = "user", "User"
 
-    message_id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    message_id = models.UUIDField(primary_key=True, default=uuid7, editable=False)
 
     conversation = models.ForeignKey(
         Conversation,
         on_delete=models.CASCADE,
         related_name="messages",
-        db_index=True,
+        # Covered by the leading column of the history index below.
+        db_index=False,
     )
 
-    role = models.CharField(
-        max_length=10, choices=Role.choices, default=Role.USER, db_index=True
-    )
+    role = models.CharField(max_length=10, choices=Role.choices, default=Role.USER)
     message = models.TextField()
-    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         db_table = "message"
         ordering = ["created_at", "message_id"]
         indexes = [
-            models.Index(fields=["conversation", "created_at"]),
+            # History reads: a conversation's messages by (created_at,
+            # message_id), newest or oldest first. Only ``role`` is included;
+            # the message text is read from the table, so the index stays small.
+            models.Index(
+                fields=["conversation", "created_at", "message_id"],
+                include=["role"],
+                name="message_history_covering_idx",
+            ),
         ]
 
     def __str__(self):
@@ -70,7 +257,212 @@ class Message(models.Model):
         qs = (
             cls.objects.filter(conversation=conversation)
             .select_related("conversation")
-            .order_by("-created_at")
+            .order_by("-created_at", "-message_id")
         )[: max(quantity, 0)]
 
         return qs
+
+    @classmethod
+    def get_last_messages_by_conversation(
+        cls, conversation_ids: List[UUID], quantity: int
+    ) -> Dict[UUID, List["Message"]]:
+        """
+        The last ``quantity`` messages of each conversation, oldest first, in
+        one query.
+        """
+        rank = Window(
+            RowNumber(),
+            partition_by=F("conversation_id"),
+            order_by=[F("created_at").desc(), F("message_id").desc()],
+        )
+        qs = (
+            cls.objects.filter(conversation_id__in=conversation_ids)
+            .annotate(rank=rank)
+            .filter(rank__lte=max(quantity, 0))
+            .order_by("conversation_id", "created_at", "message_id")
+        )
+        messages = {}
+        for message in qs:
+            messages.setdefault(message.conversation_id, []).append(message)
+        return messages
+
+    @classmethod
+    def get_page(
+        cls,
+        conversation_id,
+        limit: int,
+        since: Optional[Tuple[datetime, UUID]] = None,
+        before: Optional[Tuple[datetime, UUID]] = None,
+    ) -> List["Message"]:
+        """
+        Up to ``limit`` messages after ``since``, oldest first, or the last
+        ones before ``before`` (or at all), newest first. Keyset pagination on
+        the ``(created_at, message_id)`` history index, not OFFSET.
+        """
+        qs = cls.objects.filter(conversation_id=conversation_id).only(
+            "message_id", "role", "message", "created_at"
+        )
+        if since:
+            created_at, message_id = since
+            qs = qs.filter(
+                Q(created_at__gt=created_at)
+                | Q(created_at=created_at, message_id__gt=message_id),
+                created_at__gte=created_at,
+            ).order_by("created_at", "message_id")
+        else:
+            if before:
+                created_at, message_id = before
+                qs = qs.filter(
+                    Q(created_at__lt=created_at)
+                    | Q(created_at=created_at, message_id__lt=message_id),
+                    created_at__lte=created_at,
+                )
+            qs = qs.order_by("-created_at", "-message_id")
+        return list(qs[: max(limit, 0)])
+
+    @classmethod
+    def get_unsummarized_messages(
+        cls, conversation: Conversation, quantity: int
+    ) -> QuerySet["Message"]:
+        """
+        Retrieve the latest messages not yet folded into the conversation
+        summary.
+        """
+        qs = cls.objects.filter(conversation=conversation)
+        if conversation.summarized_until:
+            qs = qs.filter(created_at__gt=conversation.summarized_until)
+        return qs.order_by("-created_at", "-message_id")[: max(quantity, 0)]
+
+
+class MessageJob(models.Model):
+    """
+    A turn accepted for background processing: the user message is stored
+    when the job is submitted and the reply by the ``run_message_jobs``
+    worker.
+    """
+
+    class Status(models.TextChoices):
+        QUEUED = "queued", "Queued"
+        RUNNING = "running", "Running"
+        DONE = "done", "Done"
+        FAILED = "failed", "Failed"
+
+    job_id = models.UUIDField(primary_key=True, default=uuid7, editable=False)
+    conversation = models.ForeignKey(
+        Conversation, on_delete=models.CASCADE, related_name="jobs"
+    )
+    message = models.OneToOneField(
+        Message, on_delete=models.CASCADE, related_name="job"
+    )
+    reply = models.OneToOneField(
+        Message,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="reply_to_job",
+    )
+    new_conversation = models.BooleanField(default=False)
+    status = models.CharField(
+        max_length=10, choices=Status.choices, default=Status.QUEUED
+    )
+    attempts = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True, default="")
+    created_at = models.DateTimeField(auto_now_add=True)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = "message_job"
+        indexes = [
+            # Claim query: the oldest unfinished jobs. Finished jobs, the
+            # bulk of the table, are left out of the index.
+            models.Index(
+                fields=["created_at"],
+                condition=models.Q(status__in=["queued", "running"]),
+                name="message_job_pending_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return f"Job {self.job_id} · {self.status}"
+
+    @property
+    def finished(self) -> bool:
+        return self.status in (self.Status.DONE, self.Status.FAILED)
+
+
+class TopicDailyStat(models.Model):
+    """
+    Conversations per topic, day and stance, counted when their topic and
+    stance are first defined, on the day the conversation started. Kept up
+    to date by ``Conversation.link_topic`` callers, so analytics read a few
+    rows instead of grouping conversations by their free-form topic.
+    """
+
+    topic = models.ForeignKey(
+        Topic,
+        on_delete=models.CASCADE,
+        related_name="daily_stats",
+        # Covered by the leading column of the unique constraint.
+        db_index=False,
+    )
+    day = models.DateField()
+    stance = models.CharField(max_length=5)
+    conversations = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        db_table = "topic_daily_stat"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["topic", "day", "stance"], name="topic_daily_stat_unique"
+            ),
+        ]
+        indexes = [
+            # Stats queries: a range of days, optionally for one stance.
+            models.Index(fields=["day", "stance"], name="topic_daily_stat_day_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.topic_id} · {self.day} · {self.stance}: {self.conversations}"
+
+    @classmethod
+    def top_topics(
+        cls, since, until, stance: Optional[str] = None, limit: int = 10
+    ) -> List[Dict]:
+        """
+        The ``limit`` topics with the most conversations from ``since`` to
+        ``until`` (both included), with the count for each stance
+        """
+        qs = cls.objects.filter(day__gte=since, day__lte=until)
+        if stance:
+            qs = qs.filter(stance=stance)
+        return list(
+            qs.values("topic__name", "topic__label")
+            .annotate(
+                total=Sum("conversations"),
+                pro=Sum("conversations", filter=Q(stance="pro"), default=0),
+                con=Sum("conversations", filter=Q(stance="con"), default=0),
+            )
+            .order_by("-total", "topic__name")[: max(limit, 0)]
+        )
+
+    @staticmethod
+    def record(*conversations: Conversation):
+        """
+        Count ``conversations``, which were just linked to their topic, with
+        one upsert per topic, day and stance.
+        """
+        counts = Counter(
+            (c.canonical_topic_id, timezone.localdate(c.created_at), c.stance)
+            for c in conversations
+        )
+        if not counts:
+            return
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                RECORD_TOPIC_STATS,
+                [
+                    {"topic": topic, "day": day, "stance": stance, "count": count}
+                    for (topic, day, stance), count in counts.items()
+                ],
+            )
@@ -1,6 +1,19 @@
+import re
+import uuid
+from datetime import timedelta
+from typing import Dict, Optional
+
+from django.conf import settings
+from django.utils import timezone
 from rest_framework import serializers
 
+from chatbot import metrics
+
 from conversation.models import Message, Conversation
+from conversation.utils import decode_cursor
+
+# Characters the CharField validators reject: NUL and lone surrogates.
+PROHIBITED_CHARACTERS = re.compile(r"[\x00\ud800-\udfff]")
 
 
 class MessageRequestSerializer(serializers.Serializer):
@@ -17,6 +30,150 @@ class MessageRequestSerializer(serializers.Serializer):
     conversation_id = serializers.UUIDField(required=False, allow_null=True)
     message = serializers.CharField(max_length=500)
 
+    @classmethod
+    def fast_validate(cls, data) -> Optional[Dict]:
+        """
+        The ``validated_data`` of a well-formed request, checked without the
+        field machinery. ``None`` when the request needs the full serializer,
+        which also builds the error messages.
+        """
+        if type(data) is not dict or type(data.get("message")) is not str:
+            return None
+        message = data["message"].strip()
+        if (
+            not message
+            or len(message) > cls._declared_fields["message"].max_length
+            or PROHIBITED_CHARACTERS.search(message)
+        ):
+            return None
+
+        validated = {}
+        if "conversation_id" in data:
+            conversation_id = data["conversation_id"]
+            if conversation_id is not None:
+                if type(conversation_id) is not str:
+                    return None
+                try:
+                    conversation_id = uuid.UUID(hex=conversation_id)
+                except ValueError:
+                    return None
+            validated["conversation_id"] = conversation_id
+        validated["message"] = message
+        return validated
+
+
+def validate_message_request(data) -> Dict:
+    """
+    Validate a ``MessageRequestSerializer`` body. With ``FAST_SERIALIZATION``
+    well-formed requests skip the serializer; the others go through it and
+    raise its ``ValidationError``.
+    """
+    if settings.FAST_SERIALIZATION:
+        validated = MessageRequestSerializer.fast_validate(data)
+        if validated is not None:
+            return validated
+
+    serializer = MessageRequestSerializer(data=data)
+    serializer.is_valid(raise_exception=True)
+    return serializer.validated_data
+
+
+class BatchMessageRequestSerializer(serializers.Serializer):
+    """
+    Serializer to validate a batch of independent messages. Only the list is
+    checked here; ``run_batch`` validates each item and reports its errors in
+    the item's result.
+
+    Expected JSON body:
+    {
+        "items": [{"conversation_id": "UUID | null", "message": "string"}]
+    }
+    """
+
+    items = serializers.ListField(allow_empty=False)
+
+    def validate_items(self, items):
+        if len(items) > settings.BATCH_MAX_ITEMS:
+            raise serializers.ValidationError(
+                f"Ensure this field has no more than {settings.BATCH_MAX_ITEMS} "
+                "elements."
+            )
+        return items
+
+
+class MessagePageRequestSerializer(serializers.Serializer):
+    """
+    Query parameters of a page of conversation messages. ``since`` and
+    ``before`` are cursors from a previous page; ``limit`` is capped at
+    ``MESSAGES_PAGE_MAX``.
+    """
+
+    limit = serializers.IntegerField(min_value=1, required=False)
+    since = serializers.CharField(required=False)
+    before = serializers.CharField(required=False)
+
+    def validate_limit(self, limit):
+        return min(limit, settings.MESSAGES_PAGE_MAX)
+
+    def validate_since(self, cursor):
+        return self.decode(cursor)
+
+    def validate_before(self, cursor):
+        return self.decode(cursor)
+
+    def validate(self, attrs):
+        if "since" in attrs and "before" in attrs:
+            raise serializers.ValidationError("Use either since or before.")
+        attrs.setdefault("limit", settings.MESSAGES_PAGE_SIZE)
+        return attrs
+
+    @staticmethod
+    def decode(cursor: str):
+        try:
+            return decode_cursor(cursor)
+        except ValueError as e:
+            raise serializers.ValidationError("Invalid cursor.") from e
+
+
+class TopicStatsRequestSerializer(serializers.Serializer):
+    """
+    Query parameters of the topic stats. The range defaults to the last
+    ``TOPIC_STATS_DAYS`` days and spans at most ``TOPIC_STATS_MAX_DAYS``;
+    ``limit`` is capped at ``TOPIC_STATS_MAX_LIMIT``.
+    """
+
+    since = serializers.DateField(required=False)
+    until = serializers.DateField(required=False)
+    stance = serializers.ChoiceField(choices=["pro", "con"], required=False)
+    limit = serializers.IntegerField(min_value=1, required=False)
+
+    def validate_limit(self, limit):
+        return min(limit, settings.TOPIC_STATS_MAX_LIMIT)
+
+    def validate(self, attrs):
+        attrs.setdefault("until", timezone.localdate())
+        attrs.setdefault(
+            "since", attrs["until"] - timedelta(days=settings.TOPIC_STATS_DAYS - 1)
+        )
+        attrs.setdefault("limit", settings.TOPIC_STATS_LIMIT)
+        if attrs["since"] > attrs["until"]:
+            raise serializers.ValidationError("since must not be after until.")
+        if (attrs["until"] - attrs["since"]).days >= settings.TOPIC_STATS_MAX_DAYS:
+            raise serializers.ValidationError(
+                f"The range spans at most {settings.TOPIC_STATS_MAX_DAYS} days."
+            )
+        return attrs
+
+
+class MessageJobSerializer(serializers.Serializer):
+    """
+    Serializer for the state of a message job.
+    """
+
+    job_id = serializers.UUIDField()
+    conversation_id = serializers.UUIDField()
+    status = serializers.CharField()
+
 
 class MessageSerializer(serializers.ModelSerializer):
     """
@@ -39,15 +196,44 @@ class ConversationResponseSerializer(serializers.Serializer):
     message = MessageSerializer(many=True)
 
     @staticmethod
-    def build(conversation: Conversation):
+    def build(conversation: Conversation, messages=None):
         """
         Build a serialized dictionary with the last messages of the conversation.
+        ``messages`` can be passed when they were already fetched, e.g. through
+        the async ORM. Otherwise they come from the conversation's recent
+        window, falling back to the database when it is empty.
+
+        With ``FAST_SERIALIZATION`` the same structure is built as plain
+        dicts, straight from the window entries when possible.
         """
-        messages_qs = Message.get_last_messages_from_conversation(conversation)
-        serializer = ConversationResponseSerializer(
-            {
-                "conversation_id": conversation.conversation_id,
-                "message": messages_qs,
-            }
-        )
-        return serializer.data
+        fast = settings.FAST_SERIALIZATION
+        if messages is None and conversation.recent_messages and fast:
+            with metrics.timed("serialize"):
+                return {
+                    "conversation_id": str(conversation.conversation_id),
+                    "message": [
+                        {"role": m["role"], "message": m["message"]}
+                        for m in conversation.recent_messages[:-6:-1]
+                    ],
+                }
+
+        if messages is None and conversation.recent_messages:
+            messages = conversation.get_recent_messages()[:-6:-1]
+        elif messages is None:
+            messages = Message.get_last_messages_from_conversation(conversation)
+        with metrics.timed("serialize"):
+            if fast:
+                return {
+                    "conversation_id": str(conversation.conversation_id),
+                    "message": [
+                        {"role": str(m.role), "message": str(m.message)}
+                        for m in messages
+                    ],
+                }
+            serializer = ConversationResponseSerializer(
+                {
+                    "conversation_id": conversation.conversation_id,
+                    "message": messages,
+                }
+            )
+            return serializer.data
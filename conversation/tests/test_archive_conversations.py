@@ -0,0 +1,115 @@
+import gzip
+import json
+import tempfile
+from datetime import timedelta
+from io import StringIO
+from pathlib import Path
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from conversation.management.commands.archive_conversations import Command
+from conversation.models import Conversation, Message, MessageJob
+
+
+class ArchiveConversationsTests(TestCase):
+    def setUp(self):
+        self.output_dir = Path(self.enterContext(tempfile.TemporaryDirectory()))
+
+    def create_conversation(self, topic, days_ago):
+        conversation = Conversation.objects.create(topic=topic, stance="pro")
+        for role in (Message.Role.USER, Message.Role.SYSTEM):
+            Message.objects.create(
+                conversation=conversation, role=role, message=f"{topic} {role}"
+            )
+        Conversation.objects.filter(pk=conversation.pk).update(
+            updated_at=timezone.now() - timedelta(days=days_ago)
+        )
+        return conversation
+
+    def archive(self, **options):
+        call_command(
+            "archive_conversations",
+            older_than_days=30,
+            output_dir=self.output_dir,
+            sleep=0,
+            stdout=StringIO(),
+            **options,
+        )
+
+    def read_archives(self):
+        lines = []
+        for path in sorted(self.output_dir.glob("*.ndjson.gz")):
+            with gzip.open(path, "rt", encoding="utf-8") as archive:
+                lines.extend(json.loads(line) for line in archive)
+        return lines
+
+    def test_archives_and_deletes_inactive_conversations(self):
+        old = self.create_conversation("old", days_ago=60)
+        recent = self.create_conversation("recent", days_ago=1)
+
+        self.archive()
+
+        (archived,) = self.read_archives()
+        self.assertEqual(archived["conversation_id"], str(old.conversation_id))
+        self.assertEqual(
+            [m["message"] for m in archived["messages"]], ["old user", "old system"]
+        )
+        self.assertEqual(
+            list(Conversation.objects.values_list("pk", flat=True)), [recent.pk]
+        )
+        self.assertEqual(Message.objects.filter(conversation=old).count(), 0)
+        self.assertEqual(Message.objects.count(), 2)
+
+    def test_writes_one_file_per_chunk(self):
+        for i in range(3):
+            self.create_conversation(f"old {i}", days_ago=60)
+
+        self.archive(chunk_size=2)
+
+        self.assertEqual(len(list(self.output_dir.glob("*.ndjson.gz"))), 2)
+        self.assertEqual(len(self.read_archives()), 3)
+        self.assertFalse(list(self.output_dir.glob("*.partial")))
+        self.assertEqual(Conversation.objects.count(), 0)
+
+    def test_max_chunks_stops_and_next_run_resumes(self):
+        for i in range(3):
+            self.create_conversation(f"old {i}", days_ago=60)
+
+        self.archive(chunk_size=1, max_chunks=2)
+        self.assertEqual(Conversation.objects.count(), 1)
+
+        self.archive(chunk_size=1)
+        self.assertEqual(Conversation.objects.count(), 0)
+        self.assertEqual(len(self.read_archives()), 3)
+
+    def test_conversation_active_since_it_was_read_is_kept(self):
+        old = self.create_conversation("old", days_ago=60)
+        Conversation.objects.filter(pk=old.pk).update(updated_at=timezone.now())
+
+        cutoff = timezone.now() - timedelta(days=30)
+        self.assertEqual(Command.delete([old], cutoff), 0)
+        self.assertTrue(Conversation.objects.filter(pk=old.pk).exists())
+
+    def test_deletes_jobs_of_archived_conversations_and_old_finished_jobs(self):
+        old = self.create_conversation("old", days_ago=60)
+        recent = self.create_conversation("recent", days_ago=1)
+        user, reply = Message.objects.filter(conversation=recent)
+        MessageJob.objects.create(conversation=old, message=old.messages.first())
+        finished = MessageJob.objects.create(
+            conversation=recent,
+            message=user,
+            reply=reply,
+            status=MessageJob.Status.DONE,
+            finished_at=timezone.now() - timedelta(days=60),
+        )
+        queued = MessageJob.objects.create(
+            conversation=recent,
+            message=Message.objects.create(conversation=recent, message="New"),
+        )
+
+        self.archive()
+
+        self.assertEqual(list(MessageJob.objects.all()), [queued])
+        self.assertTrue(Message.objects.filter(pk=finished.reply_id).exists())
@@ -0,0 +1,275 @@
+import json
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+
+from conversation.models import Conversation, Message
+from conversation.views import AsyncMessageView
+from lms import StreamInterrupted
+
+
+class AsyncMessageViewTests(TestCase):
+    def setUp(self):
+        self.url = reverse("send-message-async")
+        self.topic = "test topic"
+
+    def post(self, payload):
+        return self.async_client.post(
+            self.url, payload, content_type="application/json"
+        )
+
+    @patch("conversation.views.get_async_client")
+    async def test_create_new_conv_persists_messages(self, MockClient):
+        mock_client = MockClient.return_value
+        mock_client.get_topic_and_stance = AsyncMock(
+            return_value=(self.topic, "pro", "Hello bot!")
+        )
+
+        resp = await self.post({"conversation_id": None, "message": "hola"})
+
+        self.assertEqual(resp.status_code, status.HTTP_201_CREATED)
+        data = resp.json()
+        self.assertEqual(
+            data["message"],
+            [
+                {"role": "system", "message": "Hello bot!"},
+                {"role": "user", "message": "hola"},
+            ],
+        )
+        conversation = await Conversation.objects.aget(
+            conversation_id=data["conversation_id"]
+        )
+        self.assertEqual(conversation.topic, self.topic)
+        self.assertEqual(conversation.stance, "pro")
+        mock_client.get_topic_and_stance.assert_awaited_once_with(message="hola")
+
+    @override_settings(OPENAI_COMBINED_TURN=False)
+    @patch("conversation.views.get_async_client")
+    async def test_reply_after_topic_detection_uses_the_detected_topic(
+        self, MockClient
+    ):
+        conversation = await Conversation.objects.acreate(
+            topic="Undefined", stance="und"
+        )
+        mock_client = MockClient.return_value
+        mock_client.get_topic_and_stance = AsyncMock(
+            return_value=("Taxes", "con", "Opening")
+        )
+        mock_client.debate_reply = AsyncMock(return_value="Bot answer")
+
+        resp = await self.post(
+            {
+                "conversation_id": str(conversation.conversation_id),
+                "message": "Lower taxes",
+            }
+        )
+
+        self.assertEqual(resp.status_code, status.HTTP_201_CREATED)
+        topic, stance, _, user_text = mock_client.debate_reply.call_args.args
+        self.assertEqual((topic, stance, user_text), ("Taxes", "con", "Lower taxes"))
+
+    @patch("conversation.views.get_async_client")
+    async def test_existing_conversation_calls_debate_reply(self, MockClient):
+        conversation = await Conversation.objects.acreate(
+            topic=self.topic, stance="pro"
+        )
+        await Message.objects.acreate(
+            conversation=conversation, role=Message.Role.USER, message="Prev msg"
+        )
+        mock_client = MockClient.return_value
+        mock_client.debate_reply = AsyncMock(return_value="Bot answer")
+
+        resp = await self.post(
+            {
+                "conversation_id": str(conversation.conversation_id),
+                "message": "New msg",
+            }
+        )
+
+        self.assertEqual(resp.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(await Message.objects.acount(), 3)
+        mock_client.debate_reply.assert_awaited_once_with(
+            self.topic,
+            "pro",
+            [{"role": "user", "content": "Prev msg"}],
+            "New msg",
+        )
+
+    @override_settings(ADMISSION_CONVERSATION_INTERVAL=60)
+    @patch("conversation.views.get_async_client")
+    async def test_rapid_second_post_returns_429(self, MockClient):
+        conversation = await Conversation.objects.acreate(topic="AI", stance="pro")
+        MockClient.return_value.debate_reply = AsyncMock(return_value="Answer")
+        payload = {"conversation_id": str(conversation.pk), "message": "Hi"}
+
+        first = await self.post(payload)
+        second = await self.post(payload)
+
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(second.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertLessEqual(int(second["Retry-After"]), 60)
+
+    async def test_conversation_not_found_returns_404(self):
+        resp = await self.post(
+            {
+                "conversation_id": "11111111-1111-1111-1111-111111111111",
+                "message": "Hello",
+            }
+        )
+
+        self.assertEqual(resp.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertIn("Conversation not found", resp.json()["detail"])
+
+    async def test_missing_message_returns_400(self):
+        resp = await self.post({"conversation_id": None})
+
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("message", resp.json())
+
+    async def test_invalid_json_returns_400(self):
+        resp = await self.async_client.post(
+            self.url, "{not json", content_type="application/json"
+        )
+
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+def fake_stream(deltas, closed, error=None):
+    async def stream_debate_reply(*args, **kwargs):
+        try:
+            for delta in deltas:
+                yield delta
+            if error:
+                raise error
+        finally:
+            closed.append(True)
+
+    return stream_debate_reply
+
+
+class StreamingMessageViewTests(TestCase):
+    def setUp(self):
+        self.url = reverse("send-message-async") + "?stream=true"
+        self.closed = []
+
+    async def read_events(self, response):
+        body = b"".join([chunk async for chunk in response.streaming_content])
+        events = []
+        for block in body.decode().strip().split("\n\n"):
+            event, data = block.split("\n")
+            events.append((event[len("event: ") :], json.loads(data[len("data: ") :])))
+        return events
+
+    @patch("conversation.views.get_async_client")
+    async def test_stream_relays_deltas_and_persists_full_reply(self, MockClient):
+        conversation = await Conversation.objects.acreate(topic="AI", stance="pro")
+        MockClient.return_value.stream_debate_reply = fake_stream(
+            ["Hel", "lo"], self.closed
+        )
+
+        resp = await self.async_client.post(
+            self.url,
+            {"conversation_id": str(conversation.conversation_id), "message": "Hi"},
+            content_type="application/json",
+        )
+
+        self.assertEqual(resp["Content-Type"], "text/event-stream")
+        events = await self.read_events(resp)
+        self.assertEqual(
+            events[:2], [("delta", {"delta": "Hel"}), ("delta", {"delta": "lo"})]
+        )
+        self.assertEqual(events[2][0], "done")
+        self.assertEqual(
+            events[2][1]["message"][0], {"role": "system", "message": "Hello"}
+        )
+        reply = await Message.objects.aget(role=Message.Role.SYSTEM)
+        self.assertEqual(reply.message, "Hello")
+        self.assertEqual(self.closed, [True])
+
+    @patch("conversation.views.get_async_client")
+    async def test_stream_new_conversation_sends_opening_reply(self, MockClient):
+        MockClient.return_value.get_topic_and_stance = AsyncMock(
+            return_value=("AI", "pro", "Let's debate AI.")
+        )
+
+        resp = await self.async_client.post(
+            self.url,
+            {"conversation_id": None, "message": "AI is great"},
+            headers={"Accept": "text/event-stream"},
+            content_type="application/json",
+        )
+
+        events = await self.read_events(resp)
+        self.assertEqual(events[0], ("delta", {"delta": "Let's debate AI."}))
+        self.assertEqual(events[1][0], "done")
+        self.assertEqual(await Message.objects.acount(), 2)
+
+    @patch("conversation.views.get_async_client")
+    async def test_stream_undefined_topic_sends_combined_reply(self, MockClient):
+        conversation = await Conversation.objects.acreate(topic="und", stance="und")
+        MockClient.return_value.classify_and_reply = AsyncMock(
+            return_value=("AI", "con", "AI needs limits.")
+        )
+
+        resp = await self.async_client.post(
+            self.url,
+            {"conversation_id": str(conversation.conversation_id), "message": "AI"},
+            content_type="application/json",
+        )
+
+        events = await self.read_events(resp)
+        self.assertEqual(events[0], ("delta", {"delta": "AI needs limits."}))
+        self.assertEqual(events[1][0], "done")
+        await conversation.arefresh_from_db()
+        self.assertEqual((conversation.topic, conversation.stance), ("AI", "con"))
+
+    @patch("conversation.views.get_async_client")
+    async def test_stream_interrupted_upstream_sends_error_event(self, MockClient):
+        conversation = await Conversation.objects.acreate(topic="AI", stance="pro")
+        MockClient.return_value.stream_debate_reply = fake_stream(
+            ["Hel", "lo"], self.closed, error=StreamInterrupted()
+        )
+
+        resp = await self.async_client.post(
+            self.url,
+            {"conversation_id": str(conversation.conversation_id), "message": "Hi"},
+            content_type="application/json",
+        )
+
+        events = await self.read_events(resp)
+        self.assertEqual(
+            events,
+            [
+                ("delta", {"delta": "Hel"}),
+                ("delta", {"delta": "lo"}),
+                ("error", {"detail": "The reply was interrupted, please retry."}),
+            ],
+        )
+        self.assertEqual(self.closed, [True])
+        self.assertEqual(await Message.objects.acount(), 0)
+
+    async def test_stream_missing_conversation_returns_404(self):
+        resp = await self.async_client.post(
+            self.url,
+            {
+                "conversation_id": "11111111-1111-1111-1111-111111111111",
+                "message": "Hello",
+            },
+            content_type="application/json",
+        )
+
+        self.assertEqual(resp.status_code, status.HTTP_404_NOT_FOUND)
+
+    async def test_client_disconnect_closes_upstream_and_persists_nothing(self):
+        conversation = await Conversation.objects.acreate(topic="AI", stance="pro")
+        client = MagicMock()
+        client.stream_debate_reply = fake_stream(["Hel", "lo"], self.closed)
+
+        events = AsyncMessageView.event_stream(client, conversation, False, [], "Hi")
+        self.assertIn("Hel", await events.__anext__())
+        await events.aclose()
+
+        self.assertEqual(self.closed, [True])
+        self.assertEqual(await Message.objects.acount(), 0)
@@ -0,0 +1,240 @@
+import threading
+import time
+import uuid
+from unittest.mock import MagicMock, patch
+
+from django.db import connection, connections
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from conversation.batch import run_batch
+from conversation.models import Conversation, Message
+
+
+def fake_client():
+    client = MagicMock()
+    client.get_topic_and_stance.side_effect = lambda message: (
+        message,
+        "con",
+        f"Opening on {message}",
+    )
+    client.debate_reply.side_effect = lambda topic, stance, history, text: (
+        f"Reply to {text}"
+    )
+    return client
+
+
+class MessageBatchViewTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.url = reverse("send-message-batch")
+
+    @patch("conversation.views.get_client")
+    def test_results_are_in_input_order_with_per_item_errors(self, MockClient):
+        MockClient.return_value = fake_client()
+        conversation = Conversation.objects.create(topic="AI", stance="pro")
+        missing = str(uuid.uuid4())
+
+        response = self.client.post(
+            self.url,
+            {
+                "items": [
+                    {"conversation_id": None, "message": "Taxes"},
+                    {"conversation_id": missing, "message": "Hello"},
+                    {"conversation_id": str(conversation.pk), "message": "Why?"},
+                ]
+            },
+            format="json",
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        new, not_found, continued = response.data["results"]
+        self.assertEqual(new["status"], 201)
+        self.assertEqual(new["message"][0]["message"], "Opening on Taxes")
+        self.assertEqual(not_found["status"], 404)
+        self.assertEqual(continued["status"], 201)
+        self.assertEqual(continued["conversation_id"], str(conversation.pk))
+        self.assertEqual(continued["message"][0]["message"], "Reply to Why?")
+        self.assertEqual(Message.objects.count(), 4)
+
+    @patch("conversation.views.get_client")
+    def test_invalid_items_fail_alone(self, MockClient):
+        MockClient.return_value = fake_client()
+
+        response = self.client.post(
+            self.url,
+            {
+                "items": [
+                    {"conversation_id": None, "message": "Taxes"},
+                    {"conversation_id": "not-a-uuid", "message": "Hello"},
+                    {"message": ""},
+                    "Taxes",
+                ]
+            },
+            format="json",
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        valid, bad_id, blank, not_an_object = response.data["results"]
+        self.assertEqual(valid["status"], 201)
+        self.assertEqual(bad_id["status"], 400)
+        self.assertIn("conversation_id", bad_id["detail"])
+        self.assertEqual(blank["status"], 400)
+        self.assertIn("message", blank["detail"])
+        self.assertEqual(not_an_object["status"], 400)
+        self.assertEqual(Message.objects.count(), 2)
+
+    def test_empty_batch_returns_400(self):
+        response = self.client.post(self.url, {"items": []}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @override_settings(BATCH_MAX_ITEMS=1)
+    def test_batch_over_the_limit_returns_400(self):
+        item = {"conversation_id": None, "message": "Taxes"}
+        response = self.client.post(self.url, {"items": [item, item]}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class RunBatchTests(TestCase):
+    def test_new_conversations_are_inserted_in_bulk(self):
+        items = [{"conversation_id": None, "message": f"Topic {i}"} for i in range(5)]
+
+        with CaptureQueriesContext(connection) as queries:
+            results = run_batch(items, fake_client())
+
+        self.assertEqual([r["status"] for r in results], [201] * 5)
+        inserts = [q["sql"] for q in queries if q["sql"].startswith("INSERT")]
+        self.assertEqual(len(inserts), 2)
+        self.assertEqual(Conversation.objects.count(), 5)
+        self.assertEqual(Message.objects.count(), 10)
+
+    def test_pool_threads_close_their_database_connections(self):
+        client = fake_client()
+        opened = []
+
+        def admitted(topic, stance, history, text):
+            # Like admission control, query from the pool thread.
+            with connections["default"].cursor() as cursor:
+                cursor.execute("SELECT 1")
+            opened.append(connections["default"])
+            return f"Reply to {text}"
+
+        client.debate_reply.side_effect = admitted
+        conversation = Conversation.objects.create(topic="AI", stance="pro")
+        items = [{"conversation_id": str(conversation.pk), "message": "Why?"}]
+
+        (result,) = run_batch(items, client)
+
+        self.assertEqual(result["status"], 201)
+        self.assertNotEqual(opened[0], connection)
+        self.assertIsNone(opened[0].connection)
+
+    def test_items_for_the_same_conversation_run_in_order(self):
+        conversation = Conversation.objects.create(topic="AI", stance="pro")
+        client = fake_client()
+        items = [
+            {"conversation_id": str(conversation.pk), "message": "First"},
+            {"conversation_id": str(conversation.pk), "message": "Second"},
+        ]
+
+        results = run_batch(items, client)
+
+        self.assertEqual([r["status"] for r in results], [201, 201])
+        second_history = client.debate_reply.call_args_list[1].args[2]
+        self.assertEqual(
+            [m["content"] for m in second_history], ["First", "Reply to First"]
+        )
+        conversation.refresh_from_db()
+        self.assertEqual(conversation.version, 2)
+
+    def test_concurrency_limit_bounds_calls_in_flight(self):
+        client = fake_client()
+        lock = threading.Lock()
+        in_flight = peak = 0
+
+        def debate_reply(topic, stance, history, text):
+            nonlocal in_flight, peak
+            with lock:
+                in_flight += 1
+                peak = max(peak, in_flight)
+            time.sleep(0.02)
+            with lock:
+                in_flight -= 1
+            return "Reply"
+
+        client.debate_reply.side_effect = debate_reply
+        conversations = [
+            Conversation.objects.create(topic="AI", stance="pro") for _ in range(6)
+        ]
+        items = [{"conversation_id": c.pk, "message": "Go"} for c in conversations]
+
+        results = run_batch(items, client, concurrency=2)
+
+        self.assertEqual([r["status"] for r in results], [201] * 6)
+        self.assertEqual(peak, 2)
+
+    def test_failed_reply_does_not_affect_other_items(self):
+        client = fake_client()
+        client.get_topic_and_stance.side_effect = [
+            ("AI", "pro", "Opening"),
+            TimeoutError("upstream timed out"),
+        ]
+        items = [
+            {"conversation_id": None, "message": "AI"},
+            {"conversation_id": None, "message": "Taxes"},
+        ]
+
+        results = run_batch(items, client, concurrency=1)
+
+        self.assertEqual(results[0]["status"], 201)
+        self.assertEqual(results[1]["status"], 502)
+        self.assertEqual(Conversation.objects.count(), 1)
+
+
+class RunBatchConflictTests(TransactionTestCase):
+    @override_settings(MESSAGE_CONFLICT_RETRIES=0)
+    def test_conflicting_turn_is_reported_and_not_stored(self):
+        conversation = Conversation.objects.create(topic="AI", stance="pro")
+        client = fake_client()
+
+        def debate_reply(topic, stance, history, text):
+            # Runs in a pool thread, i.e. another connection.
+            Conversation.objects.filter(pk=conversation.pk).update(version=5)
+            connection.close()
+            return "Reply"
+
+        client.debate_reply.side_effect = debate_reply
+
+        (result,) = run_batch(
+            [{"conversation_id": conversation.pk, "message": "Go"}], client
+        )
+
+        self.assertEqual(result["status"], status.HTTP_409_CONFLICT)
+        self.assertEqual(Message.objects.count(), 0)
+
+    def test_conflicting_turn_is_retried(self):
+        conversation = Conversation.objects.create(topic="AI", stance="pro")
+        client = fake_client()
+        replies = iter(["Stale reply", "Fresh reply"])
+
+        def debate_reply(topic, stance, history, text):
+            reply = next(replies)
+            if reply == "Stale reply":
+                Conversation.objects.filter(pk=conversation.pk).update(version=5)
+                connection.close()
+            return reply
+
+        client.debate_reply.side_effect = debate_reply
+
+        (result,) = run_batch(
+            [{"conversation_id": conversation.pk, "message": "Go"}], client
+        )
+
+        self.assertEqual(result["status"], status.HTTP_201_CREATED)
+        self.assertEqual(
+            list(Message.objects.values_list("message", flat=True)),
+            ["Go", "Fresh reply"],
+        )
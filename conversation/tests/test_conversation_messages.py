@@ -0,0 +1,134 @@
+import uuid
+from datetime import timedelta
+
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from conversation.models import Conversation, Message
+from conversation.utils import encode_cursor
+
+
+class ConversationMessagesViewTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.conversation = Conversation.objects.create(topic="AI", stance="pro")
+        self.url = reverse("conversation-messages", args=[self.conversation.pk])
+        self.add_messages(*(f"m{i}" for i in range(7)))
+
+    def add_messages(self, *texts):
+        for text in texts:
+            message = Message.objects.create(
+                conversation=self.conversation, role=Message.Role.USER, message=text
+            )
+            self.conversation.push_recent_messages(message)
+        self.conversation.update_if_unchanged(
+            recent_messages=self.conversation.recent_messages
+        )
+
+    def read_backwards(self, limit):
+        """
+        Every page from the newest to the oldest, returned oldest first.
+        """
+        texts, params = [], {"limit": limit}
+        while True:
+            data = self.client.get(self.url, params).data
+            texts[:0] = [m["message"] for m in data["messages"]]
+            if data["previous"] is None:
+                return texts
+            params = {"limit": limit, "before": data["previous"]}
+
+    def test_latest_page_is_returned_oldest_first_with_an_etag(self):
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response["ETag"], f'"{self.conversation.version}"')
+        data = response.json()
+        self.assertEqual(
+            [m["message"] for m in data["messages"]], [f"m{i}" for i in range(7)]
+        )
+        self.assertEqual(
+            set(data["messages"][0]), {"message_id", "role", "message", "created_at"}
+        )
+        self.assertIsNone(data["previous"])
+
+    def test_before_cursor_walks_back_through_the_window(self):
+        self.assertEqual(self.read_backwards(3), [f"m{i}" for i in range(7)])
+
+    def test_before_cursor_walks_back_through_the_table(self):
+        Conversation.objects.filter(pk=self.conversation.pk).update(recent_messages=[])
+        # Ties on created_at are ordered by message_id.
+        Message.objects.filter(message__in=["m2", "m3", "m4"]).update(
+            created_at=timezone.now() + timedelta(days=1)
+        )
+        expected = list(
+            Message.objects.filter(conversation=self.conversation).values_list(
+                "message", flat=True
+            )
+        )
+
+        self.assertEqual(self.read_backwards(2), expected)
+
+    def test_since_cursor_returns_only_new_messages(self):
+        next_cursor = self.client.get(self.url).data["next"]
+        self.add_messages("m7", "m8")
+
+        with self.assertNumQueries(1):
+            data = self.client.get(self.url, {"since": next_cursor}).data
+
+        self.assertEqual([m["message"] for m in data["messages"]], ["m7", "m8"])
+        empty = self.client.get(self.url, {"since": data["next"]}).data
+        self.assertEqual(empty["messages"], [])
+        self.assertEqual(empty["next"], data["next"])
+
+    def test_since_cursor_older_than_the_window_reads_the_table(self):
+        with self.settings(CONVERSATION_RECENT_WINDOW=3):
+            self.add_messages("m7")
+        oldest = Message.objects.get(message="m0")
+        cursor = encode_cursor(oldest.created_at, oldest.message_id)
+
+        with self.assertNumQueries(2):
+            data = self.client.get(self.url, {"since": cursor, "limit": 3}).data
+
+        self.assertEqual([m["message"] for m in data["messages"]], ["m1", "m2", "m3"])
+
+    def test_matching_if_none_match_returns_304_after_one_query(self):
+        etag = self.client.get(self.url)["ETag"]
+
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response["ETag"], etag)
+        self.assertEqual(response.content, b"")
+
+        self.add_messages("m7")
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_invalid_parameters_return_400(self):
+        cursor = self.client.get(self.url).data["next"]
+        for params in (
+            {"since": "not-a-cursor"},
+            {"since": cursor, "before": cursor},
+            {"limit": 0},
+        ):
+            with self.subTest(params=params):
+                response = self.client.get(self.url, params)
+
+                self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_limit_is_capped(self):
+        with self.settings(MESSAGES_PAGE_MAX=2):
+            data = self.client.get(self.url, {"limit": 100}).data
+
+        self.assertEqual([m["message"] for m in data["messages"]], ["m5", "m6"])
+
+    def test_unknown_conversation_returns_404(self):
+        response = self.client.get(
+            reverse("conversation-messages", args=[uuid.uuid4()])
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
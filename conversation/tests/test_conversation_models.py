@@ -13,6 +13,20 @@ def test_conversation_set_topic_and_stance():
     assert str(conv) == f"Conversation {conv.conversation_id}"
 
 
+@pytest.mark.django_db
+def test_conversation_update_if_unchanged_checks_version():
+    conv = Conversation.objects.create(topic="init", stance="pro")
+    stale = Conversation.objects.get(pk=conv.pk)
+
+    assert conv.update_if_unchanged(topic="AI Safety")
+    assert conv.version == 1
+    assert not stale.update_if_unchanged(topic="Other")
+
+    conv.refresh_from_db()
+    assert conv.topic == "AI Safety"
+    assert conv.version == 1
+
+
 @pytest.mark.django_db
 def test_message_str_returns_expected_format():
     conv = Conversation.objects.create(topic="Test", stance="pro")
@@ -42,3 +56,25 @@ def test_get_last_messages_from_conversation_returns_latest_first():
     assert last_msgs[0].created_at >= last_msgs[1].created_at
 
     assert list(Message.get_last_messages_from_conversation(conv, quantity=0)) == []
+
+
+@pytest.mark.django_db
+def test_push_recent_messages_keeps_a_bounded_window(settings):
+    settings.CONVERSATION_RECENT_WINDOW = 3
+    conv = Conversation.objects.create(topic="Test", stance="con")
+    for i in range(4):
+        conv.push_recent_messages(
+            Message.objects.create(
+                conversation=conv, role=Message.Role.USER, message=f"msg {i}"
+            )
+        )
+
+    window = conv.get_recent_messages()
+    assert [m.message for m in window] == ["msg 1", "msg 2", "msg 3"]
+    stored = Message.objects.get(message="msg 3")
+    assert window[-1].message_id == str(stored.message_id)
+    assert window[-1].created_at == stored.created_at
+
+    conv.summarized_until = window[0].created_at
+    assert [m.message for m in conv.get_unsummarized_recent_messages(1)] == ["msg 3"]
+    assert conv.get_unsummarized_recent_messages(0) == []
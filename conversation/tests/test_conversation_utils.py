@@ -0,0 +1,36 @@
+import time
+import uuid
+from datetime import datetime, timezone
+
+import pytest
+
+from conversation.utils import decode_cursor, encode_cursor, uuid7
+
+
+def test_uuid7_sets_version_variant_and_timestamp():
+    before = time.time_ns() // 1_000_000
+    value = uuid7()
+    after = time.time_ns() // 1_000_000
+
+    assert value.version == 7
+    assert value.variant == uuid.RFC_4122
+    assert before <= value.int >> 80 <= after + 1
+
+
+def test_uuid7_is_increasing_within_a_millisecond():
+    values = [uuid7() for _ in range(10000)]
+
+    assert values == sorted(values)
+    assert len(set(values)) == len(values)
+
+
+def test_cursor_round_trips_and_rejects_garbage():
+    created_at = datetime(2025, 1, 2, 3, 4, 5, 678901, tzinfo=timezone.utc)
+    message_id = uuid7()
+
+    cursor = encode_cursor(created_at, message_id)
+
+    assert decode_cursor(cursor) == (created_at, message_id)
+    for garbage in ("", "not-a-cursor", encode_cursor(created_at, "x")):
+        with pytest.raises(ValueError):
+            decode_cursor(garbage)
@@ -0,0 +1,141 @@
+import json
+import tempfile
+from datetime import timedelta
+from io import StringIO
+from pathlib import Path
+from unittest.mock import patch
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from conversation.models import Conversation, Message
+
+
+class ExportTestCase(TestCase):
+    def create_conversation(self, topic, days_ago, messages=2):
+        conversation = Conversation.objects.create(topic=topic, stance="pro")
+        for i in range(messages):
+            Message.objects.create(
+                conversation=conversation, role=Message.Role.USER, message=f"m{i}"
+            )
+        Conversation.objects.filter(pk=conversation.pk).update(
+            updated_at=timezone.now() - timedelta(days=days_ago)
+        )
+        return conversation
+
+
+class ExportConversationsCommandTests(ExportTestCase):
+    def setUp(self):
+        self.state_file = (
+            Path(self.enterContext(tempfile.TemporaryDirectory())) / "state.json"
+        )
+
+    def export(self, **options):
+        out = StringIO()
+        call_command(
+            "export_conversations",
+            state_file=self.state_file,
+            stdout=out,
+            stderr=StringIO(),
+            **options,
+        )
+        return [json.loads(line) for line in out.getvalue().splitlines()]
+
+    def test_exports_conversations_with_ordered_messages(self):
+        self.create_conversation("older", days_ago=2, messages=3)
+        self.create_conversation("newer", days_ago=1)
+
+        lines = self.export()
+
+        self.assertEqual([line["topic"] for line in lines], ["older", "newer"])
+        self.assertEqual(
+            [m["message"] for m in lines[0]["messages"]], ["m0", "m1", "m2"]
+        )
+
+    def test_query_count_does_not_grow_with_conversations(self):
+        for i in range(5):
+            self.create_conversation(f"topic {i}", days_ago=1)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(len(self.export(chunk_size=2)), 5)
+
+        message_queries = [q for q in queries if 'FROM "message"' in q["sql"]]
+        self.assertEqual(len(message_queries), 3)
+
+    def test_since_and_until_filter_on_last_update(self):
+        self.create_conversation("old", days_ago=10)
+        self.create_conversation("mid", days_ago=5)
+        self.create_conversation("new", days_ago=1)
+        since = (timezone.now() - timedelta(days=7)).isoformat()
+        until = (timezone.now() - timedelta(days=3)).isoformat()
+
+        lines = self.export(since=since, until=until)
+
+        self.assertEqual([line["topic"] for line in lines], ["mid"])
+
+    def test_incremental_export_resumes_after_last_run(self):
+        self.create_conversation("first", days_ago=1)
+        self.assertEqual(len(self.export(incremental=True, lag=0)), 1)
+
+        self.create_conversation("second", days_ago=0)
+        lines = self.export(incremental=True, lag=0)
+
+        self.assertEqual([line["topic"] for line in lines], ["second"])
+        self.assertEqual(self.export(incremental=True, lag=0), [])
+
+    def test_incremental_export_keeps_turns_committed_after_the_snapshot(self):
+        snapshot = timezone.now()
+        with patch("django.utils.timezone.now", return_value=snapshot):
+            self.assertEqual(self.export(incremental=True, lag=60), [])
+
+        # A turn that took its updated_at just before the snapshot, but
+        # committed after the export had read the table.
+        late = self.create_conversation("late", days_ago=0)
+        Conversation.objects.filter(pk=late.pk).update(
+            updated_at=snapshot - timedelta(seconds=1)
+        )
+        with patch("django.utils.timezone.now", return_value=snapshot):
+            self.assertEqual(self.export(incremental=True, lag=60), [])
+        lines = self.export(incremental=True, lag=0)
+
+        self.assertEqual([line["topic"] for line in lines], ["late"])
+
+
+class ConversationExportViewTests(ExportTestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.url = reverse("export-conversations")
+
+    def test_requires_staff_user(self):
+        self.client.force_authenticate(User.objects.create_user("analyst"))
+
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_streams_ndjson(self):
+        self.create_conversation("old", days_ago=10)
+        self.create_conversation("new", days_ago=1)
+        self.client.force_authenticate(User.objects.create_user("admin", is_staff=True))
+
+        since = (timezone.now() - timedelta(days=5)).date().isoformat()
+        response = self.client.get(self.url, {"since": since})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual([json.loads(line)["topic"] for line in lines], ["new"])
+
+    def test_invalid_bound_returns_400(self):
+        self.client.force_authenticate(User.objects.create_user("admin", is_staff=True))
+
+        response = self.client.get(self.url, {"until": "yesterday"})
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
@@ -0,0 +1,152 @@
+import io
+import json
+from unittest.mock import patch
+
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from chatbot.fastjson import FastJSONParser, FastJSONRenderer
+from conversation.models import Conversation, Message
+from conversation.serializer import (
+    ConversationResponseSerializer,
+    MessageRequestSerializer,
+)
+
+CONVERSATION_ID = "0190b4e1-7a62-7b3c-8d2f-6f1f4b1f3a11"
+
+PAYLOADS = [
+    {"conversation_id": None, "message": "Taxes"},
+    {"message": "  Taxes  "},
+    {"conversation_id": CONVERSATION_ID, "message": "¿Por qué?"},
+    {"conversation_id": CONVERSATION_ID.replace("-", ""), "message": "Why"},
+    {"conversation_id": "{" + CONVERSATION_ID + "}", "message": "Why"},
+    {"conversation_id": "not-a-uuid", "message": "Why"},
+    {"conversation_id": "", "message": "Why"},
+    {"conversation_id": 7, "message": "Why"},
+    {"conversation_id": None},
+    {"message": ""},
+    {"message": "   "},
+    {"message": None},
+    {"message": 42},
+    {"message": True},
+    {"message": ["Taxes"]},
+    {"message": "x" * 500},
+    {"message": "x" * 501},
+    {"message": " " + "x" * 500 + " "},
+    {"message": "Tax\x00es"},
+    {"message": "Tax\ud800es"},
+    ["Taxes"],
+    "Taxes",
+]
+
+
+class FastValidationTests(TestCase):
+    def test_fast_path_agrees_with_the_serializer(self):
+        for payload in PAYLOADS:
+            with self.subTest(payload=payload):
+                serializer = MessageRequestSerializer(data=payload)
+                fast = MessageRequestSerializer.fast_validate(payload)
+
+                if fast is None:
+                    continue
+                self.assertTrue(serializer.is_valid())
+                self.assertEqual(fast, dict(serializer.validated_data))
+
+    def test_fast_path_takes_well_formed_requests(self):
+        for payload in PAYLOADS[:5]:
+            with self.subTest(payload=payload):
+                self.assertIsNotNone(MessageRequestSerializer.fast_validate(payload))
+
+    def test_invalid_requests_get_the_same_response_body(self):
+        client, url = APIClient(), reverse("send-message")
+        for payload in PAYLOADS[5:]:
+            if MessageRequestSerializer(data=payload).is_valid():
+                continue
+            body = json.dumps(payload)
+            with self.subTest(payload=payload):
+                with override_settings(FAST_SERIALIZATION=False):
+                    expected = client.post(url, body, content_type="application/json")
+                actual = client.post(url, body, content_type="application/json")
+
+                self.assertEqual(actual.status_code, 400)
+                self.assertEqual(actual.content, expected.content)
+
+
+class FastResponseTests(TestCase):
+    def setUp(self):
+        self.conversation = Conversation.objects.create(topic="AI", stance="pro")
+        texts = ["Hola", "¿Y tú?", 'Say "why"\n', "a\u2028b\u2029c", "🙂\t\x01", "6"]
+        for i, text in enumerate(texts):
+            message = Message.objects.create(
+                conversation=self.conversation,
+                role=Message.Role.USER if i % 2 else Message.Role.SYSTEM,
+                message=text,
+            )
+            self.conversation.push_recent_messages(message)
+
+    def render_both(self, messages=None):
+        with override_settings(FAST_SERIALIZATION=False):
+            data = ConversationResponseSerializer.build(self.conversation, messages)
+            expected = JSONRenderer().render(data)
+        data = ConversationResponseSerializer.build(self.conversation, messages)
+        return FastJSONRenderer().render(data), expected
+
+    def test_window_response_is_byte_identical(self):
+        actual, expected = self.render_both()
+
+        self.assertEqual(actual, expected)
+        self.assertIn(b"a\\u2028b\\u2029c", actual)
+
+    @patch("chatbot.fastjson.orjson", None)
+    def test_response_without_orjson_is_byte_identical(self):
+        actual, expected = self.render_both()
+
+        self.assertEqual(actual, expected)
+
+    def test_response_from_messages_is_byte_identical(self):
+        messages = list(Message.get_last_messages_from_conversation(self.conversation))
+
+        actual, expected = self.render_both(messages)
+
+        self.assertEqual(actual, expected)
+
+    def test_response_from_the_database_is_byte_identical(self):
+        self.conversation.recent_messages = []
+
+        actual, expected = self.render_both()
+
+        self.assertEqual(actual, expected)
+
+
+class FastJSONTests(TestCase):
+    def test_renderer_falls_back_for_what_orjson_renders_differently(self):
+        renderer = FastJSONRenderer()
+        for data in ({"n": 2**70}, {1: "one"}, None, []):
+            with self.subTest(data=data):
+                self.assertEqual(renderer.render(data), JSONRenderer().render(data))
+
+        self.assertEqual(
+            renderer.render({"a": 1}, "application/json; indent=2"),
+            JSONRenderer().render({"a": 1}, "application/json; indent=2"),
+        )
+
+    def test_parser_keeps_long_integers_exact(self):
+        body = b'{"n": 12345678901234567890123, "s": "\\ud800"}'
+
+        data = FastJSONParser().parse(io.BytesIO(body))
+
+        self.assertEqual(data, json.loads(body))
+
+    def test_parser_reports_errors_like_drf(self):
+        for body in (b"{", b'{"a": NaN}', b"\xff"):
+            with self.subTest(body=body):
+                with self.assertRaises(ParseError) as expected:
+                    JSONParser().parse(io.BytesIO(body))
+                with self.assertRaises(ParseError) as actual:
+                    FastJSONParser().parse(io.BytesIO(body))
+
+                self.assertEqual(actual.exception.detail, expected.exception.detail)
@@ -0,0 +1,268 @@
+import asyncio
+import threading
+import time
+import uuid
+from datetime import timedelta
+from io import StringIO
+from unittest.mock import MagicMock, patch
+
+from asgiref.sync import sync_to_async
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from conversation import job_events
+from conversation.jobs import claim_jobs, finish, submit_job
+from conversation.models import Conversation, Message, MessageJob
+
+
+def fake_client():
+    client = MagicMock()
+    client.get_topic_and_stance.side_effect = lambda message: (
+        message,
+        "con",
+        f"Opening on {message}",
+    )
+    client.debate_reply.side_effect = lambda topic, stance, history, text: (
+        f"Reply to {text}"
+    )
+    return client
+
+
+class MessageJobViewTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.url = reverse("send-message-job")
+
+    def test_new_conversation_stores_message_and_returns_202(self):
+        response = self.client.post(
+            self.url, {"conversation_id": None, "message": "Taxes"}, format="json"
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        job = MessageJob.objects.get()
+        self.assertEqual(response.data["job_id"], str(job.job_id))
+        self.assertEqual(response.data["status"], "queued")
+        self.assertEqual(
+            response["Location"], reverse("message-job", args=[job.job_id])
+        )
+        self.assertTrue(job.new_conversation)
+        self.assertEqual(job.message.message, "Taxes")
+        conversation = job.conversation
+        self.assertEqual(
+            (conversation.topic, conversation.stance), ("Undefined", "und")
+        )
+        self.assertEqual(
+            [m["message"] for m in conversation.recent_messages], ["Taxes"]
+        )
+
+    def test_existing_conversation_gets_message_and_version_bump(self):
+        conversation = Conversation.objects.create(topic="AI", stance="pro")
+
+        response = self.client.post(
+            self.url,
+            {"conversation_id": str(conversation.pk), "message": "Why?"},
+            format="json",
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        conversation.refresh_from_db()
+        self.assertEqual(conversation.version, 1)
+        self.assertEqual([m["message"] for m in conversation.recent_messages], ["Why?"])
+        self.assertFalse(MessageJob.objects.get().new_conversation)
+
+    def test_unknown_conversation_returns_404(self):
+        response = self.client.post(
+            self.url,
+            {"conversation_id": str(uuid.uuid4()), "message": "Why?"},
+            format="json",
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(Message.objects.count(), 0)
+
+
+class MessageJobDetailViewTests(TestCase):
+    def setUp(self):
+        self.job = submit_job(None, "Taxes")
+        self.url = reverse("message-job", args=[self.job.job_id])
+
+    async def test_pending_job_returns_202_once_the_wait_is_over(self):
+        response = await self.async_client.get(self.url, {"wait": "0.05"})
+
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(response.json()["status"], "queued")
+
+    async def test_done_job_returns_the_conversation(self):
+        conversation = self.job.conversation
+        reply = await Message.objects.acreate(
+            conversation=conversation, role=Message.Role.SYSTEM, message="Opening"
+        )
+        conversation.push_recent_messages(reply)
+        await conversation.asave()
+        await MessageJob.objects.filter(pk=self.job.pk).aupdate(
+            status=MessageJob.Status.DONE, reply=reply
+        )
+
+        response = await self.async_client.get(self.url, {"wait": "5"})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = response.json()
+        self.assertEqual(data["status"], "done")
+        self.assertEqual(
+            data["message"],
+            [
+                {"role": "system", "message": "Opening"},
+                {"role": "user", "message": "Taxes"},
+            ],
+        )
+
+    async def test_failed_job_returns_the_error(self):
+        await MessageJob.objects.filter(pk=self.job.pk).aupdate(
+            status=MessageJob.Status.FAILED, error="boom"
+        )
+
+        response = await self.async_client.get(self.url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()["detail"], "boom")
+
+    async def test_unknown_job_returns_404(self):
+        response = await self.async_client.get(
+            reverse("message-job", args=[uuid.uuid4()])
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    async def test_invalid_wait_returns_400(self):
+        for wait in ("soon", "nan", "inf", "-1"):
+            with self.subTest(wait=wait):
+                response = await self.async_client.get(self.url, {"wait": wait})
+
+                self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @override_settings(JOB_LONG_POLL_MAX_WSGI=0.05)
+    def test_wait_is_capped_under_wsgi(self):
+        started = time.monotonic()
+        response = self.client.get(self.url, {"wait": "20"})
+
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertLess(time.monotonic() - started, 5)
+
+
+class JobListenerTests(TransactionTestCase):
+    def setUp(self):
+        self.addCleanup(job_events.listener.stop)
+
+    @override_settings(JOB_LISTEN=True, JOB_POLL_INTERVAL=30)
+    async def test_long_poll_wakes_up_when_the_job_finishes(self):
+        job = await sync_to_async(submit_job)(None, "Taxes")
+
+        def fail_job():
+            (claimed,) = claim_jobs(1)
+            finish(claimed, MessageJob.Status.FAILED, "boom")
+
+        async def fail_later():
+            await asyncio.sleep(0.3)
+            await sync_to_async(fail_job)()
+
+        started = time.monotonic()
+        response, _ = await asyncio.gather(
+            self.async_client.get(
+                reverse("message-job", args=[job.job_id]), {"wait": "20"}
+            ),
+            fail_later(),
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()["detail"], "boom")
+        self.assertLess(time.monotonic() - started, 5)
+        self.assertTrue(job_events.listener.connected)
+
+
+@patch("conversation.management.commands.run_message_jobs.get_client")
+class RunMessageJobsTests(TransactionTestCase):
+    def run_worker(self, **options):
+        call_command("run_message_jobs", once=True, stdout=StringIO(), **options)
+
+    def test_replies_are_stored_in_submission_order(self, MockClient):
+        MockClient.return_value = client = fake_client()
+        first = submit_job(None, "Taxes")
+        second = submit_job(first.conversation_id, "Why?")
+
+        self.run_worker(concurrency=1)
+
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual((first.status, second.status), ("done", "done"))
+        self.assertEqual(first.reply.message, "Opening on Taxes")
+        self.assertEqual(second.reply.message, "Reply to Why?")
+        conversation = Conversation.objects.get()
+        self.assertEqual((conversation.topic, conversation.stance), ("Taxes", "con"))
+        self.assertEqual(
+            [m["message"] for m in conversation.recent_messages],
+            ["Taxes", "Why?", "Opening on Taxes", "Reply to Why?"],
+        )
+        client.debate_reply.assert_called_once_with(
+            "Taxes",
+            "con",
+            [
+                {"role": "user", "content": "Taxes"},
+                {"role": "system", "content": "Opening on Taxes"},
+            ],
+            "Why?",
+        )
+
+    @override_settings(JOB_MAX_ATTEMPTS=2)
+    def test_failed_attempts_are_retried_then_reported(self, MockClient):
+        MockClient.return_value = client = fake_client()
+        client.get_topic_and_stance.side_effect = RuntimeError("boom")
+        job = submit_job(None, "Taxes")
+
+        self.run_worker()
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, "failed")
+        self.assertEqual(job.attempts, 2)
+        self.assertEqual(job.error, "boom")
+        self.assertEqual(client.get_topic_and_stance.call_count, 2)
+        self.assertEqual(Message.objects.count(), 1)
+
+
+class ClaimJobsTests(TransactionTestCase):
+    def test_locked_jobs_are_skipped(self):
+        locked, free = submit_job(None, "Taxes"), submit_job(None, "Tariffs")
+        claimed = []
+
+        def claim():
+            claimed.extend(claim_jobs(10))
+            connection.close()
+
+        with transaction.atomic():
+            MessageJob.objects.select_for_update().get(pk=locked.pk)
+            worker = threading.Thread(target=claim)
+            worker.start()
+            worker.join()
+
+        self.assertEqual([job.pk for job in claimed], [free.pk])
+
+    @override_settings(JOB_LEASE=60)
+    def test_running_jobs_are_reclaimed_once_their_lease_expired(self):
+        expired, running = submit_job(None, "Taxes"), submit_job(None, "Tariffs")
+        MessageJob.objects.filter(pk=expired.pk).update(
+            status=MessageJob.Status.RUNNING,
+            claimed_at=timezone.now() - timedelta(seconds=120),
+            attempts=1,
+        )
+        MessageJob.objects.filter(pk=running.pk).update(
+            status=MessageJob.Status.RUNNING, claimed_at=timezone.now(), attempts=1
+        )
+
+        (claimed,) = claim_jobs(10)
+
+        self.assertEqual(claimed.pk, expired.pk)
+        self.assertEqual(claimed.attempts, 2)
@@ -1,11 +1,17 @@
+from io import StringIO
 from unittest.mock import patch
-from django.test import TestCase
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import F
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APIClient
 
 from conversation.models import Conversation, Message
 from conversation.views import MessageView
+from lms.admission import AdmissionRejected
 
 
 class MessageViewTests(TestCase):
@@ -14,7 +20,7 @@ class MessageViewTests(TestCase):
         self.url = reverse("send-message")
         self.topic = "test topic"
 
-    @patch("conversation.views.OpenAIClient")
+    @patch("conversation.views.get_client")
     def test_create_new_conv_calls_get_topic_and_stance_and_persists_messages(
         self, MockClient
     ):
@@ -35,7 +41,7 @@ class MessageViewTests(TestCase):
         self.assertEqual(conversation.stance, "pro")
         mock_client.get_topic_and_stance.assert_called_once_with(message="hola")
 
-    @patch("conversation.views.OpenAIClient")
+    @patch("conversation.views.get_client")
     def test_existing_conversation_calls_debate_reply(self, MockClient):
         conversation = Conversation.objects.create(topic=self.topic, stance="pro")
         Message.objects.create(
@@ -73,7 +79,7 @@ class MessageViewTests(TestCase):
         response = self.client.post(self.url, {"conversation_id": None}, format="json")
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
 
-    @patch("conversation.views.OpenAIClient")
+    @patch("conversation.views.get_client")
     def test_existing_conversation_with_no_messages(self, MockClient):
         conv = Conversation.objects.create(topic=self.topic, stance="pro")
         mock_client = MockClient.return_value
@@ -88,7 +94,8 @@ class MessageViewTests(TestCase):
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
         mock_client.debate_reply.assert_called_once_with(self.topic, "pro", [], "Start")
 
-    @patch("conversation.views.OpenAIClient")
+    @override_settings(OPENAI_COMBINED_TURN=False)
+    @patch("conversation.views.get_client")
     def test_existing_conv_with_undefined_topic_triggers_get_topic_and_stance(
         self, MockClient
     ):
@@ -111,6 +118,323 @@ class MessageViewTests(TestCase):
         assert response.status_code == status.HTTP_201_CREATED
         mock_client.get_topic_and_stance.assert_called_once()
 
+    @override_settings(OPENAI_COMBINED_TURN=False)
+    @patch("conversation.views.get_client")
+    def test_reply_after_topic_detection_uses_the_detected_topic(self, MockClient):
+        conv = Conversation.objects.create(topic="Undefined", stance="und")
+        mock_client = MockClient.return_value
+        mock_client.get_topic_and_stance.return_value = ("Taxes", "con", "Opening")
+        mock_client.debate_reply.return_value = "Debate reply"
+
+        response = self.client.post(
+            self.url,
+            {"conversation_id": str(conv.conversation_id), "message": "Lower taxes"},
+            format="json",
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        topic, stance, _, user_text = mock_client.debate_reply.call_args.args
+        self.assertEqual((topic, stance, user_text), ("Taxes", "con", "Lower taxes"))
+        conv.refresh_from_db()
+        self.assertEqual((conv.topic, conv.stance), ("Taxes", "con"))
+
+    @override_settings(ADMISSION_CONVERSATION_INTERVAL=60)
+    @patch("conversation.views.get_client")
+    def test_rapid_second_post_to_a_conversation_gets_429(self, MockClient):
+        conv = Conversation.objects.create(topic="AI", stance="pro")
+        MockClient.return_value.debate_reply.return_value = "Debate reply"
+        payload = {"conversation_id": str(conv.conversation_id), "message": "Hi"}
+
+        first = self.client.post(self.url, payload, format="json")
+        second = self.client.post(self.url, payload, format="json")
+
+        assert first.status_code == status.HTTP_201_CREATED
+        assert second.status_code == status.HTTP_429_TOO_MANY_REQUESTS
+        assert 59 <= int(second["Retry-After"]) <= 60
+        MockClient.return_value.debate_reply.assert_called_once()
+        assert Message.objects.count() == 2
+
+    @patch("conversation.views.get_client")
+    def test_rejected_openai_call_gets_429(self, MockClient):
+        conv = Conversation.objects.create(topic="AI", stance="pro")
+        MockClient.return_value.debate_reply.side_effect = AdmissionRejected(wait=3)
+
+        response = self.client.post(
+            self.url,
+            {"conversation_id": str(conv.conversation_id), "message": "Hi"},
+            format="json",
+        )
+
+        assert response.status_code == status.HTTP_429_TOO_MANY_REQUESTS
+        assert response["Retry-After"] == "3"
+        assert Message.objects.count() == 0
+
+    @patch("conversation.views.get_client")
+    def test_undefined_topic_detected_and_answered_in_one_call(self, MockClient):
+        conv = Conversation.objects.create(topic="und", stance="und")
+        mock_client = MockClient.return_value
+        mock_client.classify_and_reply.return_value = ("AI", "con", "Debate reply")
+
+        response = self.client.post(
+            self.url,
+            {"conversation_id": str(conv.conversation_id), "message": "AI is great"},
+            format="json",
+        )
+
+        assert response.status_code == status.HTTP_201_CREATED
+        assert response.data["message"][0]["message"] == "Debate reply"
+        mock_client.classify_and_reply.assert_called_once_with("AI is great", [])
+        mock_client.get_topic_and_stance.assert_not_called()
+        mock_client.debate_reply.assert_not_called()
+        conv.refresh_from_db()
+        assert (conv.topic, conv.stance) == ("AI", "con")
+
+
+@patch("conversation.views.get_client")
+class MessageViewQueryBudgetTests(TransactionTestCase):
+    """
+    Transaction test case, so the counts match production: the commit phase
+    adds BEGIN and COMMIT instead of savepoints.
+    """
+
+    def setUp(self):
+        self.client = APIClient()
+        self.url = reverse("send-message")
+
+    def post(self, conversation_id, message):
+        response = self.client.post(
+            self.url,
+            {"conversation_id": conversation_id, "message": message},
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        return response.data["conversation_id"]
+
+    def start(self, MockClient, topic, stance):
+        mock_client = MockClient.return_value
+        mock_client.get_topic_and_stance.return_value = (topic, stance, "Opening")
+        mock_client.debate_reply.return_value = "Bot answer"
+        return self.post(None, "Opening message")
+
+    def test_new_conversation(self, MockClient):
+        # BEGIN, message insert, topic lookup, conversation insert, topic
+        # stats upsert, COMMIT
+        with self.assertNumQueries(6):
+            self.start(MockClient, "AI", "pro")
+
+    def test_continued_conversation(self, MockClient):
+        conversation_id = self.start(MockClient, "AI", "pro")
+
+        # Conversation read, BEGIN, message insert, versioned update, COMMIT
+        with self.assertNumQueries(5):
+            self.post(conversation_id, "Why?")
+
+    def test_undefined_topic(self, MockClient):
+        conversation_id = self.start(MockClient, "und", "und")
+        MockClient.return_value.classify_and_reply.return_value = (
+            "Nuclear energy",
+            "con",
+            "Bot answer",
+        )
+
+        # The turn that defines the topic adds its lookup and stats upsert.
+        with self.assertNumQueries(7):
+            self.post(conversation_id, "Nuclear energy")
+
+        MockClient.return_value.classify_and_reply.assert_called_once()
+
+
+class MessageViewConcurrencyTests(TransactionTestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.url = reverse("send-message")
+        self.conversation = Conversation.objects.create(topic="AI", stance="pro")
+
+    def post(self):
+        return self.client.post(
+            self.url,
+            {
+                "conversation_id": str(self.conversation.conversation_id),
+                "message": "New msg",
+            },
+            format="json",
+        )
+
+    def bump_version(self):
+        Conversation.objects.filter(pk=self.conversation.pk).update(
+            version=F("version") + 1
+        )
+
+    @patch("conversation.views.get_client")
+    def test_no_transaction_is_open_during_llm_call(self, MockClient):
+        seen = []
+
+        def debate_reply(*args, **kwargs):
+            seen.append(connection.in_atomic_block)
+            return "Bot answer"
+
+        MockClient.return_value.debate_reply.side_effect = debate_reply
+
+        response = self.post()
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(seen, [False])
+        self.conversation.refresh_from_db()
+        self.assertEqual(self.conversation.version, 1)
+
+    @patch("conversation.views.get_client")
+    def test_concurrent_update_is_retried(self, MockClient):
+        replies = iter(["stale", "fresh"])
+
+        def debate_reply(*args, **kwargs):
+            reply = next(replies)
+            if reply == "stale":
+                self.bump_version()
+            return reply
+
+        MockClient.return_value.debate_reply.side_effect = debate_reply
+
+        response = self.post()
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(
+            list(Message.objects.values_list("message", flat=True)),
+            ["New msg", "fresh"],
+        )
+
+    @override_settings(MESSAGE_CONFLICT_RETRIES=0)
+    @patch("conversation.views.get_client")
+    def test_conflict_returns_409_and_persists_nothing(self, MockClient):
+        def debate_reply(*args, **kwargs):
+            self.bump_version()
+            return "Bot answer"
+
+        MockClient.return_value.debate_reply.side_effect = debate_reply
+
+        response = self.post()
+
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(Message.objects.count(), 0)
+
+
+class RecentMessagesWindowTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.url = reverse("send-message")
+
+    def post(self, conversation_id, message):
+        return self.client.post(
+            self.url,
+            {"conversation_id": conversation_id, "message": message},
+            format="json",
+        )
+
+    @patch("conversation.views.get_client")
+    def test_turns_read_history_from_the_window(self, MockClient):
+        mock_client = MockClient.return_value
+        mock_client.get_topic_and_stance.return_value = ("AI", "pro", "Opening")
+        mock_client.debate_reply.return_value = "Bot answer"
+
+        conversation_id = self.post(None, "AI is good").data["conversation_id"]
+        conversation = Conversation.objects.get(pk=conversation_id)
+        self.assertEqual(
+            [m["message"] for m in conversation.recent_messages],
+            ["AI is good", "Opening"],
+        )
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.post(conversation_id, "Why?")
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertFalse(
+            [q for q in queries if q["sql"].startswith('SELECT "message"')]
+        )
+        prompt = mock_client.debate_reply.call_args.args[2]
+        self.assertEqual([m["content"] for m in prompt], ["AI is good", "Opening"])
+        self.assertEqual(
+            [m["message"] for m in response.data["message"]],
+            ["Bot answer", "Why?", "Opening", "AI is good"],
+        )
+
+    @patch("conversation.views.get_client")
+    def test_conversation_without_window_falls_back_to_messages(self, MockClient):
+        MockClient.return_value.debate_reply.return_value = "Bot answer"
+        conversation = Conversation.objects.create(topic="AI", stance="pro")
+        Message.objects.create(
+            conversation=conversation, role=Message.Role.USER, message="Prev msg"
+        )
+
+        self.post(str(conversation.conversation_id), "New msg")
+
+        conversation.refresh_from_db()
+        self.assertEqual(
+            [m["message"] for m in conversation.recent_messages],
+            ["Prev msg", "New msg", "Bot answer"],
+        )
+
+    def test_rebuild_recent_messages_command(self):
+        conversation = Conversation.objects.create(topic="AI", stance="pro")
+        for i in range(3):
+            Message.objects.create(
+                conversation=conversation, role=Message.Role.USER, message=f"m{i}"
+            )
+
+        with override_settings(CONVERSATION_RECENT_WINDOW=2):
+            call_command("rebuild_recent_messages", stdout=StringIO())
+
+        conversation.refresh_from_db()
+        self.assertEqual(
+            [m["message"] for m in conversation.recent_messages], ["m1", "m2"]
+        )
+        self.assertEqual(conversation.version, 0)
+
+    def test_rebuild_recent_messages_command_batches_queries(self):
+        conversations = [
+            Conversation.objects.create(topic="AI", stance="pro") for _ in range(4)
+        ]
+        for i, conversation in enumerate(conversations):
+            for j in range(i + 2):
+                Message.objects.create(
+                    conversation=conversation,
+                    role=Message.Role.USER,
+                    message=f"c{i}m{j}",
+                )
+
+        # Conversations, their last messages, the update, the empty batch.
+        with override_settings(CONVERSATION_RECENT_WINDOW=2):
+            with self.assertNumQueries(4):
+                call_command("rebuild_recent_messages", stdout=StringIO())
+
+        for i, conversation in enumerate(conversations):
+            conversation.refresh_from_db()
+            self.assertEqual(
+                [m["message"] for m in conversation.recent_messages],
+                [f"c{i}m{i}", f"c{i}m{i + 1}"],
+            )
+
+    def test_rebuild_recent_messages_command_skips_changed_conversations(self):
+        conversation = Conversation.objects.create(topic="AI", stance="pro")
+        Message.objects.create(
+            conversation=conversation, role=Message.Role.USER, message="m0"
+        )
+        last_messages = Message.get_last_messages_by_conversation
+
+        def turn_committed_meanwhile(*args):
+            conversation.update_if_unchanged(recent_messages=[])
+            return last_messages(*args)
+
+        stdout = StringIO()
+        with patch.object(
+            Message,
+            "get_last_messages_by_conversation",
+            side_effect=turn_committed_meanwhile,
+        ):
+            call_command("rebuild_recent_messages", stdout=stdout)
+
+        conversation.refresh_from_db()
+        self.assertEqual(conversation.recent_messages, [])
+        self.assertIn("skipped 1", stdout.getvalue())
+
 
 class MessageViewStaticMethodsTests(TestCase):
     def setUp(self):
@@ -121,26 +445,139 @@ class MessageViewStaticMethodsTests(TestCase):
         conv, created = MessageView.get_conversation(None)
         self.assertTrue(created)
         self.assertIsInstance(conv, Conversation)
+        self.assertFalse(Conversation.objects.filter(pk=conv.pk).exists())
 
     def test_get_conversation_returns_existing(self):
         conv, created = MessageView.get_conversation(self.conversation.conversation_id)
         self.assertFalse(created)
         self.assertEqual(conv.conversation_id, self.conversation.conversation_id)
 
-    def test_create_message_persists_in_db(self):
-        msg = MessageView.create_message(self.conversation, "Hello", Message.Role.USER)
-        self.assertEqual(msg.message, "Hello")
-        self.assertEqual(msg.role, "user")
-        self.assertEqual(msg.conversation, self.conversation)
+    def test_create_turn_messages_persists_in_db(self):
+        user, bot = MessageView.create_turn_messages(self.conversation, "Hello", "Hi")
+        self.assertEqual(user.message, "Hello")
+        self.assertEqual(user.role, "user")
+        self.assertEqual(bot.role, "system")
+        self.assertIsNotNone(bot.created_at)
+        self.assertEqual(
+            set(self.conversation.messages.values_list("message", flat=True)),
+            {"Hello", "Hi"},
+        )
 
-    def test_get_last_messages_returns_dicts(self):
+    def test_get_history_returns_unsummarized_messages_oldest_first(self):
+        folded = Message.objects.create(
+            conversation=self.conversation, role=Message.Role.USER, message="Msg0"
+        )
         Message.objects.create(
             conversation=self.conversation, role=Message.Role.USER, message="Msg1"
         )
         Message.objects.create(
             conversation=self.conversation, role=Message.Role.SYSTEM, message="Msg2"
         )
-        result = MessageView.get_last_messages(self.conversation)
-        self.assertEqual(len(result), 2)
-        self.assertEqual(result[0]["role"], "system")
-        self.assertEqual(result[1]["content"], "Msg1")
+        self.conversation.summarized_until = folded.created_at
+
+        result = MessageView.get_history(self.conversation)
+        self.assertEqual([m.message for m in result], ["Msg1", "Msg2"])
+        self.assertEqual(result[1].role, "system")
+
+
+@override_settings(HISTORY_RECENT_TURNS=1, HISTORY_SUMMARY_EVERY_TURNS=2)
+class MessageViewHistoryTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.url = reverse("send-message")
+        self.conversation = Conversation.objects.create(topic="AI", stance="pro")
+
+    def add_turns(self, count):
+        for i in range(count):
+            for role in (Message.Role.USER, Message.Role.SYSTEM):
+                Message.objects.create(
+                    conversation=self.conversation, role=role, message=f"{role} {i}"
+                )
+
+    def post(self):
+        return self.client.post(
+            self.url,
+            {
+                "conversation_id": str(self.conversation.conversation_id),
+                "message": "Go",
+            },
+            format="json",
+        )
+
+    @patch("conversation.views.get_client")
+    def test_summary_is_not_updated_before_enough_turns(self, MockClient):
+        mock_client = MockClient.return_value
+        mock_client.debate_reply.return_value = "Bot answer"
+        self.add_turns(2)
+
+        self.post()
+
+        mock_client.summarize.assert_not_called()
+        self.conversation.refresh_from_db()
+        self.assertEqual(self.conversation.summary, "")
+
+    @patch("conversation.views.get_client")
+    def test_old_turns_are_folded_into_the_summary(self, MockClient):
+        mock_client = MockClient.return_value
+        mock_client.debate_reply.return_value = "Bot answer"
+        mock_client.summarize.return_value = "They argued about AI."
+        self.conversation.summary = "Earlier summary."
+        self.conversation.save()
+        self.add_turns(3)
+
+        self.post()
+
+        summary, folded = mock_client.summarize.call_args.args
+        self.assertEqual(summary, "Earlier summary.")
+        self.assertEqual(
+            [m["content"] for m in folded], ["user 0", "system 0", "user 1", "system 1"]
+        )
+        prompt = mock_client.debate_reply.call_args.args[2]
+        self.assertEqual(
+            prompt[0]["content"], "Summary of the earlier debate: Earlier summary."
+        )
+
+        self.conversation.refresh_from_db()
+        self.assertEqual(self.conversation.summary, "They argued about AI.")
+        last_folded = Message.objects.get(message="system 1")
+        self.assertEqual(self.conversation.summarized_until, last_folded.created_at)
+        self.assertEqual(
+            [m.message for m in MessageView.get_history(self.conversation)],
+            ["user 2", "system 2", "Go", "Bot answer"],
+        )
+
+    @patch("conversation.views.get_client")
+    def test_failed_summary_leaves_turns_to_fold_later(self, MockClient):
+        mock_client = MockClient.return_value
+        mock_client.debate_reply.return_value = "Bot answer"
+        mock_client.summarize.return_value = None
+        self.conversation.summary = "Earlier summary."
+        self.conversation.save()
+        self.add_turns(3)
+
+        self.post()
+
+        self.conversation.refresh_from_db()
+        self.assertEqual(self.conversation.summary, "Earlier summary.")
+        self.assertIsNone(self.conversation.summarized_until)
+        self.assertEqual(
+            [m.message for m in MessageView.get_history(self.conversation)][:2],
+            ["user 0", "system 0"],
+        )
+
+    @override_settings(HISTORY_TOKEN_BUDGET=30)
+    @patch("conversation.views.get_client")
+    def test_prompt_history_fits_token_budget(self, MockClient):
+        mock_client = MockClient.return_value
+        mock_client.debate_reply.return_value = "Bot answer"
+        Message.objects.create(
+            conversation=self.conversation, role=Message.Role.USER, message="x" * 200
+        )
+        Message.objects.create(
+            conversation=self.conversation, role=Message.Role.SYSTEM, message="short"
+        )
+
+        self.post()
+
+        prompt = mock_client.debate_reply.call_args.args[2]
+        self.assertEqual(prompt, [{"role": "system", "content": "short"}])
@@ -0,0 +1,158 @@
+import importlib
+from datetime import timedelta
+from unittest.mock import patch
+
+from django.apps import apps
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from conversation.batch import run_batch
+from conversation.models import Conversation, Topic, TopicDailyStat
+from conversation.tests.test_batch import fake_client
+
+backfill = importlib.import_module("conversation.migrations.0008_backfill_topics")
+
+
+def counts():
+    return {
+        (stat.topic.name, stat.stance): stat.conversations
+        for stat in TopicDailyStat.objects.select_related("topic")
+    }
+
+
+@patch("conversation.views.get_client")
+class TopicCountersTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.url = reverse("send-message")
+
+    def start(self, MockClient, topic, stance):
+        mock_client = MockClient.return_value
+        mock_client.get_topic_and_stance.return_value = (topic, stance, "Opening")
+        mock_client.debate_reply.return_value = "Bot answer"
+        response = self.client.post(
+            self.url, {"conversation_id": None, "message": topic}, format="json"
+        )
+        return response.data["conversation_id"]
+
+    def test_spellings_of_a_topic_share_one_row(self, MockClient):
+        self.start(MockClient, "Remote work", "con")
+        self.start(MockClient, "remote  WORK!", "con")
+        self.start(MockClient, "Remote work", "pro")
+
+        topic = Topic.objects.get()
+        self.assertEqual((topic.name, topic.label), ("remote work", "Remote work"))
+        self.assertEqual(Conversation.objects.filter(canonical_topic=topic).count(), 3)
+        self.assertEqual(
+            counts(), {("remote work", "con"): 2, ("remote work", "pro"): 1}
+        )
+
+    def test_conversation_is_counted_once_its_topic_is_defined(self, MockClient):
+        conversation_id = self.start(MockClient, "und", "und")
+        self.assertEqual(counts(), {})
+
+        MockClient.return_value.classify_and_reply.return_value = (
+            "Nuclear energy",
+            "con",
+            "Bot answer",
+        )
+        for message in ("Nuclear energy", "Why?"):
+            self.client.post(
+                self.url,
+                {"conversation_id": conversation_id, "message": message},
+                format="json",
+            )
+
+        self.assertEqual(counts(), {("nuclear energy", "con"): 1})
+
+    def test_batch_counts_new_conversations(self, MockClient):
+        items = [{"conversation_id": None, "message": m} for m in ("AI", "ai", "Tax")]
+
+        run_batch(items, fake_client())
+
+        self.assertEqual(counts(), {("ai", "con"): 2, ("tax", "con"): 1})
+
+
+class TopicBackfillTests(TestCase):
+    def test_backfill_links_and_counts_existing_conversations(self):
+        for topic, stance in [("AI", "pro"), ("A.I.", "pro"), ("AI", "con")]:
+            Conversation.objects.create(topic=topic, stance=stance)
+        Conversation.objects.create(topic="Undefined", stance="und")
+
+        with connection.schema_editor() as schema_editor:
+            backfill.backfill_topics(apps, schema_editor)
+
+        self.assertEqual(Topic.objects.count(), 2)
+        self.assertEqual(
+            Conversation.objects.filter(canonical_topic__isnull=True).count(), 1
+        )
+        self.assertEqual(
+            counts(), {("ai", "pro"): 1, ("a i", "pro"): 1, ("ai", "con"): 1}
+        )
+
+
+class TopicStatsViewTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.url = reverse("topic-stats")
+        self.client.force_authenticate(User.objects.create_user("admin", is_staff=True))
+        today = timezone.localdate()
+        for name, stance, days_ago, conversations in [
+            ("remote work", "con", 0, 5),
+            ("remote work", "pro", 2, 2),
+            ("nuclear energy", "pro", 1, 4),
+            ("taxes", "con", 30, 50),
+        ]:
+            topic, _ = Topic.objects.get_or_create(name=name, label=name.title())
+            TopicDailyStat.objects.create(
+                topic=topic,
+                day=today - timedelta(days=days_ago),
+                stance=stance,
+                conversations=conversations,
+            )
+
+    def test_top_topics_of_the_last_week(self):
+        with self.assertNumQueries(1):
+            data = self.client.get(self.url).data
+
+        self.assertEqual(
+            [
+                (t["topic"], t["conversations"], t["pro"], t["con"])
+                for t in data["topics"]
+            ],
+            [("Remote Work", 7, 2, 5), ("Nuclear Energy", 4, 4, 0)],
+        )
+
+    def test_stance_and_range_filters(self):
+        since = (timezone.localdate() - timedelta(days=60)).isoformat()
+
+        data = self.client.get(self.url, {"since": since, "stance": "pro"}).data
+
+        self.assertEqual(
+            [(t["name"], t["conversations"]) for t in data["topics"]],
+            [("nuclear energy", 4), ("remote work", 2)],
+        )
+
+    def test_invalid_parameters_return_400(self):
+        for params in (
+            {"since": "2025-02-01", "until": "2025-01-01"},
+            {"since": "2020-01-01", "until": "2025-01-01"},
+            {"stance": "und"},
+            {"limit": 0},
+        ):
+            with self.subTest(params=params):
+                response = self.client.get(self.url, params)
+
+                self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_requires_staff_user(self):
+        self.client.force_authenticate(User.objects.create_user("analyst"))
+
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
@@ -0,0 +1,35 @@
+import uuid
+
+from rest_framework.throttling import BaseThrottle
+
+from lms.admission import AdmissionRejected, admit_conversation
+
+
+def conversation_id(data):
+    """
+    The posted ``conversation_id``, ``None`` when missing or invalid (the
+    serializer reports those).
+    """
+    value = data.get("conversation_id") if isinstance(data, dict) else None
+    try:
+        return uuid.UUID(str(value)) if value else None
+    except ValueError:
+        return None
+
+
+class ConversationThrottle(BaseThrottle):
+    """
+    Reject a post to a conversation that got one less than
+    ``ADMISSION_CONVERSATION_INTERVAL`` seconds ago, before any work is done.
+    """
+
+    def allow_request(self, request, view):
+        try:
+            admit_conversation(conversation_id(request.data))
+        except AdmissionRejected as e:
+            self.retry_after = e.wait
+            return False
+        return True
+
+    def wait(self):
+        return self.retry_after
@@ -1,6 +1,30 @@
 from django.urls import path
-from conversation.views import MessageView
+from conversation.views import (
+    AsyncMessageView,
+    ConversationExportView,
+    ConversationMessagesView,
+    MessageBatchView,
+    MessageJobDetailView,
+    MessageJobView,
+    MessageView,
+    TopicStatsView,
+)
 
 urlpatterns = [
     path("message", MessageView.as_view(), name="send-message"),
+    path("message/async", AsyncMessageView.as_view(), name="send-message-async"),
+    path("message/batch", MessageBatchView.as_view(), name="send-message-batch"),
+    path("message/jobs", MessageJobView.as_view(), name="send-message-job"),
+    path(
+        "message/jobs/<uuid:job_id>",
+        MessageJobDetailView.as_view(),
+        name="message-job",
+    ),
+    path("export", ConversationExportView.as_view(), name="export-conversations"),
+    path("topics/stats", TopicStatsView.as_view(), name="topic-stats"),
+    path(
+        "<uuid:conversation_id>/messages",
+        ConversationMessagesView.as_view(),
+        name="conversation-messages",
+    ),
 ]
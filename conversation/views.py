@@ -1,17 +1,65 @@
-from typing import List, Dict
+import asyncio
+import json
+import math
+import time
+import uuid
+from contextlib import aclosing
+from datetime import datetime
+from typing import AsyncIterator, List, Dict, Optional, Tuple
 
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.db import transaction
+from django.core.handlers.asgi import ASGIRequest
+from django.http import JsonResponse, StreamingHttpResponse
+from django.urls import reverse
+from django.utils.cache import get_conditional_response
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
 from rest_framework import status
-from rest_framework.exceptions import NotFound
-from rest_framework.generics import CreateAPIView
+from rest_framework.exceptions import APIException, NotFound, ValidationError
+from rest_framework.generics import CreateAPIView, GenericAPIView
+from rest_framework.parsers import FormParser, MultiPartParser
+from rest_framework.permissions import IsAdminUser
+from rest_framework.renderers import BrowsableAPIRenderer
 from rest_framework.response import Response
+from rest_framework.views import APIView
 
-from conversation.models import Conversation, Message
+from chatbot import fastjson
+
+from conversation import job_events
+from conversation.export import export_lines, parse_bound
+from conversation.throttling import ConversationThrottle
+from conversation.models import Conversation, Message, MessageJob, TopicDailyStat
 from conversation.serializer import (
+    BatchMessageRequestSerializer,
+    MessageJobSerializer,
+    MessagePageRequestSerializer,
     MessageRequestSerializer,
     ConversationResponseSerializer,
+    TopicStatsRequestSerializer,
+    validate_message_request,
+)
+from conversation.utils import encode_cursor
+from lms import (
+    AsyncOpenAIClient,
+    OpenAIClient,
+    get_async_client,
+    get_client,
+    reply_cache,
 )
-from lms import OpenAIClient
+from lms.admission import admit_conversation
+from lms.history import as_prompt, fit_to_budget, split_for_summary
+
+# DRF's default parsers and renderers, with the fast JSON ones.
+FAST_PARSER_CLASSES = [fastjson.FastJSONParser, FormParser, MultiPartParser]
+FAST_RENDERER_CLASSES = [fastjson.FastJSONRenderer, BrowsableAPIRenderer]
+
+
+class ConversationConflict(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = "Conversation was updated by another request, please retry."
+    default_code = "conflict"
 
 
 class MessageView(CreateAPIView):
@@ -23,72 +71,802 @@ class MessageView(CreateAPIView):
         "conversation_id": "UUID | null",
         "message": "string"
     }
+
+    The turn runs in three phases so no transaction or row lock is held while
+    waiting on OpenAI: a short read phase, the LLM phase and a short commit
+    phase. Concurrent turns on the same conversation are detected through
+    ``Conversation.version``; the loser is retried up to
+    ``MESSAGE_CONFLICT_RETRIES`` times and then gets a 409.
+
+    The prompt history is the rolling ``Conversation.summary`` plus as many
+    recent messages as fit in ``HISTORY_TOKEN_BUDGET`` tokens; older messages
+    are folded into the summary every ``HISTORY_SUMMARY_EVERY_TURNS`` turns.
+
+    History and the response are served from ``Conversation.recent_messages``,
+    the last ``CONVERSATION_RECENT_WINDOW`` messages kept on the conversation
+    row, so a turn does not read the message table at all. A turn takes a
+    fixed number of queries: one conversation read (none for a new one), one
+    message insert and one conversation insert or update.
+
+    Posts to a conversation closer together than
+    ``ADMISSION_CONVERSATION_INTERVAL`` seconds, and turns whose OpenAI calls
+    are not admitted (see ``lms.admission``), get a 429 with ``Retry-After``.
+
+    With ``FAST_SERIALIZATION`` the body is parsed, validated and rendered
+    without the DRF field machinery, see ``chatbot.fastjson``.
     """
 
     serializer_class = MessageRequestSerializer
+    throttle_classes = [ConversationThrottle]
+    parser_classes = FAST_PARSER_CLASSES
+    renderer_classes = FAST_RENDERER_CLASSES
 
-    @transaction.atomic
     def post(self, request, *args, **kwargs):
-        client = OpenAIClient()
-        serializer = self.get_serializer(data=request.data)
-        serializer.is_valid(raise_exception=True)
+        client = get_client()
+        validated_data = validate_message_request(request.data)
 
-        conversation_id = serializer.validated_data.get("conversation_id")
-        user_text = serializer.validated_data["message"]
+        conversation_id = validated_data.get("conversation_id")
+        user_text = validated_data["message"]
 
-        conversation, created = self.get_conversation(conversation_id)
+        with reply_cache.request_scope(request):
+            conversation = self.run_turn(client, conversation_id, user_text)
 
-        if created:
-            topic, stance, bot_response = client.get_topic_and_stance(message=user_text)
-            conversation.set_topic_and_stance(topic, stance)
-        else:
-            messages = self.get_last_messages(conversation)
-            conv_topic = conversation.topic
-            conv_stance = conversation.stance
-            if conv_topic == "Undefined" or conversation.stance == "und":
-                topic, stance, bot_response = client.get_topic_and_stance(
-                    message=user_text
-                )
-                conversation.set_topic_and_stance(topic, stance)
+        data = ConversationResponseSerializer.build(conversation)
 
-            bot_response = client.debate_reply(
-                conv_topic, conv_stance, messages, user_text
-            )
+        return Response(status=status.HTTP_201_CREATED, data=data)
 
-        self.create_message(conversation, user_text, Message.Role.USER)
-        self.create_message(conversation, bot_response, Message.Role.SYSTEM)
+    @classmethod
+    def run_turn(
+        cls, client: OpenAIClient, conversation_id, user_text: str
+    ) -> Conversation:
+        """
+        Run the read, LLM and commit phases, retrying on conflicts.
+        """
+        attempts = settings.MESSAGE_CONFLICT_RETRIES + 1
+        for attempt in range(attempts):
+            conversation, created = cls.get_conversation(conversation_id)
+            history = [] if created else cls.get_history(conversation)
 
-        data = ConversationResponseSerializer.build(conversation)
+            fields, bot_response = cls.generate_reply(
+                client, conversation, created, history, user_text
+            )
 
-        return Response(status=status.HTTP_201_CREATED, data=data)
+            try:
+                cls.commit_turn(conversation, created, fields, user_text, bot_response)
+                return conversation
+            except ConversationConflict:
+                if attempt == attempts - 1:
+                    raise
 
     @staticmethod
     def get_conversation(conversation_id) -> [Conversation, bool]:
+        """
+        Read phase. New conversations are only instantiated here and get
+        inserted by ``commit_turn``.
+        """
         created = False
         if conversation_id:
             try:
-                conversation = Conversation.objects.select_for_update().get(
-                    conversation_id=conversation_id
-                )
+                conversation = Conversation.objects.get(conversation_id=conversation_id)
             except Conversation.DoesNotExist as e:
                 raise NotFound("Conversation not found.") from e
         else:
             created = True
-            conversation = Conversation.objects.create()
+            conversation = Conversation()
 
         return conversation, created
 
+    @classmethod
+    def generate_reply(
+        cls,
+        client: OpenAIClient,
+        conversation: Conversation,
+        created: bool,
+        history: List[Message],
+        user_text: str,
+    ) -> [Dict, str]:
+        """
+        LLM phase. Returns the conversation fields to store and the bot reply.
+        """
+        if created:
+            topic, stance, bot_response = client.get_topic_and_stance(message=user_text)
+            return {"topic": topic, "stance": stance}, bot_response
+
+        fields = {"topic": conversation.topic, "stance": conversation.stance}
+        combined = cls.combined_turn(conversation)
+        if cls.undefined_topic(conversation) and not combined:
+            topic, stance, _ = client.get_topic_and_stance(message=user_text)
+            fields.update(topic=topic, stance=stance)
+
+        folded, _ = split_for_summary(history)
+        if folded:
+            summary = client.summarize(conversation.summary, as_prompt(folded))
+            if summary is not None:
+                fields.update(summary=summary, summarized_until=folded[-1].created_at)
+
+        prompt = cls.build_prompt(conversation, history)
+        if combined:
+            topic, stance, bot_response = client.classify_and_reply(user_text, prompt)
+            fields.update(topic=topic, stance=stance)
+        else:
+            bot_response = client.debate_reply(
+                fields["topic"], fields["stance"], prompt, user_text
+            )
+        return fields, bot_response
+
     @staticmethod
-    def create_message(conversation: Conversation, message: str, role: str) -> Message:
+    def undefined_topic(conversation: Conversation) -> bool:
+        return conversation.topic == "Undefined" or conversation.stance == "und"
 
-        message = Message.objects.create(
-            conversation=conversation,
-            role=role,
-            message=message,
+    @classmethod
+    def combined_turn(cls, conversation: Conversation) -> bool:
+        """
+        Whether topic detection and the reply share one structured call.
+        """
+        return settings.OPENAI_COMBINED_TURN and cls.undefined_topic(conversation)
+
+    @staticmethod
+    def build_prompt(
+        conversation: Conversation, history: List[Message]
+    ) -> List[Dict[str, str]]:
+        return fit_to_budget(
+            conversation.summary, as_prompt(history), settings.HISTORY_TOKEN_BUDGET
+        )
+
+    @classmethod
+    def commit_turn(
+        cls,
+        conversation: Conversation,
+        created: bool,
+        fields: Dict,
+        user_text: str,
+        bot_response: str,
+    ) -> None:
+        """
+        Commit phase. Raises ``ConversationConflict`` if the conversation
+        changed since it was read.
+        """
+        with transaction.atomic():
+            # Messages go first so the window can be written along with the
+            # version check; foreign keys are only checked at commit.
+            conversation.push_recent_messages(
+                *cls.create_turn_messages(conversation, user_text, bot_response)
+            )
+            fields = {**fields, "recent_messages": conversation.recent_messages}
+            linked = conversation.link_topic(fields)
+
+            if created:
+                for name, value in fields.items():
+                    setattr(conversation, name, value)
+                conversation.save(force_insert=True)
+            elif not conversation.update_if_unchanged(**fields):
+                raise ConversationConflict()
+            if linked:
+                TopicDailyStat.record(conversation)
+
+    @staticmethod
+    def create_turn_messages(
+        conversation: Conversation, user_text: str, bot_response: str
+    ) -> List[Message]:
+        """
+        Insert the user message and the bot reply with a single query.
+        """
+        return Message.objects.bulk_create(
+            [
+                Message(
+                    conversation=conversation,
+                    role=Message.Role.USER,
+                    message=user_text,
+                ),
+                Message(
+                    conversation=conversation,
+                    role=Message.Role.SYSTEM,
+                    message=bot_response,
+                ),
+            ]
         )
-        return message
 
     @staticmethod
-    def get_last_messages(conversation: Conversation) -> List[Dict[str, str]]:
-        qs = Message.get_last_messages_from_conversation(conversation)
-        return [{"role": m.role, "content": m.message} for m in qs]
+    def get_history(conversation: Conversation) -> List[Message]:
+        """
+        Messages not yet folded into the summary, oldest first. Conversations
+        without a recent window yet get it loaded from the message table; it
+        is stored with the next commit.
+        """
+        if not conversation.recent_messages:
+            qs = Message.get_last_messages_from_conversation(
+                conversation, settings.CONVERSATION_RECENT_WINDOW
+            )
+            conversation.set_recent_messages(list(qs)[::-1])
+        return conversation.get_unsummarized_recent_messages(
+            settings.HISTORY_MAX_MESSAGES
+        )
+
+
+class AsyncMessageView(View):
+    """
+    Async variant of ``MessageView`` for ASGI deployments.
+
+    Same body and response as ``MessageView``, but OpenAI is called through
+    ``AsyncOpenAIClient`` and reads use the async ORM, so a waiting turn does
+    not hold a worker thread. Only the short commit phase runs in a thread,
+    as transactions are not available from async code.
+
+    With ``?stream=true`` or ``Accept: text/event-stream`` the reply is sent
+    as Server-Sent Events: ``delta`` events while it is generated, then a
+    ``done`` event with the usual response body once it has been stored, or
+    an ``error`` event if it could not be stored.
+    """
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        return csrf_exempt(super().as_view(**initkwargs))
+
+    async def post(self, request, *args, **kwargs):
+        try:
+            payload = fastjson.loads(request.body or b"{}")
+        except ValueError:
+            return JsonResponse(
+                {"detail": "JSON parse error."}, status=status.HTTP_400_BAD_REQUEST
+            )
+
+        try:
+            validated_data = validate_message_request(payload)
+        except ValidationError as e:
+            return JsonResponse(e.detail, status=status.HTTP_400_BAD_REQUEST)
+
+        conversation_id = validated_data.get("conversation_id")
+        user_text = validated_data["message"]
+
+        try:
+            await sync_to_async(admit_conversation)(conversation_id)
+            if self.wants_stream(request):
+                return await self.stream_turn(
+                    get_async_client(),
+                    conversation_id,
+                    user_text,
+                    bypass_cache=reply_cache.bypassed(request),
+                )
+            with reply_cache.request_scope(request):
+                conversation = await self.run_turn(
+                    get_async_client(), conversation_id, user_text
+                )
+        except APIException as e:
+            return self.error_response(e)
+
+        data = await self.build_response(conversation)
+
+        return JsonResponse(data, status=status.HTTP_201_CREATED)
+
+    @staticmethod
+    def error_response(error: APIException) -> JsonResponse:
+        response = JsonResponse({"detail": error.detail}, status=error.status_code)
+        if getattr(error, "wait", None):
+            response["Retry-After"] = str(math.ceil(error.wait))
+        return response
+
+    @staticmethod
+    def wants_stream(request) -> bool:
+        return request.GET.get("stream") == "true" or (
+            "text/event-stream" in request.headers.get("Accept", "")
+        )
+
+    @staticmethod
+    async def build_response(conversation: Conversation) -> Dict:
+        messages = None
+        if not conversation.recent_messages:
+            messages = [
+                m
+                async for m in Message.get_last_messages_from_conversation(conversation)
+            ]
+        return ConversationResponseSerializer.build(conversation, messages)
+
+    @classmethod
+    async def run_turn(
+        cls, client: AsyncOpenAIClient, conversation_id, user_text: str
+    ) -> Conversation:
+        """
+        Async counterpart of ``MessageView.run_turn``.
+        """
+        attempts = settings.MESSAGE_CONFLICT_RETRIES + 1
+        for attempt in range(attempts):
+            conversation, created = await cls.get_conversation(conversation_id)
+            history = [] if created else await cls.get_history(conversation)
+
+            fields, bot_response = await cls.generate_reply(
+                client, conversation, created, history, user_text
+            )
+
+            try:
+                await sync_to_async(MessageView.commit_turn)(
+                    conversation, created, fields, user_text, bot_response
+                )
+                return conversation
+            except ConversationConflict:
+                if attempt == attempts - 1:
+                    raise
+
+    @classmethod
+    async def stream_turn(
+        cls,
+        client: AsyncOpenAIClient,
+        conversation_id,
+        user_text: str,
+        bypass_cache: bool = False,
+    ) -> StreamingHttpResponse:
+        """
+        Read phase runs before the response starts, so a missing conversation
+        is still a plain 404. Conflicts cannot be retried once deltas were
+        sent and are reported as an ``error`` event instead.
+        """
+        conversation, created = await cls.get_conversation(conversation_id)
+        history = [] if created else await cls.get_history(conversation)
+
+        events = cls.event_stream(client, conversation, created, history, user_text)
+        if bypass_cache:
+            events = reply_cache.bypassing(events)
+        response = StreamingHttpResponse(events, content_type="text/event-stream")
+        response["Cache-Control"] = "no-cache"
+        response["X-Accel-Buffering"] = "no"
+        return response
+
+    @classmethod
+    async def event_stream(
+        cls,
+        client: AsyncOpenAIClient,
+        conversation: Conversation,
+        created: bool,
+        history: List[Message],
+        user_text: str,
+    ) -> AsyncIterator[str]:
+        # Admission control can reject the OpenAI calls once the response
+        # has started.
+        try:
+            if created:
+                topic, stance, bot_response = await client.get_topic_and_stance(
+                    message=user_text
+                )
+                fields = {"topic": topic, "stance": stance}
+                yield cls.sse("delta", {"delta": bot_response})
+            else:
+                fields = {"topic": conversation.topic, "stance": conversation.stance}
+                combined = MessageView.combined_turn(conversation)
+                if MessageView.undefined_topic(conversation) and not combined:
+                    topic, stance, _ = await client.get_topic_and_stance(
+                        message=user_text
+                    )
+                    fields.update(topic=topic, stance=stance)
+
+                folded, _ = split_for_summary(history)
+                summary = None
+                if folded:
+                    summary = asyncio.ensure_future(
+                        client.summarize(conversation.summary, as_prompt(folded))
+                    )
+
+                parts = []
+                prompt = MessageView.build_prompt(conversation, history)
+                try:
+                    # aclosing() makes a client disconnect close the upstream request.
+                    async with aclosing(
+                        cls.combined_deltas(client, fields, prompt, user_text)
+                        if combined
+                        else client.stream_debate_reply(
+                            fields["topic"], fields["stance"], prompt, user_text
+                        )
+                    ) as deltas:
+                        async for delta in deltas:
+                            parts.append(delta)
+                            yield cls.sse("delta", {"delta": delta})
+                    if summary and await summary is not None:
+                        fields.update(
+                            summary=summary.result(),
+                            summarized_until=folded[-1].created_at,
+                        )
+                finally:
+                    if summary and not summary.done():
+                        summary.cancel()
+                bot_response = "".join(parts)
+        except APIException as e:
+            yield cls.sse("error", {"detail": e.detail})
+            return
+
+        try:
+            await sync_to_async(MessageView.commit_turn)(
+                conversation, created, fields, user_text, bot_response
+            )
+        except APIException as e:
+            yield cls.sse("error", {"detail": e.detail})
+            return
+
+        yield cls.sse("done", await cls.build_response(conversation))
+
+    @staticmethod
+    async def combined_deltas(
+        client: AsyncOpenAIClient, fields: Dict, prompt: List[Dict], user_text: str
+    ) -> AsyncIterator[str]:
+        """
+        The structured reply can only be validated once complete, so it is
+        sent as a single delta.
+        """
+        topic, stance, bot_response = await client.classify_and_reply(user_text, prompt)
+        fields.update(topic=topic, stance=stance)
+        yield bot_response
+
+    @staticmethod
+    def sse(event: str, data: Dict) -> str:
+        return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+    @staticmethod
+    async def get_conversation(conversation_id) -> [Conversation, bool]:
+        if not conversation_id:
+            return Conversation(), True
+
+        try:
+            conversation = await Conversation.objects.aget(
+                conversation_id=conversation_id
+            )
+        except Conversation.DoesNotExist as e:
+            raise NotFound("Conversation not found.") from e
+
+        return conversation, False
+
+    @staticmethod
+    async def generate_reply(
+        client: AsyncOpenAIClient,
+        conversation: Conversation,
+        created: bool,
+        history: List[Message],
+        user_text: str,
+    ) -> [Dict, str]:
+        """
+        Same as ``MessageView.generate_reply``, but a due summary update runs
+        concurrently with the reply instead of before it.
+        """
+        if created:
+            topic, stance, bot_response = await client.get_topic_and_stance(
+                message=user_text
+            )
+            return {"topic": topic, "stance": stance}, bot_response
+
+        fields = {"topic": conversation.topic, "stance": conversation.stance}
+        combined = MessageView.combined_turn(conversation)
+        if MessageView.undefined_topic(conversation) and not combined:
+            topic, stance, _ = await client.get_topic_and_stance(message=user_text)
+            fields.update(topic=topic, stance=stance)
+
+        prompt = MessageView.build_prompt(conversation, history)
+        if combined:
+            reply = client.classify_and_reply(user_text, prompt)
+        else:
+            reply = client.debate_reply(
+                fields["topic"], fields["stance"], prompt, user_text
+            )
+        folded, _ = split_for_summary(history)
+        if folded:
+            summary, bot_response = await asyncio.gather(
+                client.summarize(conversation.summary, as_prompt(folded)), reply
+            )
+            if summary is not None:
+                fields.update(summary=summary, summarized_until=folded[-1].created_at)
+        else:
+            bot_response = await reply
+
+        if combined:
+            topic, stance, bot_response = bot_response
+            fields.update(topic=topic, stance=stance)
+        return fields, bot_response
+
+    @staticmethod
+    async def get_history(conversation: Conversation) -> List[Message]:
+        if not conversation.recent_messages:
+            qs = Message.get_last_messages_from_conversation(
+                conversation, settings.CONVERSATION_RECENT_WINDOW
+            )
+            conversation.set_recent_messages([m async for m in qs][::-1])
+        return conversation.get_unsummarized_recent_messages(
+            settings.HISTORY_MAX_MESSAGES
+        )
+
+
+class MessageBatchView(GenericAPIView):
+    """
+    Run many independent messages in one request.
+
+    Expected body:
+    {
+        "items": [{"conversation_id": "UUID | null", "message": "string"}]
+    }
+
+    Returns ``{"results": [...]}`` in input order: the ``MessageView``
+    response with ``status: 201`` for each stored turn, or ``status`` and
+    ``detail`` for each failed one. See ``conversation.batch.run_batch``.
+    """
+
+    serializer_class = BatchMessageRequestSerializer
+    parser_classes = FAST_PARSER_CLASSES
+    renderer_classes = FAST_RENDERER_CLASSES
+
+    def post(self, request, *args, **kwargs):
+        # The batch pipeline builds on MessageView, so it imports this module.
+        from conversation.batch import run_batch
+
+        client = get_client()
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        with reply_cache.request_scope(request):
+            results = run_batch(serializer.validated_data["items"], client)
+
+        return Response(status=status.HTTP_200_OK, data={"results": results})
+
+
+class MessageJobView(GenericAPIView):
+    """
+    Accept a message for background processing.
+
+    Same body as ``MessageView``. The user message is stored right away and
+    the reply is generated by the ``run_message_jobs`` worker; the 202
+    response carries the ``job_id`` to poll on ``message/jobs/<job_id>``.
+    """
+
+    serializer_class = MessageRequestSerializer
+    throttle_classes = [ConversationThrottle]
+    parser_classes = FAST_PARSER_CLASSES
+    renderer_classes = FAST_RENDERER_CLASSES
+
+    def post(self, request, *args, **kwargs):
+        # The job pipeline builds on MessageView, so it imports this module.
+        from conversation.jobs import submit_job
+
+        validated_data = validate_message_request(request.data)
+
+        job = submit_job(
+            validated_data.get("conversation_id"), validated_data["message"]
+        )
+
+        return Response(
+            status=status.HTTP_202_ACCEPTED,
+            data=MessageJobSerializer(job).data,
+            headers={"Location": reverse("message-job", args=[job.job_id])},
+        )
+
+
+class MessageJobDetailView(View):
+    """
+    State of a message job, as a long poll: with ``?wait=<seconds>`` (at
+    most ``JOB_LONG_POLL_MAX``) the response is held until the job finishes
+    or the wait is over. The job is read again when ``job_events`` reports
+    it finished. Under WSGI a waiting request holds a worker thread, so the
+    wait is capped by ``JOB_LONG_POLL_MAX_WSGI`` instead.
+
+    Returns 202 with the job state while it is pending, and 200 once it
+    finished: with the usual ``MessageView`` response body when it is
+    ``done``, with a ``detail`` when it ``failed``.
+    """
+
+    async def get(self, request, job_id, *args, **kwargs):
+        if isinstance(request, ASGIRequest):
+            max_wait = settings.JOB_LONG_POLL_MAX
+        else:
+            max_wait = settings.JOB_LONG_POLL_MAX_WSGI
+        try:
+            wait = float(request.GET.get("wait", 0))
+        except ValueError:
+            wait = math.nan
+        if not math.isfinite(wait) or wait < 0:
+            return JsonResponse(
+                {"wait": ["A valid number is required."]},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        wait = min(wait, max_wait)
+
+        if wait > 0 and settings.JOB_LISTEN:
+            job_events.listener.start()
+        loop, finished = asyncio.get_running_loop(), asyncio.Event()
+
+        def wake():
+            try:
+                loop.call_soon_threadsafe(finished.set)
+            except RuntimeError:
+                # The request is over and its event loop closed.
+                pass
+
+        deadline = time.monotonic() + wait
+        # Registered before the first read, so a job finishing in between
+        # still wakes this request.
+        with job_events.listener.waiting(job_id, wake):
+            while True:
+                finished.clear()
+                job = (
+                    await MessageJob.objects.select_related("conversation")
+                    .filter(job_id=job_id)
+                    .afirst()
+                )
+                if job is None:
+                    return JsonResponse(
+                        {"detail": "Job not found."},
+                        status=status.HTTP_404_NOT_FOUND,
+                    )
+                remaining = deadline - time.monotonic()
+                if job.finished or remaining <= 0:
+                    break
+                if not job_events.listener.connected:
+                    remaining = min(settings.JOB_POLL_INTERVAL, remaining)
+                try:
+                    await asyncio.wait_for(finished.wait(), remaining)
+                except asyncio.TimeoutError:
+                    pass
+
+        data = MessageJobSerializer(job).data
+        if not job.finished:
+            return JsonResponse(data, status=status.HTTP_202_ACCEPTED)
+        if job.status == MessageJob.Status.FAILED:
+            data["detail"] = job.error
+        else:
+            data.update(await AsyncMessageView.build_response(job.conversation))
+        return JsonResponse(data, status=status.HTTP_200_OK)
+
+
+class ConversationMessagesView(APIView):
+    """
+    A page of a conversation's messages, oldest first.
+
+    Without a cursor the page holds the last ``limit`` messages
+    (``MESSAGES_PAGE_SIZE`` by default). ``previous`` is the ``before``
+    cursor of the page of older messages, ``null`` once there are none, and
+    ``next`` the ``since`` cursor that returns only messages added after this
+    page. A full ``since`` page means more may be waiting.
+
+    The ``ETag`` is the conversation version, which every stored turn bumps,
+    so a poll with ``If-None-Match`` gets a 304 after one primary key read.
+    Pages inside ``Conversation.recent_messages`` are served from it, others
+    through a keyset query on the history index.
+    """
+
+    renderer_classes = FAST_RENDERER_CLASSES
+
+    def get(self, request, conversation_id, *args, **kwargs):
+        params = MessagePageRequestSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+
+        conversation = (
+            Conversation.objects.only("version", "recent_messages")
+            .filter(conversation_id=conversation_id)
+            .first()
+        )
+        if conversation is None:
+            raise NotFound("Conversation not found.")
+
+        etag = f'"{conversation.version}"'
+        not_modified = get_conditional_response(request, etag=etag)
+        if not_modified is not None:
+            not_modified["ETag"] = etag
+            return not_modified
+
+        data = self.get_page(conversation, **params.validated_data)
+        return Response(data, headers={"ETag": etag})
+
+    @classmethod
+    def get_page(
+        cls, conversation: Conversation, limit: int, since=None, before=None
+    ) -> Dict:
+        messages = cls.page_from_window(conversation, limit, since, before)
+        if messages is None:
+            rows = Message.get_page(
+                conversation.conversation_id, limit + 1, since, before
+            )
+            messages = [Conversation.window_entry(m) for m in rows]
+            if not since:
+                messages.reverse()
+
+        # One message past the limit tells whether there is another page.
+        if since:
+            page, previous = messages[:limit], None
+        else:
+            page = messages[-limit:]
+            previous = page[0] if len(messages) > limit else None
+
+        if page:
+            next_cursor = cls.cursor(page[-1])
+        else:
+            next_cursor = encode_cursor(*since) if since else None
+        return {
+            "conversation_id": str(conversation.conversation_id),
+            "messages": page,
+            "previous": previous and cls.cursor(previous),
+            "next": next_cursor,
+        }
+
+    @classmethod
+    def page_from_window(
+        cls, conversation: Conversation, limit: int, since, before
+    ) -> Optional[List[Dict]]:
+        """
+        The page plus one message, oldest first, when the window holds all of
+        it; ``None`` otherwise.
+        """
+        window = sorted(conversation.recent_messages, key=cls.position)
+        if since and window and cls.position(window[0]) <= since:
+            return [m for m in window if cls.position(m) > since][: limit + 1]
+        if not since and not before and len(window) > limit:
+            extra = len(window) - limit - 1
+            return window[extra:]
+        return None
+
+    @staticmethod
+    def position(entry: Dict) -> Tuple[datetime, uuid.UUID]:
+        return (
+            datetime.fromisoformat(entry["created_at"]),
+            uuid.UUID(entry["message_id"]),
+        )
+
+    @staticmethod
+    def cursor(entry: Dict) -> str:
+        return encode_cursor(
+            datetime.fromisoformat(entry["created_at"]), entry["message_id"]
+        )
+
+
+class ConversationExportView(APIView):
+    """
+    Stream conversations as NDJSON, one line per conversation with its
+    messages, for staff users. ``since`` and ``until`` filter on the last
+    update time (ISO 8601).
+    """
+
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        bounds = {}
+        for name in ("since", "until"):
+            if request.query_params.get(name):
+                try:
+                    bounds[name] = parse_bound(request.query_params[name])
+                except ValueError as e:
+                    raise ValidationError({name: str(e)}) from e
+
+        return StreamingHttpResponse(
+            export_lines(**bounds), content_type="application/x-ndjson"
+        )
+
+
+class TopicStatsView(APIView):
+    """
+    Topics with the most conversations in a range of days, for staff users.
+    ``since`` and ``until`` are dates (last ``TOPIC_STATS_DAYS`` days by
+    default), ``stance`` counts only ``pro`` or ``con`` conversations.
+
+    Read from ``TopicDailyStat``, one row per topic, day and stance, so the
+    cost depends on the number of topics in the range, not of conversations.
+    """
+
+    permission_classes = [IsAdminUser]
+    renderer_classes = FAST_RENDERER_CLASSES
+
+    def get(self, request, *args, **kwargs):
+        params = TopicStatsRequestSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        since, until, stance, limit = (
+            params.validated_data.get(name)
+            for name in ("since", "until", "stance", "limit")
+        )
+
+        rows = TopicDailyStat.top_topics(since, until, stance, limit)
+        return Response(
+            {
+                "since": since.isoformat(),
+                "until": until.isoformat(),
+                "stance": stance,
+                "topics": [
+                    {
+                        "topic": row["topic__label"],
+                        "name": row["topic__name"],
+                        "conversations": row["total"],
+                        "pro": row["pro"],
+                        "con": row["con"],
+                    }
+                    for row in rows
+                ],
+            }
+        )
@@ -0,0 +1,69 @@
+"""
+gunicorn settings for the production profile:
+
+    DJANGO_SETTINGS_MODULE=chatbot.settings_production \
+        gunicorn chatbot.wsgi -c gunicorn.conf.py
+
+A turn spends almost all of its time waiting on OpenAI, so each process runs
+many threads (``gthread``) and processes are only added for CPU parallelism.
+Each thread holds at most one database connection, plus one per process for
+the job long-poll listener, so ``GUNICORN_WORKERS * (GUNICORN_THREADS + 1)``
+must stay below the Postgres ``max_connections``, or use ``DB_POOL=1`` with
+``DB_POOL_MAX_SIZE`` per process.
+"""
+
+import multiprocessing
+import os
+
+bind = os.getenv("GUNICORN_BIND", f"0.0.0.0:{os.getenv('PORT', '8000')}")
+worker_class = os.getenv("GUNICORN_WORKER_CLASS", "gthread")
+workers = int(os.getenv("GUNICORN_WORKERS", multiprocessing.cpu_count()))
+threads = int(os.getenv("GUNICORN_THREADS", "16"))
+
+# The longest turn: topic detection, summary and reply one after the other,
+# each bounded by OPENAI_DEADLINE, run again after a version conflict. gthread
+# workers keep sending heartbeats while requests run, so there ``timeout``
+# only matters to the other worker classes; ``graceful_timeout`` is what the
+# turns in flight get to finish on a restart.
+TURN_OPENAI_CALLS = 3
+turn_attempts = int(os.getenv("MESSAGE_CONFLICT_RETRIES", "1")) + 1
+longest_turn = (
+    float(os.getenv("OPENAI_DEADLINE", "90")) * TURN_OPENAI_CALLS * turn_attempts
+)
+timeout = int(os.getenv("GUNICORN_TIMEOUT", longest_turn + 30))
+graceful_timeout = timeout
+keepalive = 5
+
+# Recycle workers now and then; the jitter keeps them from restarting at once.
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", "5000"))
+max_requests_jitter = max_requests // 10
+
+# Load Django once in the master; the workers share its memory.
+preload_app = True
+
+
+def on_starting(server):
+    """
+    Drop the metrics files of the previous run, see ``chatbot.metrics``.
+    """
+    directory = os.getenv("METRICS_DIR")
+    if directory and os.path.isdir(directory):
+        for name in os.listdir(directory):
+            if name.endswith((".json", ".partial")):
+                os.remove(os.path.join(directory, name))
+
+
+def post_fork(server, worker):
+    """
+    Nothing opened by the master may be shared with a worker: close its
+    database connections and drop the shared OpenAI clients. The metrics
+    the master recorded while loading the app are not the worker's.
+    """
+    from django.db import connections
+
+    from chatbot import metrics
+    from lms import reset_clients
+
+    connections.close_all()
+    reset_clients()
+    metrics.reset()
@@ -1,77 +1,205 @@
 import json
-from typing import List, Dict
+import os
+import threading
+from contextlib import nullcontext
+from typing import AsyncIterator, List, Dict, Optional, Tuple
 
 from django.conf import settings
-from openai import OpenAI
+from rest_framework import status
+from rest_framework.exceptions import APIException
 
+from chatbot import metrics
+from lms import classifier, pool, reply_cache
+from lms.admission import Admission
+from lms.policy import (
+    FALLBACK_REPLY,
+    LatencyPolicy,
+    UpstreamUnavailable,
+    fallbacks,
+    stream_errors,
+)
+from lms.router import Router
 
-class OpenAIClient:
+TOPIC_AND_STANCE_PROMPT = (
+    "Extract the topic, the bot_stance (pro, con), "
+    "and an initial response "
+    "the BOT should take from the user's message. "
+    "Rules:"
+    "1) If the user explicitly assigns a stance to the "
+    "BOT (e.g. 'you are pro', 'estás a favor'), "
+    "then the BOT must keep that stance."
+    "2) If the user only states their OWN stance "
+    "(e.g. 'I am pro', 'estoy a favor'), "
+    "then the BOT stance must be the opposite."
+    "3) If neither is stated, infer a reasonable stance"
+    " from the message."
+    "4) If the message is a greeting, small talk, or not a "
+    "debate-worthy topic "
+    "(e.g. 'hello', 'how are you'), then set 'topic' = 'und' and "
+    "return a response asking the user to clarify the debate topic"
+    "5) If ambiguous, set 'bot_stance' = 'und' and respond "
+    "asking the user "
+    "to clarify whether they are 'pro' or 'con'."
+    "6) Always return ONLY a valid JSON string "
+    "with keys: 'topic', 'bot_stance', 'response'."
+    "The 'response' must always be a single line string. "
+    "Never include line breaks, or Markdown formatting. "
+    "Formatting will be handled by the frontend."
+)
+
+COMBINED_TURN_PROMPT = TOPIC_AND_STANCE_PROMPT + (
+    " When both the topic and the bot_stance are known, the 'response' must "
+    "already be the BOT's debate reply: argue the bot_stance persuasively but "
+    "calmly in 2-3 concise points and end with a guiding question. "
+    "If the user speaks Spanish, reply in Spanish."
+)
+
+TURN_SCHEMA = {
+    "type": "json_schema",
+    "name": "debate_turn",
+    "strict": True,
+    "schema": {
+        "type": "object",
+        "properties": {
+            "topic": {"type": "string"},
+            "bot_stance": {"type": "string", "enum": ["pro", "con", "und"]},
+            "response": {"type": "string"},
+        },
+        "required": ["topic", "bot_stance", "response"],
+        "additionalProperties": False,
+    },
+}
+
+malformed = metrics.Counter(
+    "chatbot_openai_malformed_total",
+    "Structured OpenAI replies that failed validation.",
+    ("operation",),
+)
+
+
+class StreamInterrupted(APIException):
     """
-    Cliente thin-wrapper to generate replies
+    The upstream stream failed after deltas were sent, so the reply is
+    incomplete and cannot fall back anymore.
+    """
+
+    status_code = status.HTTP_502_BAD_GATEWAY
+    default_detail = "The reply was interrupted, please retry."
+
+
+class BaseClient:
+    """
+    Prompt building and response parsing shared by the sync and async clients
     """
 
     def __init__(self):
-        self.client = OpenAI(api_key=settings.API_KEY)
         self.model = settings.OPENAI_MODEL
         self.max_output_tokens = settings.OPENAI_MAX_OUTPUT_TOKENS
         self.temperature = settings.OPENAI_TEMPERATURE
 
-    def get_topic_and_stance(self, message: str, history=None) -> [str, str, str]:
+    def topic_and_stance_request(self, message: str, history=None) -> Dict:
         """
-        Identify topic and stance in conversation
+        Build the Responses API arguments to identify topic and stance
         """
         if history is None:
             history = []
 
-        system = {
-            "role": "system",
-            "content": (
-                "Extract the topic, the bot_stance (pro, con), "
-                "and an initial response "
-                "the BOT should take from the user's message. "
-                "Rules:"
-                "1) If the user explicitly assigns a stance to the "
-                "BOT (e.g. 'you are pro', 'estás a favor'), "
-                "then the BOT must keep that stance."
-                "2) If the user only states their OWN stance "
-                "(e.g. 'I am pro', 'estoy a favor'), "
-                "then the BOT stance must be the opposite."
-                "3) If neither is stated, infer a reasonable stance"
-                " from the message."
-                "4) If the message is a greeting, small talk, or not a "
-                "debate-worthy topic "
-                "(e.g. 'hello', 'how are you'), then set 'topic' = 'und' and "
-                "return a response asking the user to clarify the debate topic"
-                "5) If ambiguous, set 'bot_stance' = 'und' and respond "
-                "asking the user "
-                "to clarify whether they are 'pro' or 'con'."
-                "6) Always return ONLY a valid JSON string "
-                "with keys: 'topic', 'bot_stance', 'response'."
-                "The 'response' must always be a single line string. "
-                "Never include line breaks, or Markdown formatting. "
-                "Formatting will be handled by the frontend."
-            ),
-        }
+        system = {"role": "system", "content": TOPIC_AND_STANCE_PROMPT}
 
         user = {"role": "user", "content": message}
 
         history = history or []
 
-        resp = self.client.responses.create(
-            model=self.model,
-            input=[system, user, *history],
-            temperature=0,
-            max_output_tokens=120,
-        )
+        return {
+            "model": self.model,
+            "input": [system, user, *history],
+            "temperature": 0,
+            "max_output_tokens": 120,
+            "text": {"format": TURN_SCHEMA},
+        }
+
+    def classify_and_reply_request(self, message: str, history: List[Dict]) -> Dict:
+        """
+        Build the Responses API arguments to identify topic and stance and
+        answer the message in the same call
+        """
+        return {
+            "model": self.model,
+            "input": [
+                {"role": "system", "content": COMBINED_TURN_PROMPT},
+                *history,
+                {"role": "user", "content": message},
+            ],
+            "temperature": self.temperature,
+            # Room for the JSON keys, topic and stance around the reply.
+            "max_output_tokens": self.max_output_tokens + 120,
+            "text": {"format": TURN_SCHEMA},
+        }
 
-        data = json.loads(resp.output_text)
-        return data["topic"], data["bot_stance"], data["response"]
+    @staticmethod
+    def known_topic_and_stance(message: str, history=None):
+        """
+        Answer from the local pre-classifier or the classification cache,
+        ``None`` when the model has to be called
+        """
+        if history:
+            return None
 
-    def debate_reply(
+        if settings.TOPIC_PRECLASSIFIER_ENABLED:
+            result = classifier.preclassify(message)
+            if result:
+                return result
+
+        return classifier.topic_cache().get(classifier.normalize(message))
+
+    @staticmethod
+    def remember_topic_and_stance(message: str, history, result):
+        if not history:
+            classifier.topic_cache().set(classifier.normalize(message), result)
+
+    @staticmethod
+    def fallback_reply(operation: str, message: str) -> str:
+        """
+        Canned reply, in the user's language, for when OpenAI is unavailable
+        """
+        fallbacks.inc(operation=operation)
+        return FALLBACK_REPLY[classifier.language(classifier.normalize(message))]
+
+    @staticmethod
+    def parse_topic_and_stance(resp) -> Optional[Tuple[str, str, str]]:
+        """
+        Topic, stance and response of a structured reply, ``None`` when the
+        output does not match ``TURN_SCHEMA``
+        """
+        try:
+            data = json.loads(resp.output_text)
+        except (TypeError, ValueError):
+            return None
+        if not isinstance(data, dict):
+            return None
+
+        result = data.get("topic"), data.get("bot_stance"), data.get("response")
+        if not all(isinstance(value, str) and value.strip() for value in result):
+            return None
+        if result[1] not in ("pro", "con", "und"):
+            return None
+        return result
+
+    @staticmethod
+    def malformed_reply(operation: str, message: str) -> [str, str, str]:
+        """
+        Leave topic and stance undefined and ask the user to restate them,
+        so they are detected again on the next message
+        """
+        malformed.inc(operation=operation)
+        lang = classifier.language(classifier.normalize(message))
+        return "und", "und", classifier.SMALL_TALK_REPLY[lang]
+
+    def debate_request(
         self, topic: str, stance: str, history: List[Dict], user_text: str
-    ) -> str:
+    ) -> Dict:
         """
-        Prepare response opposite to user
+        Build the Responses API arguments for a reply opposite to user
         """
 
         sys_behavior = {
@@ -92,11 +220,362 @@ class OpenAIClient:
 
         history.append({"role": "user", "content": user_text})
 
-        resp = self.client.responses.create(
-            model=self.model,
-            input=[sys_behavior, *history],
-            temperature=self.temperature,
-            max_output_tokens=self.max_output_tokens,
-        )
+        return {
+            "model": self.model,
+            "input": [sys_behavior, *history],
+            "temperature": self.temperature,
+            "max_output_tokens": self.max_output_tokens,
+        }
+
+    def summary_request(self, summary: str, messages: List[Dict]) -> Dict:
+        """
+        Build the Responses API arguments to fold messages into the summary
+        """
+        system = {
+            "role": "system",
+            "content": (
+                "You keep a running summary of a debate between a user and a "
+                "debate bot (role system). Merge the previous summary with the "
+                "new messages in at most 120 words. Keep the topic, the main "
+                "arguments of each side and any concessions. "
+                "Return only the summary as a single line."
+            ),
+        }
+        transcript = "\n".join(f"{m['role']}: {m['content']}" for m in messages)
+        user = {
+            "role": "user",
+            "content": f"Previous summary: {summary or 'none'}\n"
+            f"New messages:\n{transcript}",
+        }
+
+        return {
+            "model": self.model,
+            "input": [system, user],
+            "temperature": 0,
+            "max_output_tokens": settings.HISTORY_SUMMARY_MAX_TOKENS,
+        }
+
+
+class OpenAIClient(BaseClient):
+    """
+    Cliente thin-wrapper to generate replies. Requests go to the
+    ``LLM_BACKENDS`` through ``router``, see ``lms.router``.
+    """
+
+    def __init__(
+        self,
+        http_client=None,
+        policy: LatencyPolicy = None,
+        admission: Admission = None,
+        router: Router = None,
+    ):
+        super().__init__()
+        self.policy = policy or LatencyPolicy.from_settings()
+        self.admission = admission or Admission.from_settings()
+        self.router = router or Router.from_settings(http_client)
+
+    def get_topic_and_stance(self, message: str, history=None) -> [str, str, str]:
+        """
+        Identify topic and stance in conversation. While OpenAI is unavailable
+        both stay undefined, so they are asked for again on the next message.
+        """
+        result = self.known_topic_and_stance(message, history)
+        if result:
+            return result
+
+        try:
+            resp = self.create(
+                "get_topic_and_stance",
+                self.topic_and_stance_request(message, history),
+            )
+        except UpstreamUnavailable:
+            return "und", "und", self.fallback_reply("get_topic_and_stance", message)
+        result = self.parse_topic_and_stance(resp)
+        if not result:
+            return self.malformed_reply("get_topic_and_stance", message)
+        self.remember_topic_and_stance(message, history, result)
+        return result
+
+    def classify_and_reply(self, message: str, history: List[Dict]) -> [str, str, str]:
+        """
+        Topic, stance and the debate reply for a conversation whose topic is
+        still undefined, in one structured call instead of
+        ``get_topic_and_stance`` followed by ``debate_reply``. Known
+        classifications skip the combined call.
+        """
+        result = self.known_topic_and_stance(message)
+        if result and "und" not in result[:2]:
+            topic, stance, _ = result
+            return topic, stance, self.debate_reply(topic, stance, history, message)
+        if result:
+            return result
+
+        key = reply_cache.cache_key("classify_and_reply", "", "", history, message)
+        cached = reply_cache.lookup(key)
+        if cached:
+            return cached
 
+        try:
+            resp = self.create(
+                "classify_and_reply", self.classify_and_reply_request(message, history)
+            )
+        except UpstreamUnavailable:
+            return "und", "und", self.fallback_reply("classify_and_reply", message)
+        result = self.parse_topic_and_stance(resp)
+        if not result:
+            return self.malformed_reply("classify_and_reply", message)
+        reply_cache.store(key, result)
+        return result
+
+    def debate_reply(
+        self, topic: str, stance: str, history: List[Dict], user_text: str
+    ) -> str:
+        """
+        Prepare response opposite to user
+        """
+        key = reply_cache.cache_key("debate_reply", topic, stance, history, user_text)
+        cached = reply_cache.lookup(key)
+        if cached:
+            return cached
+
+        try:
+            resp = self.create(
+                "debate_reply", self.debate_request(topic, stance, history, user_text)
+            )
+        except UpstreamUnavailable:
+            return self.fallback_reply("debate_reply", user_text)
+        reply_cache.store(key, resp.output_text)
+        return resp.output_text
+
+    def summarize(self, summary: str, messages: List[Dict]) -> Optional[str]:
+        """
+        Fold messages into the running summary of the debate. Returns None
+        while OpenAI is unavailable, so the messages are folded on a later turn.
+        """
+        try:
+            resp = self.create("summarize", self.summary_request(summary, messages))
+        except UpstreamUnavailable:
+            fallbacks.inc(operation="summarize")
+            return None
+        return resp.output_text
+
+    def create(self, operation: str, request: Dict):
+        """
+        Call the Responses API under the latency policy, recording latency
+        and token usage. Waits for admission first, see ``lms.admission``.
+        """
+        with self.admission.admit(operation), metrics.openai_call(operation):
+            resp = self.policy.call(
+                operation,
+                lambda timeout: self.router.create(operation, request, timeout=timeout),
+            )
+        metrics.record_usage(operation, resp.usage)
+        return resp
+
+
+class AsyncOpenAIClient(BaseClient):
+    """
+    Non-blocking counterpart of ``OpenAIClient`` for async views
+    """
+
+    def __init__(
+        self,
+        http_client=None,
+        policy: LatencyPolicy = None,
+        admission: Admission = None,
+        router: Router = None,
+    ):
+        super().__init__()
+        self.policy = policy or LatencyPolicy.from_settings()
+        self.admission = admission or Admission.from_settings()
+        self.router = router or Router.from_settings(http_client, asynchronous=True)
+
+    async def get_topic_and_stance(self, message: str, history=None) -> [str, str, str]:
+        """
+        Identify topic and stance in conversation
+        """
+        result = self.known_topic_and_stance(message, history)
+        if result:
+            return result
+
+        try:
+            resp = await self.create(
+                "get_topic_and_stance",
+                self.topic_and_stance_request(message, history),
+            )
+        except UpstreamUnavailable:
+            return "und", "und", self.fallback_reply("get_topic_and_stance", message)
+        result = self.parse_topic_and_stance(resp)
+        if not result:
+            return self.malformed_reply("get_topic_and_stance", message)
+        self.remember_topic_and_stance(message, history, result)
+        return result
+
+    async def classify_and_reply(
+        self, message: str, history: List[Dict]
+    ) -> [str, str, str]:
+        """
+        Async counterpart of ``OpenAIClient.classify_and_reply``
+        """
+        result = self.known_topic_and_stance(message)
+        if result and "und" not in result[:2]:
+            topic, stance, _ = result
+            reply = await self.debate_reply(topic, stance, history, message)
+            return topic, stance, reply
+        if result:
+            return result
+
+        key = reply_cache.cache_key("classify_and_reply", "", "", history, message)
+        cached = reply_cache.lookup(key)
+        if cached:
+            return cached
+
+        try:
+            resp = await self.create(
+                "classify_and_reply", self.classify_and_reply_request(message, history)
+            )
+        except UpstreamUnavailable:
+            return "und", "und", self.fallback_reply("classify_and_reply", message)
+        result = self.parse_topic_and_stance(resp)
+        if not result:
+            return self.malformed_reply("classify_and_reply", message)
+        reply_cache.store(key, result)
+        return result
+
+    async def debate_reply(
+        self, topic: str, stance: str, history: List[Dict], user_text: str
+    ) -> str:
+        """
+        Prepare response opposite to user
+        """
+        key = reply_cache.cache_key("debate_reply", topic, stance, history, user_text)
+        cached = reply_cache.lookup(key)
+        if cached:
+            return cached
+
+        try:
+            resp = await self.create(
+                "debate_reply", self.debate_request(topic, stance, history, user_text)
+            )
+        except UpstreamUnavailable:
+            return self.fallback_reply("debate_reply", user_text)
+        reply_cache.store(key, resp.output_text)
+        return resp.output_text
+
+    async def summarize(self, summary: str, messages: List[Dict]) -> Optional[str]:
+        """
+        Fold messages into the running summary of the debate, None while
+        OpenAI is unavailable
+        """
+        try:
+            resp = await self.create(
+                "summarize", self.summary_request(summary, messages)
+            )
+        except UpstreamUnavailable:
+            fallbacks.inc(operation="summarize")
+            return None
         return resp.output_text
+
+    async def create(self, operation: str, request: Dict, **kwargs):
+        """
+        Call the Responses API under the latency policy, recording latency
+        and token usage. Streams are admitted by the caller, for as long as
+        they are read.
+        """
+        streaming = kwargs.get("stream")
+        admission = nullcontext() if streaming else self.admission.aadmit(operation)
+        async with admission:
+            with metrics.openai_call(operation):
+                resp = await self.policy.acall(
+                    operation,
+                    lambda timeout: self.router.acreate(
+                        operation, request, **kwargs, timeout=timeout
+                    ),
+                )
+        if not streaming:
+            metrics.record_usage(operation, resp.usage)
+        return resp
+
+    async def stream_debate_reply(
+        self, topic: str, stance: str, history: List[Dict], user_text: str
+    ) -> AsyncIterator[str]:
+        """
+        Yield the reply text deltas while they are generated. The upstream
+        request is closed as soon as the caller stops iterating, and an
+        upstream error while reading it raises ``StreamInterrupted``. A
+        cached reply is sent as a single delta.
+        """
+        key = reply_cache.cache_key("debate_reply", topic, stance, history, user_text)
+        cached = reply_cache.lookup(key)
+        if cached:
+            yield cached
+            return
+
+        request = self.debate_request(topic, stance, history, user_text)
+        parts = []
+        async with self.admission.aadmit("stream_debate_reply"):
+            try:
+                # The policy covers opening the stream, up to the first bytes.
+                stream = await self.create("stream_debate_reply", request, stream=True)
+            except UpstreamUnavailable:
+                yield self.fallback_reply("stream_debate_reply", user_text)
+                return
+
+            async with stream:
+                try:
+                    async for event in stream:
+                        if event.type == "response.output_text.delta":
+                            parts.append(event.delta)
+                            yield event.delta
+                        elif event.type == "response.completed":
+                            metrics.record_usage(
+                                "stream_debate_reply", event.response.usage
+                            )
+                            reply_cache.store(key, "".join(parts))
+                except stream_errors() as e:
+                    raise StreamInterrupted() from e
+
+
+_shared = {}
+_shared_lock = threading.Lock()
+
+
+def get_client() -> OpenAIClient:
+    """
+    Process-wide ``OpenAIClient`` over a pooled keep-alive HTTP client.
+
+    The client is rebuilt when the pid changes, so a client created before
+    gunicorn forks its workers never shares sockets across processes.
+    """
+    pid = os.getpid()
+    with _shared_lock:
+        shared = _shared.get("sync")
+        if shared is None or shared[0] != pid:
+            shared = (pid, OpenAIClient(http_client=pool.build_http_client()))
+            _shared["sync"] = shared
+    return shared[1]
+
+
+def get_async_client() -> AsyncOpenAIClient:
+    """
+    Async counterpart of ``get_client``, also one per process, so all event
+    loops share the router state and latency policy. Async connections are
+    bound to the loop that opened them, so the HTTP pool is per loop and
+    closed with it, see ``pool.LoopBoundAsyncClient``.
+    """
+    pid = os.getpid()
+    with _shared_lock:
+        shared = _shared.get("async")
+        if shared is None or shared[0] != pid:
+            client = AsyncOpenAIClient(http_client=pool.LoopBoundAsyncClient())
+            shared = (pid, client)
+            _shared["async"] = shared
+    return shared[1]
+
+
+def reset_clients():
+    """
+    Drop the shared clients, e.g. from a gunicorn ``post_fork`` hook or tests.
+    """
+    with _shared_lock:
+        _shared.clear()
@@ -0,0 +1,298 @@
+"""
+Admission control for OpenAI calls, shared by every worker process through
+Postgres.
+
+A global token bucket smooths the call rate to ``ADMISSION_RPS`` (bursts of
+``ADMISSION_BURST``) and ``ADMISSION_MAX_IN_FLIGHT`` leased slots cap the
+calls running at once. A call waits up to ``ADMISSION_MAX_WAIT`` seconds for
+both, otherwise it is rejected with a 429 and ``Retry-After``, before any
+request is sent upstream. A per-conversation bucket rejects posts arriving
+less than ``ADMISSION_CONVERSATION_INTERVAL`` seconds apart.
+
+Each check is a single statement, so no transaction is held while waiting.
+Everything is off with the defaults of 0.
+"""
+
+import asyncio
+import math
+import time
+import uuid
+from contextlib import asynccontextmanager, contextmanager
+from typing import AsyncIterator, Iterator, Optional
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connection
+from rest_framework.exceptions import Throttled
+
+from chatbot import metrics
+
+GLOBAL_BUCKET = "openai"
+
+# Refill the bucket, then take a token if that leaves at least ``floor``
+# tokens; a negative balance is a reservation the caller waits out.
+# clock_timestamp() rather than now(), which is frozen inside transactions.
+TAKE_TOKEN = """
+INSERT INTO admission_bucket AS b (key, tokens, updated_at)
+VALUES (%(key)s, %(burst)s - 1, clock_timestamp())
+ON CONFLICT (key) DO UPDATE SET
+    tokens = LEAST(
+        %(burst)s,
+        b.tokens + %(rate)s * EXTRACT(EPOCH FROM clock_timestamp() - b.updated_at)
+    ) - 1,
+    updated_at = clock_timestamp()
+WHERE LEAST(
+    %(burst)s,
+    b.tokens + %(rate)s * EXTRACT(EPOCH FROM clock_timestamp() - b.updated_at)
+) - 1 >= %(floor)s
+RETURNING tokens
+"""
+
+AVAILABLE_TOKENS = """
+SELECT LEAST(
+    %(burst)s,
+    tokens + %(rate)s * EXTRACT(EPOCH FROM clock_timestamp() - updated_at)
+)
+FROM admission_bucket WHERE key = %(key)s
+"""
+
+# SKIP LOCKED: concurrent callers each lease a different free slot.
+LEASE_SLOT = """
+UPDATE admission_slot
+SET holder = %(holder)s,
+    expires_at = clock_timestamp() + make_interval(secs => %(lease)s)
+WHERE slot = (
+    SELECT slot FROM admission_slot
+    WHERE slot < %(slots)s AND expires_at < clock_timestamp()
+    ORDER BY slot
+    LIMIT 1
+    FOR UPDATE SKIP LOCKED
+)
+RETURNING slot
+"""
+
+CREATE_SLOTS = """
+INSERT INTO admission_slot (slot, expires_at)
+SELECT generate_series(0, %(slots)s - 1), clock_timestamp()
+ON CONFLICT (slot) DO NOTHING
+"""
+
+RELEASE_SLOT = """
+UPDATE admission_slot SET holder = NULL, expires_at = clock_timestamp()
+WHERE slot = %(slot)s AND holder = %(holder)s
+"""
+
+# A bucket that refilled since its last use is the same as a missing one.
+PURGE_CONVERSATION_BUCKETS = """
+DELETE FROM admission_bucket
+WHERE key LIKE 'conversation:%%'
+AND updated_at < clock_timestamp() - make_interval(secs => %(interval)s)
+"""
+
+SLOT_POLL_INTERVAL = 0.05
+
+admissions = metrics.Counter(
+    "chatbot_admission_total",
+    "OpenAI calls and conversation posts by admission outcome.",
+    ("operation", "outcome"),
+)
+
+
+class AdmissionRejected(Throttled):
+    default_detail = "Too many requests, please retry later."
+
+
+class Admission:
+    """
+    Global rate and concurrency limits around OpenAI calls.
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        burst: int,
+        max_in_flight: int,
+        max_wait: float,
+        slot_lease: float,
+    ):
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self.max_in_flight = max_in_flight
+        self.max_wait = max_wait
+        self.slot_lease = slot_lease
+        self.slots_created = 0
+
+    @classmethod
+    def from_settings(cls) -> "Admission":
+        return cls(
+            rate=settings.ADMISSION_RPS,
+            burst=settings.ADMISSION_BURST,
+            max_in_flight=settings.ADMISSION_MAX_IN_FLIGHT,
+            max_wait=settings.ADMISSION_MAX_WAIT,
+            slot_lease=settings.ADMISSION_SLOT_LEASE,
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.rate or self.max_in_flight)
+
+    @contextmanager
+    def admit(self, operation: str) -> Iterator[None]:
+        """
+        Hold a token and an in-flight slot for the block.
+        """
+        if not self.enabled:
+            yield
+            return
+
+        deadline = time.monotonic() + self.max_wait
+        with metrics.timed("admission"):
+            time.sleep(self.take_token(operation))
+            slot = self.lease_slot(operation, deadline)
+            while slot is False:
+                time.sleep(SLOT_POLL_INTERVAL)
+                slot = self.lease_slot(operation, deadline)
+        admissions.inc(operation=operation, outcome="admitted")
+        try:
+            yield
+        finally:
+            self.release_slot(slot)
+
+    @asynccontextmanager
+    async def aadmit(self, operation: str) -> AsyncIterator[None]:
+        """
+        Async counterpart of ``admit``.
+        """
+        if not self.enabled:
+            yield
+            return
+
+        deadline = time.monotonic() + self.max_wait
+        with metrics.timed("admission"):
+            await asyncio.sleep(await sync_to_async(self.take_token)(operation))
+            slot = await sync_to_async(self.lease_slot)(operation, deadline)
+            while slot is False:
+                await asyncio.sleep(SLOT_POLL_INTERVAL)
+                slot = await sync_to_async(self.lease_slot)(operation, deadline)
+        admissions.inc(operation=operation, outcome="admitted")
+        try:
+            yield
+        finally:
+            await sync_to_async(self.release_slot)(slot)
+
+    def take_token(self, operation: str) -> float:
+        """
+        Seconds to wait for the reserved token, 0 without a rate limit.
+        """
+        if not self.rate:
+            return 0
+        tokens = take_token(GLOBAL_BUCKET, self.rate, self.burst, self.max_wait)
+        if tokens is None:
+            admissions.inc(operation=operation, outcome="rejected")
+            raise AdmissionRejected(
+                wait=retry_after(GLOBAL_BUCKET, self.rate, self.burst)
+            )
+        return max(-tokens / self.rate, 0)
+
+    def lease_slot(self, operation: str, deadline: float):
+        """
+        ``(slot, holder)`` once leased, ``None`` without a concurrency cap and
+        ``False`` while all slots are taken and the deadline allows waiting.
+        """
+        if not self.max_in_flight:
+            return None
+        self.create_slots()
+
+        holder = uuid.uuid4()
+        with connection.cursor() as cursor:
+            cursor.execute(
+                LEASE_SLOT,
+                {
+                    "holder": holder,
+                    "lease": self.slot_lease,
+                    "slots": self.max_in_flight,
+                },
+            )
+            row = cursor.fetchone()
+        if row:
+            return row[0], holder
+        if time.monotonic() + SLOT_POLL_INTERVAL < deadline:
+            return False
+        admissions.inc(operation=operation, outcome="rejected")
+        raise AdmissionRejected(wait=1)
+
+    @staticmethod
+    def release_slot(slot):
+        if not slot:
+            return
+        number, holder = slot
+        with connection.cursor() as cursor:
+            cursor.execute(RELEASE_SLOT, {"slot": number, "holder": holder})
+
+    def create_slots(self):
+        if self.slots_created >= self.max_in_flight:
+            return
+        with connection.cursor() as cursor:
+            cursor.execute(CREATE_SLOTS, {"slots": self.max_in_flight})
+        self.slots_created = self.max_in_flight
+
+
+def take_token(key: str, rate: float, burst: int, max_wait: float) -> Optional[float]:
+    """
+    Take a token from the ``key`` bucket and return the tokens left, negative
+    when the caller has to wait for its token, or ``None`` when that wait
+    would exceed ``max_wait`` and nothing was taken.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            TAKE_TOKEN,
+            {
+                "key": key,
+                "rate": float(rate),
+                "burst": float(burst),
+                "floor": -max_wait * rate,
+            },
+        )
+        row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def retry_after(key: str, rate: float, burst: int) -> int:
+    """
+    Whole seconds until the ``key`` bucket has a token again.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            AVAILABLE_TOKENS, {"key": key, "rate": float(rate), "burst": float(burst)}
+        )
+        row = cursor.fetchone()
+    tokens = row[0] if row else burst
+    return max(math.ceil((1 - tokens) / rate), 1)
+
+
+def admit_conversation(conversation_id):
+    """
+    Reject a post to a conversation that already got one in the last
+    ``ADMISSION_CONVERSATION_INTERVAL`` seconds.
+    """
+    interval = settings.ADMISSION_CONVERSATION_INTERVAL
+    if not interval or not conversation_id:
+        return
+
+    key, rate = f"conversation:{conversation_id}", 1 / interval
+    if take_token(key, rate, 1, 0) is None:
+        admissions.inc(operation="conversation", outcome="rejected")
+        raise AdmissionRejected(wait=retry_after(key, rate, 1))
+
+
+def purge_conversation_buckets() -> int:
+    """
+    Delete the per-conversation buckets not used for longer than
+    ``ADMISSION_CONVERSATION_INTERVAL``.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            PURGE_CONVERSATION_BUCKETS,
+            {"interval": settings.ADMISSION_CONVERSATION_INTERVAL},
+        )
+        return cursor.rowcount
@@ -0,0 +1,235 @@
+"""
+LLM backends behind ``lms.router.Router``.
+
+A backend runs Responses API requests against one endpoint: an OpenAI API
+key, an OpenAI-compatible server (e.g. a self-hosted vLLM) or the
+deterministic ``LocalBackend``. ``create`` takes the arguments of
+``responses.create`` and returns what the SDK returns; async backends
+return an awaitable.
+
+Backends are configured with ``LLM_BACKENDS``, a JSON list such as::
+
+    [
+        {"name": "primary", "api_key": "sk-...", "max_concurrency": 32},
+        {"name": "vllm", "base_url": "http://vllm:8000/v1", "model": "llama"},
+        {"name": "local", "kind": "local"}
+    ]
+
+Without it there is one OpenAI backend from ``OPENAI_KEY`` and
+``OPENAI_BASE_URL``.
+"""
+
+import asyncio
+import hashlib
+import itertools
+import json
+import time
+from types import SimpleNamespace
+from typing import Dict, List, Optional
+
+import httpx
+from django.conf import settings
+
+LOCAL_WORDS = (
+    "that argument overlooks the costs for the people most affected and the "
+    "evidence from places that tried it so which outcome matters most to you"
+).split()
+
+
+class Backend:
+    """
+    One endpoint. ``max_concurrency`` caps its requests in flight per
+    router, 0 for no cap; ``model`` replaces the model of the requests.
+    """
+
+    kind = ""
+
+    def __init__(
+        self,
+        name: str,
+        asynchronous: bool = False,
+        model: Optional[str] = None,
+        max_concurrency: int = 0,
+    ):
+        self.name = name
+        self.asynchronous = asynchronous
+        self.model = model
+        self.max_concurrency = max_concurrency
+
+    def __repr__(self):
+        return f"<{type(self).__name__} {self.name}>"
+
+    def prepare(self, request: Dict) -> Dict:
+        return {**request, "model": self.model} if self.model else request
+
+    def create(self, request: Dict, **kwargs):
+        raise NotImplementedError
+
+
+class OpenAIBackend(Backend):
+    """
+    An OpenAI or OpenAI-compatible endpoint through the SDK. Retries are
+    handled by the latency policy.
+    """
+
+    kind = "openai"
+
+    def __init__(
+        self,
+        name: str,
+        api_key: str,
+        base_url: Optional[str] = None,
+        http_client=None,
+        asynchronous: bool = False,
+        **options,
+    ):
+        super().__init__(name, asynchronous, **options)
+        # Imported on first use: the SDK is the slowest import at startup.
+        if asynchronous:
+            from openai import AsyncOpenAI as SDKClient
+        else:
+            from openai import OpenAI as SDKClient
+
+        self.client = SDKClient(
+            api_key=api_key,
+            base_url=base_url,
+            http_client=http_client,
+            max_retries=0,
+        )
+
+    def create(self, request: Dict, **kwargs):
+        return self.client.responses.create(**self.prepare(request), **kwargs)
+
+
+class LocalBackend(Backend):
+    """
+    Answers without a network call, for tests and benchmarks. The reply is a
+    function of the request only; ``latency`` seconds are waited first and
+    a ``timeout`` shorter than that raises ``openai.APITimeoutError``.
+    Streams send one delta per word.
+    """
+
+    kind = "local"
+
+    def __init__(self, name: str = "local", latency: float = 0, **options):
+        super().__init__(name, **options)
+        self.latency = latency
+
+    def create(
+        self, request: Dict, timeout: httpx.Timeout = None, stream: bool = False
+    ):
+        delay = self.delay(timeout)
+        if self.asynchronous:
+            return self.areply(request, delay, stream)
+        time.sleep(delay)
+        resp = self.reply(request, delay)
+        return LocalStream(resp) if stream else resp
+
+    async def areply(self, request: Dict, delay: float, stream: bool):
+        await asyncio.sleep(delay)
+        resp = self.reply(request, delay)
+        return LocalStream(resp) if stream else resp
+
+    def delay(self, timeout: Optional[httpx.Timeout]) -> float:
+        if timeout is not None and timeout.read is not None:
+            return min(self.latency, timeout.read)
+        return self.latency
+
+    def reply(self, request: Dict, waited: float):
+        if waited < self.latency:
+            import openai
+
+            raise openai.APITimeoutError(
+                request=httpx.Request("POST", f"local://{self.name}/responses")
+            )
+
+        messages = request.get("input", [])
+        user = next(
+            (m["content"] for m in reversed(messages) if m["role"] == "user"), ""
+        )
+        if "text" in request:
+            text = json.dumps(
+                {
+                    "topic": " ".join(user.split()[:4]) or "und",
+                    "bot_stance": "con",
+                    "response": "Let's debate that, what is your strongest argument?",
+                }
+            )
+        else:
+            text = self.debate_text(messages, request.get("max_output_tokens"))
+
+        return SimpleNamespace(
+            output_text=text,
+            model=request.get("model"),
+            usage=SimpleNamespace(
+                input_tokens=max(len(json.dumps(messages)) // 4, 1),
+                output_tokens=len(text.split()),
+            ),
+        )
+
+    @staticmethod
+    def debate_text(messages: List[Dict], max_tokens: Optional[int]) -> str:
+        digest = hashlib.sha256(json.dumps(messages).encode()).digest()
+        count = min(20 + digest[0] % 20, max_tokens or 40)
+        words = itertools.islice(
+            itertools.cycle(LOCAL_WORDS), digest[1] % len(LOCAL_WORDS), None
+        )
+        return " ".join(itertools.islice(words, count)).capitalize() + "?"
+
+
+class LocalStream:
+    """
+    The events of a streamed ``LocalBackend`` reply
+    """
+
+    def __init__(self, resp):
+        self.resp = resp
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        pass
+
+    def __iter__(self):
+        for i, word in enumerate(self.resp.output_text.split()):
+            yield SimpleNamespace(
+                type="response.output_text.delta", delta=f" {word}" if i else word
+            )
+        yield SimpleNamespace(type="response.completed", response=self.resp)
+
+    async def __aiter__(self):
+        for event in self:
+            yield event
+
+
+def from_settings(http_client=None, asynchronous: bool = False) -> List[Backend]:
+    """
+    The ``LLM_BACKENDS`` backends. OpenAI backends without ``api_key`` or
+    ``base_url`` use ``OPENAI_KEY`` and ``OPENAI_BASE_URL``, and share
+    ``http_client``.
+    """
+    configs = settings.LLM_BACKENDS or [{"name": "openai"}]
+    backends = []
+    for config in configs:
+        config = dict(config)
+        kind = config.pop("kind", OpenAIBackend.kind)
+        if kind == LocalBackend.kind:
+            backends.append(LocalBackend(asynchronous=asynchronous, **config))
+        elif kind == OpenAIBackend.kind:
+            config.setdefault("api_key", settings.API_KEY)
+            config.setdefault("base_url", settings.OPENAI_BASE_URL)
+            backends.append(
+                OpenAIBackend(
+                    http_client=http_client, asynchronous=asynchronous, **config
+                )
+            )
+        else:
+            raise ValueError(f"Unknown LLM backend kind: {kind!r}")
+    return backends
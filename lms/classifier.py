@@ -0,0 +1,192 @@
+import re
+import threading
+import unicodedata
+from typing import Optional, Tuple
+
+from django.conf import settings
+
+from chatbot import metrics
+from lms.cache import TTLCache
+
+GREETINGS = {
+    "hi",
+    "hello",
+    "hey",
+    "hi there",
+    "hello there",
+    "hey there",
+    "good morning",
+    "good afternoon",
+    "good evening",
+    "how are you",
+    "how are you doing",
+    "whats up",
+    "hola",
+    "buenas",
+    "buenos dias",
+    "buenas tardes",
+    "buenas noches",
+    "que tal",
+    "como estas",
+    "como esta",
+    "como te va",
+}
+
+SPANISH_WORDS = {
+    "hola",
+    "buenas",
+    "buenos",
+    "que",
+    "como",
+    "estas",
+    "esta",
+    "eres",
+    "favor",
+    "contra",
+    "tu",
+}
+
+STANCE_PATTERNS = [
+    (
+        "pro",
+        re.compile(
+            r"^(?:you are|you're|youre|be)\s+(?:pro|for|in favou?r of)\s+(?P<topic>.+)$"
+        ),
+    ),
+    (
+        "con",
+        re.compile(
+            r"^(?:you are|you're|youre|be)\s+(?:con|against|anti)\s+(?P<topic>.+)$"
+        ),
+    ),
+    (
+        "pro",
+        re.compile(
+            r"^(?:tu\s+|tú\s+)?(?:estás|estas|eres|está|esta)\s+"
+            r"(?:a|en)\s+favor\s+(?:de\s+la|de\s+los|de\s+las|del|de)\s+(?P<topic>.+)$"
+        ),
+    ),
+    (
+        "con",
+        re.compile(
+            r"^(?:tu\s+|tú\s+)?(?:estás|estas|eres|está|esta)\s+"
+            r"(?:en\s+contra\s+(?:de\s+la|de\s+los|de\s+las|del|de)|contra)\s+"
+            r"(?P<topic>.+)$"
+        ),
+    ),
+]
+
+MAX_TOPIC_WORDS = 8
+
+SMALL_TALK_REPLY = {
+    "en": "Hi! What topic would you like to debate? "
+    "Tell me the topic and whether you are for or against it.",
+    "es": "¡Hola! ¿Sobre qué tema quieres debatir? "
+    "Dime el tema y si estás a favor o en contra.",
+}
+
+STANCE_REPLY = {
+    ("en", "pro"): "Alright, I will argue in favor of {topic}. "
+    "What is your opening argument?",
+    ("en", "con"): "Alright, I will argue against {topic}. "
+    "What is your opening argument?",
+    ("es", "pro"): "De acuerdo, defenderé la postura a favor de {topic}. "
+    "¿Cuál es tu primer argumento?",
+    ("es", "con"): "De acuerdo, defenderé la postura en contra de {topic}. "
+    "¿Cuál es tu primer argumento?",
+}
+
+
+def normalize(message: str) -> str:
+    """
+    Lowercase, strip accents and punctuation and collapse whitespace
+    """
+    text = unicodedata.normalize("NFKD", message.casefold())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    text = re.sub(r"[^\w\s]", " ", text)
+    return " ".join(text.split())
+
+
+def language(normalized: str) -> str:
+    return "es" if SPANISH_WORDS & set(normalized.split()) else "en"
+
+
+def is_small_talk(normalized: str) -> bool:
+    words = normalized.split()
+    while words:
+        for size in range(len(words), 0, -1):
+            if " ".join(words[:size]) in GREETINGS:
+                words = words[size:]
+                break
+        else:
+            return False
+    return bool(normalized)
+
+
+def explicit_stance(message: str) -> Optional[Tuple[str, str]]:
+    text = " ".join(message.casefold().split()).rstrip(".!¡¿? ")
+    for stance, pattern in STANCE_PATTERNS:
+        match = pattern.match(text)
+        if not match:
+            continue
+
+        topic = match.group("topic").strip()
+        if len(topic.split()) > MAX_TOPIC_WORDS or re.search(r"[.,;:?!¿¡]", topic):
+            return None
+        return topic, stance
+    return None
+
+
+def preclassify(message: str) -> Optional[Tuple[str, str, str]]:
+    """
+    Answer obvious openings without the model: greetings and small talk get
+    ``topic='und'`` (prompt rule 4) and explicit stance assignments such as
+    'you are against nuclear energy' keep the assigned stance (rule 1).
+    Returns ``None`` when the model is needed.
+    """
+    global preclassified
+    normalized = normalize(message)
+    lang = language(normalized)
+
+    result = None
+    if is_small_talk(normalized):
+        result = "und", "und", SMALL_TALK_REPLY[lang]
+    else:
+        assigned = explicit_stance(message)
+        if assigned:
+            topic, stance = assigned
+            reply = STANCE_REPLY[(lang, stance)].format(topic=topic)
+            result = topic, stance, reply
+
+    if result:
+        with _topic_cache_lock:
+            preclassified += 1
+    return result
+
+
+preclassified = 0
+_topic_cache = None
+_topic_cache_lock = threading.Lock()
+
+
+def topic_cache() -> TTLCache:
+    """
+    Process-wide cache of model classifications keyed on the normalized
+    opening message
+    """
+    global _topic_cache
+    with _topic_cache_lock:
+        if _topic_cache is None:
+            _topic_cache = TTLCache(
+                settings.TOPIC_CACHE_MAX_ENTRIES, settings.TOPIC_CACHE_TTL
+            )
+    return _topic_cache
+
+
+metrics.Gauges(
+    "chatbot_topic_detection",
+    "Topic cache size, hits, misses and evictions, and openings answered by "
+    "the pre-classifier.",
+    ("stat",),
+    collect=lambda: {**topic_cache().stats(), "preclassified": preclassified},
+)
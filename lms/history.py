@@ -0,0 +1,56 @@
+from typing import Dict, List, Sequence, Tuple
+
+from django.conf import settings
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Rough token count (about 4 characters per token plus per-message
+    overhead), close enough to budget prompts without a tokenizer
+    """
+    return len(text) // 4 + 4
+
+
+def as_prompt(messages: Sequence) -> List[Dict[str, str]]:
+    return [{"role": m.role, "content": m.message} for m in messages]
+
+
+def split_for_summary(messages: Sequence) -> Tuple[list, list]:
+    """
+    Split chronological unsummarized messages into the ones to fold into the
+    rolling summary and the ones to keep verbatim. Nothing is folded until
+    ``HISTORY_SUMMARY_EVERY_TURNS`` turns piled up beyond the
+    ``HISTORY_RECENT_TURNS`` kept verbatim, so the summary is updated
+    incrementally every N turns instead of being rebuilt on each one.
+    """
+    keep = 2 * settings.HISTORY_RECENT_TURNS
+    threshold = keep + 2 * settings.HISTORY_SUMMARY_EVERY_TURNS
+    if len(messages) < threshold:
+        return [], list(messages)
+    return list(messages[:-keep]), list(messages[-keep:])
+
+
+def fit_to_budget(
+    summary: str, messages: List[Dict[str, str]], budget: int
+) -> List[Dict[str, str]]:
+    """
+    Fill ``budget`` tokens with the summary and as many of the most recent
+    messages as fit, returned oldest first
+    """
+    prompt = []
+    if summary:
+        summary_message = {
+            "role": "system",
+            "content": f"Summary of the earlier debate: {summary}",
+        }
+        budget -= estimate_tokens(summary_message["content"])
+        prompt.append(summary_message)
+
+    recent = []
+    for message in reversed(messages):
+        budget -= estimate_tokens(message["content"])
+        if budget < 0:
+            break
+        recent.append(message)
+
+    return prompt + recent[::-1]
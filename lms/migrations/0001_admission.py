@@ -0,0 +1,41 @@
+# Generated by Django 5.2.5 on 2026-10-18 19:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = []
+
+    operations = [
+        migrations.CreateModel(
+            name="AdmissionBucket",
+            fields=[
+                (
+                    "key",
+                    models.CharField(max_length=64, primary_key=True, serialize=False),
+                ),
+                ("tokens", models.FloatField()),
+                ("updated_at", models.DateTimeField()),
+            ],
+            options={
+                "db_table": "admission_bucket",
+            },
+        ),
+        migrations.CreateModel(
+            name="AdmissionSlot",
+            fields=[
+                (
+                    "slot",
+                    models.PositiveIntegerField(primary_key=True, serialize=False),
+                ),
+                ("holder", models.UUIDField(blank=True, null=True)),
+                ("expires_at", models.DateTimeField()),
+            ],
+            options={
+                "db_table": "admission_slot",
+            },
+        ),
+    ]
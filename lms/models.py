@@ -0,0 +1,35 @@
+from django.db import models
+
+
+class AdmissionBucket(models.Model):
+    """
+    Token bucket shared by all worker processes. Only read and written with
+    the SQL statements in ``lms.admission``.
+    """
+
+    key = models.CharField(primary_key=True, max_length=64)
+    tokens = models.FloatField()
+    updated_at = models.DateTimeField()
+
+    class Meta:
+        db_table = "admission_bucket"
+
+    def __str__(self):
+        return f"{self.key} · {self.tokens:.2f}"
+
+
+class AdmissionSlot(models.Model):
+    """
+    One of the ``ADMISSION_MAX_IN_FLIGHT`` OpenAI call slots, leased until
+    ``expires_at`` by ``holder``.
+    """
+
+    slot = models.PositiveIntegerField(primary_key=True)
+    holder = models.UUIDField(null=True, blank=True)
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        db_table = "admission_slot"
+
+    def __str__(self):
+        return f"Slot {self.slot}"
@@ -0,0 +1,384 @@
+import asyncio
+import contextvars
+import functools
+import inspect
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Awaitable, Callable, Dict, Optional, Tuple, TypeVar
+
+import httpx
+from django.conf import settings
+
+from chatbot import metrics
+
+T = TypeVar("T")
+
+
+FALLBACK_REPLY = {
+    "en": "I can't reach my debate engine right now. "
+    "Please send your argument again in a moment.",
+    "es": "No puedo acceder a mi motor de debate en este momento. "
+    "Vuelve a enviar tu argumento en un momento.",
+}
+
+retries = metrics.Counter(
+    "chatbot_openai_retries_total", "OpenAI calls retried.", ("operation",)
+)
+hedges = metrics.Counter(
+    "chatbot_openai_hedges_total", "Hedged OpenAI requests sent.", ("operation",)
+)
+fallbacks = metrics.Counter(
+    "chatbot_openai_fallbacks_total",
+    "OpenAI calls answered with the canned fallback.",
+    ("operation",),
+)
+
+
+class UpstreamUnavailable(Exception):
+    """
+    OpenAI did not answer within the latency policy.
+    """
+
+
+class CircuitOpen(UpstreamUnavailable):
+    """
+    Raised without calling OpenAI while the circuit breaker is open.
+    """
+
+
+class BackendsBusy(UpstreamUnavailable):
+    """
+    Every healthy backend is at its concurrency cap, see ``lms.router``.
+    Retried like a 429.
+    """
+
+
+@functools.cache
+def retryable_errors() -> Tuple[type, ...]:
+    """
+    OpenAI errors worth another attempt. Only evaluated once a call failed,
+    so the SDK is not imported before the first call.
+    """
+    import openai
+
+    return (
+        openai.APIConnectionError,  # includes APITimeoutError
+        openai.RateLimitError,
+        openai.InternalServerError,
+        BackendsBusy,
+    )
+
+
+@functools.cache
+def stream_errors() -> Tuple[type, ...]:
+    """
+    Errors reading a stream that already started: SDK errors, including
+    ``error`` events, and transport errors.
+    """
+    import openai
+
+    return (openai.APIError, httpx.HTTPError)
+
+
+class CircuitBreaker:
+    """
+    Opens after ``failures`` consecutive failed attempts and stays open for
+    ``reset_after`` seconds. After that, one trial call is let through
+    (half-open): success closes the breaker, failure opens it again.
+    """
+
+    def __init__(self, failures: int, reset_after: float, clock=time.monotonic):
+        self.failures = failures
+        self.reset_after = reset_after
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.trial_running = False
+
+    @property
+    def state(self) -> str:
+        with self.lock:
+            if self.opened_at is None:
+                return "closed"
+            if self.clock() - self.opened_at >= self.reset_after:
+                return "half-open"
+            return "open"
+
+    def allow(self) -> bool:
+        if self.failures <= 0:
+            return True
+        with self.lock:
+            if self.opened_at is None:
+                return True
+            if self.clock() - self.opened_at < self.reset_after or self.trial_running:
+                return False
+            self.trial_running = True
+            return True
+
+    def record_success(self):
+        with self.lock:
+            self.consecutive_failures = 0
+            self.opened_at = None
+            self.trial_running = False
+
+    def record_failure(self):
+        with self.lock:
+            self.consecutive_failures += 1
+            if self.trial_running or self.consecutive_failures >= self.failures > 0:
+                self.opened_at = self.clock()
+            self.trial_running = False
+
+    def abandon(self):
+        """
+        A call ended without telling whether upstream is healthy (it was
+        cancelled); the next call may be the trial.
+        """
+        with self.lock:
+            self.trial_running = False
+
+
+def close_response(resp):
+    """
+    Close a response nobody will read. Streams hold their HTTP connection
+    until closed; other responses have nothing to close.
+    """
+    close = getattr(resp, "close", None)
+    if callable(close):
+        close()
+
+
+async def aclose_response(resp):
+    close = getattr(resp, "aclose", None) or getattr(resp, "close", None)
+    if callable(close):
+        result = close()
+        if inspect.isawaitable(result):
+            await result
+
+
+def close_lost(future: Future):
+    if not future.cancelled() and future.exception() is None:
+        close_response(future.result())
+
+
+class LatencyPolicy:
+    """
+    Deadline, retries, hedging and circuit breaking around one OpenAI call.
+
+    Every attempt gets at most ``attempt_timeout`` seconds and the attempts
+    of one call together at most ``deadline`` seconds. Connection errors,
+    timeouts, 429s and 5xx are retried up to ``max_retries`` times after a
+    full-jitter exponential backoff, as long as the deadline allows it. With
+    ``hedge_percentile`` set, an attempt still running after that percentile
+    of the operation's recent latencies gets a second identical request and
+    the first answer wins.
+    """
+
+    def __init__(
+        self,
+        deadline: float,
+        attempt_timeout: float,
+        connect_timeout: float,
+        max_retries: int,
+        backoff: float,
+        backoff_max: float,
+        hedge_percentile: float,
+        hedge_min_samples: int,
+        breaker: CircuitBreaker,
+    ):
+        self.deadline = deadline
+        self.attempt_timeout = attempt_timeout
+        self.connect_timeout = connect_timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.backoff_max = backoff_max
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = hedge_min_samples
+        self.breaker = breaker
+        self.latencies: Dict[str, deque] = {}
+        self.lock = threading.Lock()
+        self.executor = None
+
+    @classmethod
+    def from_settings(cls) -> "LatencyPolicy":
+        return cls(
+            deadline=settings.OPENAI_DEADLINE,
+            attempt_timeout=settings.OPENAI_TIMEOUT,
+            connect_timeout=settings.OPENAI_CONNECT_TIMEOUT,
+            max_retries=settings.OPENAI_MAX_RETRIES,
+            backoff=settings.OPENAI_RETRY_BACKOFF,
+            backoff_max=settings.OPENAI_RETRY_BACKOFF_MAX,
+            hedge_percentile=settings.OPENAI_HEDGE_PERCENTILE,
+            hedge_min_samples=settings.OPENAI_HEDGE_MIN_SAMPLES,
+            # Circuit breaking is per backend, in the router.
+            breaker=CircuitBreaker(0, settings.OPENAI_BREAKER_RESET),
+        )
+
+    def call(self, operation: str, request: Callable[[httpx.Timeout], T]) -> T:
+        """
+        Run ``request(timeout)`` under the policy. Raises
+        ``UpstreamUnavailable`` once retries or the deadline are exhausted.
+        """
+        if not self.breaker.allow():
+            raise CircuitOpen(operation)
+
+        deadline = time.monotonic() + self.deadline
+        for attempt in range(self.max_retries + 1):
+            timeout = min(self.attempt_timeout, deadline - time.monotonic())
+            started = time.monotonic()
+            try:
+                result = self.attempt(operation, request, timeout)
+            except retryable_errors() as e:
+                error = e
+                self.breaker.record_failure()
+            else:
+                self.succeeded(operation, time.monotonic() - started)
+                return result
+
+            delay = self.next_delay(operation, attempt, deadline)
+            if delay is None:
+                break
+            time.sleep(delay)
+
+        raise UpstreamUnavailable(operation) from error
+
+    async def acall(
+        self, operation: str, request: Callable[[httpx.Timeout], Awaitable[T]]
+    ) -> T:
+        """
+        Async counterpart of ``call``.
+        """
+        if not self.breaker.allow():
+            raise CircuitOpen(operation)
+
+        deadline = time.monotonic() + self.deadline
+        for attempt in range(self.max_retries + 1):
+            timeout = min(self.attempt_timeout, deadline - time.monotonic())
+            started = time.monotonic()
+            try:
+                result = await self.aattempt(operation, request, timeout)
+            except retryable_errors() as e:
+                error = e
+                self.breaker.record_failure()
+            else:
+                self.succeeded(operation, time.monotonic() - started)
+                return result
+
+            delay = self.next_delay(operation, attempt, deadline)
+            if delay is None:
+                break
+            await asyncio.sleep(delay)
+
+        raise UpstreamUnavailable(operation) from error
+
+    def attempt(self, operation: str, request, timeout: float):
+        hedge_after = self.hedge_after(operation)
+        if hedge_after is None or hedge_after >= timeout:
+            return request(self.timeout(timeout))
+
+        # The losing request cannot be cancelled and finishes in the pool.
+        executor = self.get_executor()
+        first = executor.submit(
+            contextvars.copy_context().run, request, self.timeout(timeout)
+        )
+        done, _ = wait([first], timeout=hedge_after)
+        if done:
+            return first.result()
+
+        hedges.inc(operation=operation)
+        second = executor.submit(
+            contextvars.copy_context().run,
+            request,
+            self.timeout(timeout - hedge_after),
+        )
+        pending = {first, second}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    # The loser is closed whenever it finishes, possibly
+                    # right away when both finished together.
+                    for loser in {first, second} - {future}:
+                        loser.add_done_callback(close_lost)
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    async def aattempt(self, operation: str, request, timeout: float):
+        hedge_after = self.hedge_after(operation)
+        if hedge_after is None or hedge_after >= timeout:
+            return await request(self.timeout(timeout))
+
+        first = asyncio.ensure_future(request(self.timeout(timeout)))
+        tasks = {first}
+        started, winner = [first], None
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=hedge_after)
+            if done:
+                return first.result()
+
+            hedges.inc(operation=operation)
+            started.append(
+                asyncio.ensure_future(request(self.timeout(timeout - hedge_after)))
+            )
+            tasks.add(started[-1])
+            while tasks:
+                done, tasks = await asyncio.wait(
+                    tasks, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    if task.exception() is None:
+                        winner = task
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
+            # A loser that finished in the same round as the winner.
+            for task in started:
+                if task is not winner and task.done() and not task.cancelled():
+                    if task.exception() is None:
+                        await aclose_response(task.result())
+
+    def timeout(self, seconds: float) -> httpx.Timeout:
+        return httpx.Timeout(seconds, connect=min(self.connect_timeout, seconds))
+
+    def next_delay(self, operation: str, attempt: int, deadline: float):
+        """
+        Backoff before the next attempt, ``None`` when there is none left.
+        """
+        if attempt >= self.max_retries or not self.breaker.allow():
+            return None
+        delay = random.uniform(0, min(self.backoff_max, self.backoff * 2**attempt))
+        if time.monotonic() + delay >= deadline:
+            return None
+        retries.inc(operation=operation)
+        return delay
+
+    def succeeded(self, operation: str, elapsed: float):
+        self.breaker.record_success()
+        with self.lock:
+            self.latencies.setdefault(operation, deque(maxlen=200)).append(elapsed)
+
+    def hedge_after(self, operation: str) -> Optional[float]:
+        if not self.hedge_percentile:
+            return None
+        with self.lock:
+            samples = sorted(self.latencies.get(operation, ()))
+        if len(samples) < self.hedge_min_samples:
+            return None
+        index = min(int(len(samples) * self.hedge_percentile / 100), len(samples) - 1)
+        return samples[index]
+
+    def get_executor(self) -> ThreadPoolExecutor:
+        with self.lock:
+            if self.executor is None:
+                self.executor = ThreadPoolExecutor(
+                    max_workers=settings.OPENAI_POOL_MAX_CONNECTIONS,
+                    thread_name_prefix="openai-hedge",
+                )
+            return self.executor
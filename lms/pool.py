@@ -0,0 +1,148 @@
+import asyncio
+import threading
+import weakref
+from typing import Dict
+
+import httpx
+from django.conf import settings
+
+from chatbot import metrics
+
+
+class ConnectionStats:
+    """
+    Counts requests and newly opened sockets through httpcore trace events,
+    every request that did not open a socket reused a pooled one
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.requests = 0
+            self.connections_opened = 0
+
+    def on_request(self, request: httpx.Request):
+        request.extensions["trace"] = self.trace
+        with self.lock:
+            self.requests += 1
+
+    async def aon_request(self, request: httpx.Request):
+        request.extensions["trace"] = self.atrace
+        with self.lock:
+            self.requests += 1
+
+    def trace(self, event_name: str, info: Dict):
+        if event_name == "connection.connect_tcp.complete":
+            with self.lock:
+                self.connections_opened += 1
+
+    async def atrace(self, event_name: str, info: Dict):
+        self.trace(event_name, info)
+
+    def snapshot(self) -> Dict[str, int]:
+        with self.lock:
+            return {
+                "requests": self.requests,
+                "connections_opened": self.connections_opened,
+                "connections_reused": max(self.requests - self.connections_opened, 0),
+            }
+
+
+stats = ConnectionStats()
+
+metrics.Gauges(
+    "chatbot_openai_pool",
+    "OpenAI HTTP pool totals: requests, connections opened and reused.",
+    ("stat",),
+    collect=lambda: stats.snapshot(),
+)
+
+
+def pool_limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=settings.OPENAI_POOL_MAX_CONNECTIONS,
+        max_keepalive_connections=settings.OPENAI_POOL_MAX_KEEPALIVE,
+        keepalive_expiry=settings.OPENAI_POOL_KEEPALIVE_EXPIRY,
+    )
+
+
+def pool_timeout() -> httpx.Timeout:
+    return httpx.Timeout(
+        settings.OPENAI_TIMEOUT, connect=settings.OPENAI_CONNECT_TIMEOUT
+    )
+
+
+def build_http_client() -> httpx.Client:
+    from openai import DefaultHttpxClient
+
+    return DefaultHttpxClient(
+        limits=pool_limits(),
+        timeout=pool_timeout(),
+        event_hooks={"request": [stats.on_request]},
+    )
+
+
+def build_async_http_client() -> httpx.AsyncClient:
+    from openai import DefaultAsyncHttpxClient
+
+    return DefaultAsyncHttpxClient(
+        limits=pool_limits(),
+        timeout=pool_timeout(),
+        event_hooks={"request": [stats.aon_request]},
+    )
+
+
+class LoopBoundAsyncClient(httpx.AsyncClient):
+    """
+    Async HTTP client that sends each request through a pooled
+    ``build_async_http_client`` of the running event loop, as async
+    connections are bound to the loop that opened them. One instance can be
+    shared by the whole process, e.g. by an SDK client whose state must
+    outlive the loops.
+
+    A loop's pool is closed when the loop shuts down its async generators,
+    which ``asyncio.run`` and ``async_to_sync`` do before closing it, so a
+    loop per request (async views under WSGI) leaves no sockets open.
+    """
+
+    def __init__(self):
+        super().__init__(timeout=pool_timeout())
+        self.lock = threading.Lock()
+        self.loops = weakref.WeakKeyDictionary()
+
+    async def send(self, request: httpx.Request, **kwargs) -> httpx.Response:
+        return await (await self.loop_client()).send(request, **kwargs)
+
+    async def loop_client(self) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        with self.lock:
+            bound = self.loops.get(loop)
+            new = bound is None
+            if new:
+                client = build_async_http_client()
+                bound = self.loops[loop] = (client, close_with_loop(client))
+        if new:
+            # Runs to its ``yield`` without suspending, so before any request.
+            await bound[1].__anext__()
+        return bound[0]
+
+    async def aclose(self):
+        with self.lock:
+            bound = self.loops.pop(asyncio.get_running_loop(), None)
+        if bound is not None:
+            await bound[0].aclose()
+        await super().aclose()
+
+
+async def close_with_loop(client: httpx.AsyncClient):
+    """
+    Started in a loop, closes ``client`` when the loop shuts down its async
+    generators. Kept referenced with the client, so it is not finalized early.
+    """
+    try:
+        yield
+    finally:
+        await client.aclose()
@@ -0,0 +1,174 @@
+"""
+Opt-in cache of debate replies, keyed on the normalized topic, stance,
+recent history and user message.
+
+Debates often open the same way: the same topic, the same canned opening and
+the same first argument. ``REPLY_CACHE_ENABLED=1`` answers those turns from
+memory instead of calling OpenAI again. Opening turns, whose history is at
+most the opening exchange, get a reserved share of the entries
+(``REPLY_CACHE_OPENING_SHARE``) so a burst of long, unique debates cannot
+evict them. Fallback and malformed replies are never stored.
+
+A request sent with ``Cache-Control: no-cache`` or ``no-store`` neither reads
+nor fills the cache, see ``request_scope`` and ``bypassing``.
+"""
+
+import threading
+from contextlib import aclosing, contextmanager
+from contextvars import ContextVar
+from typing import AsyncIterator, Dict, Hashable, List, Optional, Tuple
+
+from django.conf import settings
+
+from chatbot import metrics
+from lms.cache import TTLCache
+from lms.classifier import normalize
+
+# The opening exchange: the user's first message and the bot's opener.
+OPENING_MESSAGES = 2
+
+lookups = metrics.Counter(
+    "chatbot_reply_cache_total",
+    "Reply cache lookups by kind of turn and outcome.",
+    ("kind", "outcome"),
+)
+
+_bypassed: ContextVar[bool] = ContextVar("reply_cache_bypassed", default=False)
+
+
+class ReplyCache:
+    """
+    Two TTL caches, one for opening turns and one for later turns, sharing
+    ``max_entries``
+    """
+
+    def __init__(self, max_entries: int, ttl: float, opening_share: float):
+        openings = round(max_entries * min(max(opening_share, 0), 1))
+        self.partitions = {
+            "opening": TTLCache(openings, ttl),
+            "turn": TTLCache(max_entries - openings, ttl),
+        }
+
+    @staticmethod
+    def key(
+        operation: str, topic: str, stance: str, history: List[Dict], user_text: str
+    ) -> Tuple:
+        kind = "opening" if len(history) <= OPENING_MESSAGES else "turn"
+        first = max(len(history) - settings.REPLY_CACHE_HISTORY, 0)
+        recent = history[first:]
+        return (
+            kind,
+            operation,
+            normalize(topic),
+            stance,
+            tuple((m["role"], normalize(m["content"])) for m in recent),
+            normalize(user_text),
+        )
+
+    def get(self, key: Tuple):
+        value = self.partitions[key[0]].get(key)
+        lookups.inc(kind=key[0], outcome="miss" if value is None else "hit")
+        return value
+
+    def set(self, key: Tuple, value):
+        self.partitions[key[0]].set(key, value)
+
+    def clear(self):
+        for partition in self.partitions.values():
+            partition.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            f"{kind}_{stat}": value
+            for kind, partition in self.partitions.items()
+            for stat, value in partition.stats().items()
+        }
+
+
+_reply_cache = None
+_reply_cache_lock = threading.Lock()
+
+
+def reply_cache() -> ReplyCache:
+    """
+    Process-wide reply cache
+    """
+    global _reply_cache
+    with _reply_cache_lock:
+        if _reply_cache is None:
+            _reply_cache = ReplyCache(
+                settings.REPLY_CACHE_MAX_ENTRIES,
+                settings.REPLY_CACHE_TTL,
+                settings.REPLY_CACHE_OPENING_SHARE,
+            )
+    return _reply_cache
+
+
+def cache_key(
+    operation: str, topic: str, stance: str, history: List[Dict], user_text: str
+) -> Optional[Hashable]:
+    """
+    Cache key of a reply, ``None`` when the cache is off for this request.
+    Must be taken before the request is built, which appends ``user_text``
+    to ``history``.
+    """
+    if not settings.REPLY_CACHE_ENABLED or _bypassed.get():
+        return None
+    return ReplyCache.key(operation, topic, stance, history, user_text)
+
+
+def lookup(key: Optional[Hashable]):
+    return None if key is None else reply_cache().get(key)
+
+
+def store(key: Optional[Hashable], value):
+    if key is not None:
+        reply_cache().set(key, value)
+
+
+def bypassed(request) -> bool:
+    """
+    Whether the request asked not to be answered from a cache
+    """
+    directives = request.headers.get("Cache-Control", "").lower()
+    return any(
+        directive.strip() in ("no-cache", "no-store")
+        for directive in directives.split(",")
+    )
+
+
+@contextmanager
+def request_scope(request):
+    """
+    Turn the cache off for the block when ``bypassed(request)``
+    """
+    token = _bypassed.set(_bypassed.get() or bypassed(request))
+    try:
+        yield
+    finally:
+        _bypassed.reset(token)
+
+
+async def bypassing(iterator: AsyncIterator) -> AsyncIterator:
+    """
+    Iterate ``iterator`` with the cache off. A streamed response is read
+    after the view returned, outside ``request_scope``.
+    """
+    async with aclosing(iterator):
+        while True:
+            token = _bypassed.set(True)
+            try:
+                item = await anext(iterator)
+            except StopAsyncIteration:
+                return
+            finally:
+                _bypassed.reset(token)
+            yield item
+
+
+metrics.Gauges(
+    "chatbot_reply_cache",
+    "Reply cache size, hits, misses and evictions per kind of turn.",
+    ("stat",),
+    collect=lambda: reply_cache().stats(),
+)
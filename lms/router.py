@@ -0,0 +1,287 @@
+"""
+Latency-aware routing of Responses API requests across ``lms.backends``.
+
+Each attempt of the latency policy goes to the healthy backend with the
+lowest expected latency: the moving average of its recent latencies for the
+operation, inflated by its recent error rate. Backends not measured yet are
+tried first, and a small share of attempts (``LLM_ROUTER_EXPLORE``) goes to
+a random backend so a recovered one gets measured again. Each backend has
+its own circuit breaker and concurrency cap, so a retry after a failure or
+a timeout lands on another backend.
+"""
+
+import random
+import threading
+import time
+from collections import deque
+from typing import Dict, List
+
+from django.conf import settings
+
+from chatbot import metrics
+from lms import backends as llm_backends
+from lms.backends import Backend
+from lms.policy import (
+    BackendsBusy,
+    CircuitBreaker,
+    CircuitOpen,
+    aclose_response,
+    retryable_errors,
+)
+
+# Error rate past which a backend's expected latency stops growing.
+MAX_ERROR_RATE = 0.95
+
+backend_requests = metrics.Counter(
+    "chatbot_llm_backend_requests_total",
+    "Responses API attempts per backend: ok, failed (retryable), error or "
+    "cancelled.",
+    ("backend", "outcome"),
+)
+backend_latency = metrics.Histogram(
+    "chatbot_llm_backend_request_duration_seconds",
+    "Responses API attempt latency per backend, up to the first bytes for streams.",
+    ("backend",),
+)
+
+
+class NoBackendAvailable(CircuitOpen):
+    """
+    Raised without calling any backend while all their breakers are open.
+    """
+
+
+class BackendState:
+    def __init__(self, backend: Backend, breaker: CircuitBreaker):
+        self.backend = backend
+        self.breaker = breaker
+        self.in_flight = 0
+        # Moving averages: seconds per operation, share of failed attempts.
+        self.latency: Dict[str, float] = {}
+        self.error_rate = 0.0
+
+    @property
+    def full(self) -> bool:
+        cap = self.backend.max_concurrency
+        return cap > 0 and self.in_flight >= cap
+
+
+class Router:
+    """
+    Picks a backend per attempt and keeps its latency, error rate and
+    requests in flight. ``alpha`` weighs the last attempt in the moving
+    averages.
+    """
+
+    def __init__(
+        self,
+        backends: List[Backend],
+        alpha: float = 0.2,
+        explore: float = 0.0,
+        breaker_failures: int = 0,
+        breaker_reset: float = 30,
+    ):
+        if not backends:
+            raise ValueError("The router needs at least one backend.")
+        self.alpha = alpha
+        self.explore = explore
+        self.lock = threading.Lock()
+        # Slots of streams dropped without being closed, freed on the next
+        # acquire: ``__del__`` may run while this thread holds the lock.
+        self.dropped = deque()
+        self.states = [
+            BackendState(backend, CircuitBreaker(breaker_failures, breaker_reset))
+            for backend in backends
+        ]
+
+    @classmethod
+    def from_settings(cls, http_client=None, asynchronous: bool = False) -> "Router":
+        return cls(
+            llm_backends.from_settings(http_client, asynchronous),
+            alpha=settings.LLM_ROUTER_ALPHA,
+            explore=settings.LLM_ROUTER_EXPLORE,
+            breaker_failures=settings.OPENAI_BREAKER_FAILURES,
+            breaker_reset=settings.OPENAI_BREAKER_RESET,
+        )
+
+    @property
+    def backends(self) -> List[Backend]:
+        return [state.backend for state in self.states]
+
+    def create(self, operation: str, request: Dict, **kwargs):
+        """
+        ``responses.create`` on the best backend for ``operation``
+        """
+        state = self.acquire(operation)
+        started = time.monotonic()
+        outcome = "cancelled"
+        try:
+            resp = state.backend.create(request, **kwargs)
+            outcome = "ok"
+            return resp
+        except retryable_errors():
+            outcome = "failed"
+            raise
+        except Exception:
+            outcome = "error"
+            raise
+        finally:
+            self.release(state, operation, time.monotonic() - started, outcome)
+
+    async def acreate(self, operation: str, request: Dict, **kwargs):
+        """
+        Async counterpart of ``create``. A stream keeps its backend's slot
+        until it is closed.
+        """
+        state = self.acquire(operation)
+        started = time.monotonic()
+        outcome, streaming = "cancelled", False
+        try:
+            resp = await state.backend.create(request, **kwargs)
+            outcome = "ok"
+            if kwargs.get("stream"):
+                streaming = True
+                return RoutedStream(resp, self, state)
+            return resp
+        except retryable_errors():
+            outcome = "failed"
+            raise
+        except Exception:
+            outcome = "error"
+            raise
+        finally:
+            self.record(state, operation, time.monotonic() - started, outcome)
+            if not streaming:
+                self.free(state)
+
+    def acquire(self, operation: str) -> BackendState:
+        """
+        Take a slot on the backend with the lowest expected latency whose
+        breaker lets a call through.
+        """
+        with self.lock:
+            self.free_dropped()
+            healthy = [s for s in self.states if s.breaker.state != "open"]
+            candidates = [s for s in healthy if not s.full]
+            if self.explore and random.random() < self.explore:
+                random.shuffle(candidates)
+            else:
+                candidates.sort(
+                    key=lambda s: (self.expected_latency(s, operation), s.in_flight)
+                )
+
+            for state in candidates:
+                # A half-open breaker lets one trial call through.
+                if state.breaker.allow():
+                    state.in_flight += 1
+                    return state
+        if healthy:
+            raise BackendsBusy(operation)
+        raise NoBackendAvailable(operation)
+
+    def expected_latency(self, state: BackendState, operation: str) -> float:
+        latency = state.latency.get(operation, 0.0)
+        return latency / (1 - min(state.error_rate, MAX_ERROR_RATE))
+
+    def record(self, state: BackendState, operation: str, elapsed: float, outcome):
+        """
+        Update the averages with an ``ok`` or ``failed`` attempt. Timeouts
+        count with their elapsed time, so a slow backend loses its traffic.
+        Client errors (``error``) and cancelled attempts say nothing about
+        the backend's latency.
+        """
+        backend_requests.inc(backend=state.backend.name, outcome=outcome)
+        if outcome == "cancelled":
+            state.breaker.abandon()
+            return
+        if outcome == "error":
+            # The backend answered.
+            state.breaker.record_success()
+            return
+
+        backend_latency.observe(elapsed, backend=state.backend.name)
+        failed = outcome == "failed"
+        with self.lock:
+            previous = state.latency.get(operation, elapsed)
+            state.latency[operation] = previous + self.alpha * (elapsed - previous)
+            state.error_rate += self.alpha * (failed - state.error_rate)
+        if failed:
+            state.breaker.record_failure()
+        else:
+            state.breaker.record_success()
+
+    def free(self, state: BackendState):
+        with self.lock:
+            state.in_flight -= 1
+
+    def free_dropped(self):
+        """
+        Free the slots of dropped streams, with the lock held.
+        """
+        while self.dropped:
+            self.dropped.popleft().in_flight -= 1
+
+    def release(self, state: BackendState, operation: str, elapsed: float, outcome):
+        self.record(state, operation, elapsed, outcome)
+        self.free(state)
+
+    def stats(self) -> Dict[str, Dict]:
+        with self.lock:
+            self.free_dropped()
+            return {
+                state.backend.name: {
+                    "in_flight": state.in_flight,
+                    "error_rate": state.error_rate,
+                    "latency": dict(state.latency),
+                    "breaker": state.breaker.state,
+                }
+                for state in self.states
+            }
+
+
+class RoutedStream:
+    """
+    A backend stream that gives the backend's slot back once closed
+    """
+
+    def __init__(self, stream, router: Router, state: BackendState):
+        self.stream = stream
+        self.router = router
+        self.state = state
+        self.open = True
+
+    async def __aenter__(self):
+        await self.stream.__aenter__()
+        return self
+
+    async def __aexit__(self, *exc):
+        try:
+            return await self.stream.__aexit__(*exc)
+        finally:
+            self.close()
+
+    async def __aiter__(self):
+        async for event in self.stream:
+            yield event
+        self.close()
+
+    def close(self):
+        if self.open:
+            self.open = False
+            self.router.free(self.state)
+
+    async def aclose(self):
+        """
+        Close the backend stream without reading it, e.g. a losing hedge
+        """
+        try:
+            await aclose_response(self.stream)
+        finally:
+            self.close()
+
+    def __del__(self):
+        # A stream dropped without being closed. The slot is left to the
+        # router's next acquire, as the router lock is not reentrant.
+        if self.open:
+            self.open = False
+            self.router.dropped.append(self.state)
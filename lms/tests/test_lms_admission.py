@@ -0,0 +1,107 @@
+import asyncio
+import time
+import uuid
+
+import pytest
+from asgiref.sync import sync_to_async
+from django.db import connection
+
+from lms.admission import Admission, AdmissionRejected, admissions, admit_conversation
+
+
+def make_admission(**overrides):
+    options = dict(rate=0, burst=1, max_in_flight=0, max_wait=0, slot_lease=60)
+    options.update(overrides)
+    return Admission(**options)
+
+
+@pytest.mark.django_db
+def test_disabled_admission_makes_no_queries(django_assert_num_queries):
+    with django_assert_num_queries(0):
+        with make_admission().admit("debate_reply"):
+            pass
+
+
+@pytest.mark.django_db
+def test_bucket_rejects_past_the_burst_with_retry_after():
+    admission = make_admission(rate=0.01, burst=2)
+
+    for _ in range(2):
+        with admission.admit("debate_reply"):
+            pass
+    with pytest.raises(AdmissionRejected) as rejected:
+        with admission.admit("debate_reply"):
+            pass
+
+    assert rejected.value.status_code == 429
+    assert rejected.value.wait >= 90
+    assert admissions.value(operation="debate_reply", outcome="rejected") >= 1
+
+
+@pytest.mark.django_db
+def test_bucket_smooths_calls_within_the_max_wait():
+    admission = make_admission(rate=20, burst=1, max_wait=1)
+
+    started = time.monotonic()
+    for _ in range(3):
+        with admission.admit("debate_reply"):
+            pass
+
+    assert time.monotonic() - started >= 0.09
+
+
+@pytest.mark.django_db
+def test_in_flight_cap_is_shared_and_released():
+    first, second = make_admission(max_in_flight=1), make_admission(max_in_flight=1)
+
+    with first.admit("debate_reply"):
+        with pytest.raises(AdmissionRejected):
+            with second.admit("debate_reply"):
+                pass
+    with second.admit("debate_reply"):
+        pass
+
+
+@pytest.mark.django_db
+def test_expired_slot_lease_is_taken_over():
+    admission = make_admission(max_in_flight=1, slot_lease=0.01)
+
+    slot = admission.lease_slot("debate_reply", deadline=0)
+    time.sleep(0.02)
+    other = admission.lease_slot("debate_reply", deadline=0)
+    admission.release_slot(slot)
+
+    assert other[0] == slot[0]
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT holder FROM admission_slot")
+        assert cursor.fetchone()[0] == other[1]
+
+
+@pytest.mark.django_db(transaction=True)
+def test_async_admission_holds_a_slot():
+    admission = make_admission(max_in_flight=1)
+
+    async def admit_twice():
+        async with admission.aadmit("debate_reply"):
+            with pytest.raises(AdmissionRejected):
+                async with admission.aadmit("debate_reply"):
+                    pass
+        # The queries ran on the connection of asgiref's thread.
+        await sync_to_async(lambda: connection.close())()
+
+    asyncio.run(admit_twice())
+    with admission.admit("debate_reply"):
+        pass
+
+
+@pytest.mark.django_db
+def test_conversation_posts_closer_than_the_interval_are_rejected(settings):
+    settings.ADMISSION_CONVERSATION_INTERVAL = 30
+    conversation_id = uuid.uuid4()
+
+    admit_conversation(conversation_id)
+    admit_conversation(uuid.uuid4())
+    with pytest.raises(AdmissionRejected) as rejected:
+        admit_conversation(conversation_id)
+
+    assert 29 <= rejected.value.wait <= 30
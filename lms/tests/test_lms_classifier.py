@@ -0,0 +1,99 @@
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from lms import OpenAIClient, classifier
+from lms.cache import TTLCache
+
+
+@pytest.mark.parametrize(
+    "message", ["hola", "Hello!", "hi there, how are you?", "Buenos días"]
+)
+def test_preclassify_answers_small_talk(message):
+    topic, stance, response = classifier.preclassify(message)
+
+    assert (topic, stance) == ("und", "und")
+    assert response
+
+
+def test_preclassify_replies_in_spanish():
+    _, _, response = classifier.preclassify("hola, ¿qué tal?")
+
+    assert response == classifier.SMALL_TALK_REPLY["es"]
+
+
+@pytest.mark.parametrize(
+    "message,expected",
+    [
+        ("You are against nuclear energy", ("nuclear energy", "con")),
+        ("you're in favor of remote work.", ("remote work", "pro")),
+        ("Tú estás a favor de la energía nuclear", ("energía nuclear", "pro")),
+        ("Estás en contra del trabajo remoto", ("trabajo remoto", "con")),
+    ],
+)
+def test_preclassify_keeps_assigned_stance(message, expected):
+    topic, stance, response = classifier.preclassify(message)
+
+    assert (topic, stance) == expected
+    assert topic in response
+
+
+@pytest.mark.parametrize(
+    "message",
+    [
+        "Is AI safe?",
+        "I am pro nuclear energy",
+        "hello, I think taxes on sugar are a good idea",
+        "You are against remote work because teams lose culture, prove me wrong",
+    ],
+)
+def test_preclassify_leaves_real_openings_to_the_model(message):
+    assert classifier.preclassify(message) is None
+
+
+@pytest.mark.django_db
+@patch("openai.OpenAI")
+def test_get_topic_and_stance_skips_model_for_greetings(MockOpenAI):
+    client = OpenAIClient()
+
+    topic, _, _ = client.get_topic_and_stance("hola")
+
+    assert topic == "und"
+    MockOpenAI.return_value.responses.create.assert_not_called()
+
+
+@pytest.mark.django_db
+@patch("openai.OpenAI")
+def test_get_topic_and_stance_caches_normalized_openings(MockOpenAI):
+    mock_resp = MagicMock()
+    mock_resp.output_text = '{"topic": "AI", "bot_stance": "pro", "response": "Hi"}'
+    MockOpenAI.return_value.responses.create.return_value = mock_resp
+    client = OpenAIClient()
+
+    first = client.get_topic_and_stance("Is AI safe?")
+    second = client.get_topic_and_stance("  is ai SAFE ")
+
+    assert first == second == ("AI", "pro", "Hi")
+    MockOpenAI.return_value.responses.create.assert_called_once()
+    assert classifier.topic_cache().stats()["hits"] == 1
+
+
+def test_ttl_cache_evicts_least_recently_used():
+    cache = TTLCache(max_entries=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.stats() == {"size": 2, "hits": 2, "misses": 1, "evictions": 1}
+
+
+def test_ttl_cache_expires_entries():
+    cache = TTLCache(max_entries=2, ttl=60)
+    cache.set("a", 1)
+
+    with patch("lms.cache.time.monotonic", return_value=10**9):
+        assert cache.get("a") is None
+    assert cache.stats()["size"] == 0
@@ -1,16 +1,24 @@
+import asyncio
+
+import httpx
 import pytest
-from unittest.mock import MagicMock, patch
+from unittest.mock import AsyncMock, MagicMock, patch
 
 from chatbot import settings
-from lms import OpenAIClient
+from lms import AsyncOpenAIClient, OpenAIClient, StreamInterrupted, malformed
 
 
 @pytest.mark.django_db
-@patch("lms.OpenAI")
+@patch("openai.OpenAI")
 def test_openai_client_initialization(MockOpenAI):
     client = OpenAIClient()
 
-    MockOpenAI.assert_called_once_with(api_key=settings.API_KEY)
+    MockOpenAI.assert_called_once_with(
+        api_key=settings.API_KEY,
+        base_url=settings.OPENAI_BASE_URL,
+        http_client=None,
+        max_retries=0,
+    )
 
     assert client.model == settings.OPENAI_MODEL
     assert client.max_output_tokens == settings.OPENAI_MAX_OUTPUT_TOKENS
@@ -18,7 +26,7 @@ def test_openai_client_initialization(MockOpenAI):
 
 
 @pytest.mark.django_db
-@patch("lms.OpenAI")
+@patch("openai.OpenAI")
 def test_get_topic_and_stance_parses_response(MockOpenAI, settings):
     mock_instance = MockOpenAI.return_value
     mock_resp = MagicMock()
@@ -36,7 +44,62 @@ def test_get_topic_and_stance_parses_response(MockOpenAI, settings):
 
 
 @pytest.mark.django_db
-@patch("lms.OpenAI")
+@patch("openai.OpenAI")
+def test_malformed_topic_and_stance_is_not_cached(MockOpenAI, settings):
+    mock_instance = MockOpenAI.return_value
+    mock_instance.responses.create.return_value = MagicMock(
+        output_text='{"topic": "AI", "bot_stance": "maybe"'
+    )
+    before = malformed.value(operation="get_topic_and_stance")
+
+    client = OpenAIClient()
+    first = client.get_topic_and_stance("Is AI dangerous?")
+    second = client.get_topic_and_stance("Is AI dangerous?")
+
+    assert first[:2] == ("und", "und")
+    assert first == second
+    assert mock_instance.responses.create.call_count == 2
+    assert malformed.value(operation="get_topic_and_stance") == before + 2
+
+
+@pytest.mark.django_db
+@patch("openai.OpenAI")
+def test_classify_and_reply_is_one_schema_constrained_call(MockOpenAI, settings):
+    mock_instance = MockOpenAI.return_value
+    text = '{"topic": "Remote work", "bot_stance": "con", "response": "Offices!"}'
+    mock_instance.responses.create.return_value = MagicMock(output_text=text)
+    history = [{"role": "user", "content": "Hi"}]
+
+    client = OpenAIClient()
+    result = client.classify_and_reply("Remote work is better, I think", history)
+
+    assert result == ("Remote work", "con", "Offices!")
+    mock_instance.responses.create.assert_called_once()
+    kwargs = mock_instance.responses.create.call_args.kwargs
+    assert kwargs["text"]["format"]["type"] == "json_schema"
+    assert kwargs["text"]["format"]["strict"] is True
+    assert kwargs["input"][1:] == [
+        {"role": "user", "content": "Hi"},
+        {"role": "user", "content": "Remote work is better, I think"},
+    ]
+
+
+@pytest.mark.django_db
+@patch("openai.OpenAI")
+def test_classify_and_reply_with_known_stance_only_asks_for_reply(MockOpenAI):
+    mock_instance = MockOpenAI.return_value
+    mock_instance.responses.create.return_value = MagicMock(output_text="Nope.")
+
+    client = OpenAIClient()
+    result = client.classify_and_reply("You are against homework", [])
+
+    assert result == ("homework", "con", "Nope.")
+    kwargs = mock_instance.responses.create.call_args.kwargs
+    assert "text" not in kwargs
+
+
+@pytest.mark.django_db
+@patch("openai.OpenAI")
 def test_debate_reply_returns_bot_text(MockOpenAI, settings):
     mock_instance = MockOpenAI.return_value
     mock_resp = MagicMock()
@@ -49,3 +112,95 @@ def test_debate_reply_returns_bot_text(MockOpenAI, settings):
 
     assert "Counter argument!" in response
     mock_instance.responses.create.assert_called_once()
+
+
+@pytest.mark.django_db
+@patch("openai.AsyncOpenAI")
+def test_async_client_debate_reply_awaits_responses(MockAsyncOpenAI, settings):
+    mock_instance = MockAsyncOpenAI.return_value
+    mock_resp = MagicMock()
+    mock_resp.output_text = "Async counter argument!"
+    mock_instance.responses.create = AsyncMock(return_value=mock_resp)
+
+    client = AsyncOpenAIClient()
+    response = asyncio.run(client.debate_reply("AI", "con", [], "But I like AI"))
+
+    assert response == "Async counter argument!"
+    MockAsyncOpenAI.assert_called_once_with(
+        api_key=settings.API_KEY,
+        base_url=settings.OPENAI_BASE_URL,
+        http_client=None,
+        max_retries=0,
+    )
+    kwargs = mock_instance.responses.create.await_args.kwargs
+    assert kwargs["input"][-1] == {"role": "user", "content": "But I like AI"}
+
+
+class FakeStream:
+    def __init__(self, events, error=None):
+        self.events = events
+        self.error = error
+        self.closed = False
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        self.closed = True
+
+    async def __aiter__(self):
+        for event in self.events:
+            yield event
+        if self.error:
+            raise self.error
+
+
+@pytest.mark.django_db
+@patch("openai.AsyncOpenAI")
+def test_stream_debate_reply_yields_deltas_and_closes_upstream(MockAsyncOpenAI):
+    stream = FakeStream(
+        [
+            MagicMock(type="response.created"),
+            MagicMock(type="response.output_text.delta", delta="Hel"),
+            MagicMock(type="response.output_text.delta", delta="lo"),
+        ]
+    )
+    MockAsyncOpenAI.return_value.responses.create = AsyncMock(return_value=stream)
+    client = AsyncOpenAIClient()
+
+    async def first_delta():
+        deltas = client.stream_debate_reply("AI", "con", [], "Hi")
+        first = await deltas.__anext__()
+        await deltas.aclose()
+        return first
+
+    assert asyncio.run(first_delta()) == "Hel"
+    assert stream.closed
+    kwargs = MockAsyncOpenAI.return_value.responses.create.await_args.kwargs
+    assert kwargs["stream"] is True
+
+
+@pytest.mark.django_db
+@patch("openai.AsyncOpenAI")
+def test_stream_debate_reply_error_mid_stream_raises_stream_interrupted(
+    MockAsyncOpenAI,
+):
+    stream = FakeStream(
+        [
+            MagicMock(type="response.output_text.delta", delta="Hel"),
+            MagicMock(type="response.output_text.delta", delta="lo"),
+        ],
+        error=httpx.RemoteProtocolError("peer closed connection"),
+    )
+    MockAsyncOpenAI.return_value.responses.create = AsyncMock(return_value=stream)
+    client = AsyncOpenAIClient()
+    deltas = []
+
+    async def read():
+        async for delta in client.stream_debate_reply("AI", "con", [], "Hi"):
+            deltas.append(delta)
+
+    with pytest.raises(StreamInterrupted):
+        asyncio.run(read())
+    assert deltas == ["Hel", "lo"]
+    assert stream.closed
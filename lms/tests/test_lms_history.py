@@ -0,0 +1,39 @@
+from types import SimpleNamespace
+
+from lms.history import estimate_tokens, fit_to_budget, split_for_summary
+
+
+def message(text, role="user"):
+    return {"role": role, "content": text}
+
+
+def test_fit_to_budget_keeps_most_recent_messages_oldest_first():
+    messages = [message("a" * 40), message("b" * 40), message("c" * 40)]
+
+    prompt = fit_to_budget("", messages, budget=2 * estimate_tokens("a" * 40))
+
+    assert [m["content"][0] for m in prompt] == ["b", "c"]
+
+
+def test_fit_to_budget_puts_summary_first_and_counts_it():
+    messages = [message("a" * 40), message("b" * 40)]
+    budget = estimate_tokens("Summary of the earlier debate: S") + estimate_tokens(
+        "b" * 40
+    )
+
+    prompt = fit_to_budget("S", messages, budget)
+
+    assert prompt[0] == {
+        "role": "system",
+        "content": "Summary of the earlier debate: S",
+    }
+    assert [m["content"][0] for m in prompt[1:]] == ["b"]
+
+
+def test_split_for_summary_folds_every_n_turns(settings):
+    settings.HISTORY_RECENT_TURNS = 1
+    settings.HISTORY_SUMMARY_EVERY_TURNS = 2
+    messages = [SimpleNamespace(message=str(i)) for i in range(6)]
+
+    assert split_for_summary(messages[:5]) == ([], messages[:5])
+    assert split_for_summary(messages) == (messages[:4], messages[4:])
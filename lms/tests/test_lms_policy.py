@@ -0,0 +1,234 @@
+import asyncio
+import time
+
+import openai
+import pytest
+
+from benchmarks.fake_openai import FakeConfig, FakeOpenAIServer
+from chatbot import metrics
+from lms import AsyncOpenAIClient, OpenAIClient
+from lms.policy import (
+    FALLBACK_REPLY,
+    CircuitBreaker,
+    CircuitOpen,
+    LatencyPolicy,
+    hedges,
+)
+
+
+def make_policy(**overrides):
+    options = dict(
+        deadline=5,
+        attempt_timeout=2,
+        connect_timeout=1,
+        max_retries=2,
+        backoff=0.01,
+        backoff_max=0.05,
+        hedge_percentile=0,
+        hedge_min_samples=1,
+        breaker=CircuitBreaker(failures=0, reset_after=30),
+    )
+    options.update(overrides)
+    return LatencyPolicy(**options)
+
+
+@pytest.fixture
+def fake_openai(settings):
+    server = FakeOpenAIServer(FakeConfig(latency=0, jitter=0, reply_tokens=3))
+    server.start()
+    settings.OPENAI_BASE_URL = server.base_url
+    settings.API_KEY = "test"
+    yield server
+    server.stop()
+
+
+def test_slow_upstream_is_cut_at_the_deadline(fake_openai):
+    fake_openai.config.latency = 2
+    client = OpenAIClient(
+        policy=make_policy(attempt_timeout=0.2, deadline=1, max_retries=5)
+    )
+
+    started = time.monotonic()
+    reply = client.debate_reply("AI", "pro", [], "AI is great")
+
+    assert time.monotonic() - started < 1.5
+    assert reply == FALLBACK_REPLY["en"]
+    assert fake_openai.requests >= 2
+
+
+def test_server_errors_are_retried(fake_openai):
+    fake_openai.config.fail_first = 2
+    client = OpenAIClient(policy=make_policy(max_retries=2))
+
+    reply = client.debate_reply("AI", "pro", [], "AI is great")
+
+    assert reply != FALLBACK_REPLY["en"]
+    assert fake_openai.requests == 3
+
+
+def test_client_errors_are_not_retried(fake_openai):
+    fake_openai.config.error_rate = 1
+    fake_openai.config.error_status = 400
+    client = OpenAIClient(policy=make_policy(max_retries=2))
+
+    with pytest.raises(openai.BadRequestError):
+        client.debate_reply("AI", "pro", [], "AI is great")
+    assert fake_openai.requests == 1
+
+
+def test_open_circuit_fails_fast_with_canned_reply(fake_openai):
+    fake_openai.config.error_rate = 1
+    breaker = CircuitBreaker(failures=2, reset_after=30)
+    client = OpenAIClient(policy=make_policy(max_retries=0, breaker=breaker))
+
+    for _ in range(3):
+        reply = client.debate_reply("IA", "pro", [], "Hola, la IA es buena")
+
+    assert reply == FALLBACK_REPLY["es"]
+    assert breaker.state == "open"
+    assert fake_openai.requests == 2
+    topic, stance, _ = client.get_topic_and_stance("Remote work is better")
+    assert (topic, stance) == ("und", "und")
+    assert client.summarize("Earlier summary.", []) is None
+
+
+def test_async_client_uses_the_policy(fake_openai):
+    fake_openai.config.fail_first = 1
+    client = AsyncOpenAIClient(policy=make_policy(max_retries=1))
+
+    reply = asyncio.run(client.debate_reply("AI", "pro", [], "AI is great"))
+
+    assert reply != FALLBACK_REPLY["en"]
+    assert fake_openai.requests == 2
+
+
+def test_breaker_half_opens_after_reset():
+    now = [0.0]
+    breaker = CircuitBreaker(failures=1, reset_after=10, clock=lambda: now[0])
+
+    breaker.record_failure()
+    assert not breaker.allow()
+
+    now[0] = 11
+    assert breaker.state == "half-open"
+    assert breaker.allow()
+    assert not breaker.allow()  # one trial at a time
+
+    breaker.record_success()
+    assert breaker.state == "closed"
+    assert breaker.allow()
+
+
+def test_breaker_rejects_calls_while_open():
+    policy = make_policy(breaker=CircuitBreaker(failures=1, reset_after=30))
+    policy.breaker.record_failure()
+
+    with pytest.raises(CircuitOpen):
+        policy.call("debate_reply", lambda timeout: "never")
+
+
+def test_slow_attempt_is_hedged():
+    metrics.reset()
+    policy = make_policy(hedge_percentile=50)
+    policy.succeeded("debate_reply", 0.05)
+    calls = []
+
+    def request(timeout):
+        calls.append(timeout)
+        if len(calls) == 1:
+            time.sleep(1)
+            return "slow"
+        return "fast"
+
+    started = time.monotonic()
+    assert policy.call("debate_reply", request) == "fast"
+    assert time.monotonic() - started < 0.5
+    assert hedges.value(operation="debate_reply") == 1
+
+
+def test_slow_async_attempt_is_hedged_and_loser_cancelled():
+    policy = make_policy(hedge_percentile=50)
+    policy.succeeded("debate_reply", 0.05)
+    cancelled = []
+
+    async def request(timeout):
+        if not cancelled:
+            cancelled.append(False)
+            try:
+                await asyncio.sleep(1)
+            except asyncio.CancelledError:
+                cancelled[0] = True
+                raise
+            return "slow"
+        return "fast"
+
+    async def run():
+        result = await policy.acall("debate_reply", request)
+        await asyncio.sleep(0)
+        return result
+
+    assert asyncio.run(run()) == "fast"
+    assert cancelled == [True]
+
+
+class Response:
+    def __init__(self, name):
+        self.name = name
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class AsyncResponse(Response):
+    async def close(self):
+        self.closed = True
+
+
+def test_losing_hedge_is_closed_when_it_finishes():
+    policy = make_policy(hedge_percentile=50)
+    policy.succeeded("debate_reply", 0.05)
+    slow, fast = Response("slow"), Response("fast")
+    calls = []
+
+    def request(timeout):
+        calls.append(timeout)
+        if len(calls) == 1:
+            time.sleep(0.3)
+            return slow
+        return fast
+
+    assert policy.call("debate_reply", request) is fast
+
+    deadline = time.monotonic() + 2
+    while not slow.closed and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert slow.closed
+    assert not fast.closed
+
+
+def test_async_hedges_finishing_together_close_the_loser():
+    policy = make_policy(hedge_percentile=50)
+    policy.succeeded("debate_reply", 0.05)
+    responses = [AsyncResponse("first"), AsyncResponse("second")]
+    calls = []
+
+    async def run():
+        gate = asyncio.Event()
+
+        async def request(timeout):
+            calls.append(timeout)
+            if len(calls) == 1:
+                await gate.wait()
+                return responses[0]
+            gate.set()
+            # Let the first request finish in the same round.
+            await asyncio.sleep(0)
+            return responses[1]
+
+        return await policy.acall("debate_reply", request)
+
+    winner = asyncio.run(run())
+
+    assert winner in responses
+    assert [r.closed for r in responses] == [r is not winner for r in responses]
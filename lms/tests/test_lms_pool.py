@@ -0,0 +1,101 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
+
+import pytest
+from asgiref.sync import async_to_sync
+
+import lms
+from lms import pool
+
+
+class KeepAliveHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        body = b"ok"
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), KeepAliveHandler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+@pytest.fixture(autouse=True)
+def clean_pool():
+    lms.reset_clients()
+    pool.stats.reset()
+    yield
+    lms.reset_clients()
+
+
+def test_get_client_is_shared_within_a_process():
+    assert lms.get_client() is lms.get_client()
+
+
+def test_get_client_is_rebuilt_after_fork():
+    parent = lms.get_client()
+    with patch("lms.os.getpid", return_value=-1):
+        child = lms.get_client()
+
+    assert child is not parent
+    assert (
+        child.router.backends[0].client._client
+        is not parent.router.backends[0].client._client
+    )
+
+
+def test_pool_settings_are_applied(settings):
+    settings.OPENAI_POOL_MAX_CONNECTIONS = 7
+    settings.OPENAI_TIMEOUT = 12.0
+
+    client = lms.get_client()
+
+    sdk = client.router.backends[0].client
+    assert sdk.timeout.read == 12.0
+    assert sdk._client._transport._pool._max_connections == 7
+
+
+def test_pooled_http_client_reuses_sockets(server):
+    with pool.build_http_client() as http:
+        for _ in range(3):
+            assert http.get(server).status_code == 200
+
+    assert pool.stats.snapshot() == {
+        "requests": 3,
+        "connections_opened": 1,
+        "connections_reused": 2,
+    }
+
+
+def test_async_client_is_shared_and_each_loop_closes_its_pool(server):
+    seen = []
+
+    async def request():
+        client = lms.get_async_client()
+        http = client.router.backends[0].client._client
+        assert (await http.get(server)).status_code == 200
+        seen.append((client, await http.loop_client()))
+
+    # One loop per call, as async views get under WSGI.
+    async_to_sync(request)()
+    async_to_sync(request)()
+
+    (first, first_pool), (second, second_pool) = seen
+    assert first is second
+    assert first_pool is not second_pool
+    for loop_pool in (first_pool, second_pool):
+        assert loop_pool.is_closed
+        assert loop_pool._transport._pool.connections == []
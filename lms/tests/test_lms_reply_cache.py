@@ -0,0 +1,163 @@
+import asyncio
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from django.test import RequestFactory
+
+from lms import AsyncOpenAIClient, OpenAIClient, reply_cache
+from lms.reply_cache import ReplyCache
+
+OPENING = [
+    {"role": "user", "content": "Remote work"},
+    {"role": "system", "content": "I will argue against remote work."},
+]
+
+
+@pytest.fixture
+def enabled(settings):
+    settings.REPLY_CACHE_ENABLED = True
+
+
+def reply(text):
+    resp = MagicMock()
+    resp.output_text = text
+    return resp
+
+
+@pytest.mark.django_db
+@patch("openai.OpenAI")
+def test_debate_reply_is_cached_on_normalized_turns(MockOpenAI, enabled):
+    create = MockOpenAI.return_value.responses.create
+    create.return_value = reply("Offices build trust.")
+    client = OpenAIClient()
+
+    first = client.debate_reply("Remote work", "con", list(OPENING), "It's cheaper!")
+    second = client.debate_reply("remote WORK", "con", list(OPENING), "  it's CHEAPER ")
+
+    assert first == second == "Offices build trust."
+    create.assert_called_once()
+    assert reply_cache.lookups.value(kind="opening", outcome="hit") >= 1
+    assert reply_cache.reply_cache().stats()["opening_size"] == 1
+
+
+@pytest.mark.django_db
+@patch("openai.OpenAI")
+def test_reply_cache_is_off_by_default(MockOpenAI):
+    create = MockOpenAI.return_value.responses.create
+    create.return_value = reply("Offices build trust.")
+    client = OpenAIClient()
+
+    for _ in range(2):
+        client.debate_reply("Remote work", "con", list(OPENING), "It's cheaper")
+
+    assert create.call_count == 2
+
+
+@pytest.mark.django_db
+@patch("openai.OpenAI")
+def test_different_history_is_a_different_turn(MockOpenAI, enabled):
+    create = MockOpenAI.return_value.responses.create
+    create.return_value = reply("Offices build trust.")
+    client = OpenAIClient()
+    later = [*OPENING, {"role": "user", "content": "Commutes"}]
+
+    client.debate_reply("Remote work", "con", list(OPENING), "It's cheaper")
+    client.debate_reply("Remote work", "con", later, "It's cheaper")
+    client.debate_reply("Remote work", "pro", list(OPENING), "It's cheaper")
+
+    assert create.call_count == 3
+    assert reply_cache.reply_cache().stats()["turn_size"] == 1
+
+
+@pytest.mark.django_db
+@patch("openai.OpenAI")
+def test_malformed_combined_reply_is_not_cached(MockOpenAI, enabled):
+    create = MockOpenAI.return_value.responses.create
+    create.return_value = reply("not json")
+    client = OpenAIClient()
+
+    for _ in range(2):
+        client.classify_and_reply("Is homework useful?", list(OPENING))
+
+    assert create.call_count == 2
+
+
+@pytest.mark.django_db
+@patch("openai.OpenAI")
+def test_no_cache_request_neither_reads_nor_fills_the_cache(MockOpenAI, enabled):
+    create = MockOpenAI.return_value.responses.create
+    create.return_value = reply("Offices build trust.")
+    client = OpenAIClient()
+    request = RequestFactory().post("/", HTTP_CACHE_CONTROL="max-age=0, no-cache")
+
+    with reply_cache.request_scope(request):
+        client.debate_reply("Remote work", "con", list(OPENING), "It's cheaper")
+    client.debate_reply("Remote work", "con", list(OPENING), "It's cheaper")
+    with reply_cache.request_scope(request):
+        client.debate_reply("Remote work", "con", list(OPENING), "It's cheaper")
+
+    assert create.call_count == 3
+    assert reply_cache.reply_cache().stats()["opening_size"] == 1
+
+
+def test_opening_share_is_kept_from_later_turns(settings):
+    cache = ReplyCache(max_entries=4, ttl=60, opening_share=0.5)
+    opening = cache.key("debate_reply", "AI", "pro", [], "Hi")
+    cache.set(opening, "Opening reply")
+    for i in range(5):
+        history = [{"role": "user", "content": str(n)} for n in range(3)]
+        cache.set(cache.key("debate_reply", "AI", "pro", history, str(i)), i)
+
+    assert cache.get(opening) == "Opening reply"
+    stats = cache.stats()
+    assert (stats["opening_size"], stats["turn_size"]) == (1, 2)
+    assert stats["turn_evictions"] == 3
+
+
+class FakeStream:
+    def __init__(self, events):
+        self.events = events
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        pass
+
+    async def __aiter__(self):
+        for event in self.events:
+            yield event
+
+
+def stream_events():
+    return FakeStream(
+        [
+            MagicMock(type="response.output_text.delta", delta="Offices "),
+            MagicMock(type="response.output_text.delta", delta="build trust."),
+            MagicMock(type="response.completed"),
+        ]
+    )
+
+
+async def read(deltas):
+    return [delta async for delta in deltas]
+
+
+@pytest.mark.django_db
+@patch("openai.AsyncOpenAI")
+def test_streamed_reply_is_cached_once_complete(MockAsyncOpenAI, enabled):
+    create = MockAsyncOpenAI.return_value.responses.create = AsyncMock(
+        side_effect=lambda **kwargs: stream_events()
+    )
+    client = AsyncOpenAIClient()
+
+    def stream():
+        return client.stream_debate_reply("AI", "con", list(OPENING), "Hi")
+
+    assert asyncio.run(read(stream())) == ["Offices ", "build trust."]
+    assert asyncio.run(read(stream())) == ["Offices build trust."]
+    assert asyncio.run(read(reply_cache.bypassing(stream()))) == [
+        "Offices ",
+        "build trust.",
+    ]
+    assert create.await_count == 2
@@ -0,0 +1,174 @@
+import asyncio
+import json
+
+import pytest
+
+from lms import AsyncOpenAIClient, OpenAIClient, TURN_SCHEMA, backends
+from lms.backends import LocalBackend, OpenAIBackend
+from lms.policy import FALLBACK_REPLY, BackendsBusy, CircuitBreaker, LatencyPolicy
+from lms.router import NoBackendAvailable, Router, backend_requests
+
+
+def make_policy(**overrides):
+    options = dict(
+        deadline=5,
+        attempt_timeout=2,
+        connect_timeout=1,
+        max_retries=2,
+        backoff=0.001,
+        backoff_max=0.005,
+        hedge_percentile=0,
+        hedge_min_samples=1,
+        breaker=CircuitBreaker(failures=0, reset_after=30),
+    )
+    options.update(overrides)
+    return LatencyPolicy(**options)
+
+
+def test_traffic_goes_to_the_fastest_backend():
+    backend_requests.clear()
+    router = Router([LocalBackend("slow", latency=0.02), LocalBackend("fast")])
+    client = OpenAIClient(policy=make_policy(), router=router)
+
+    for i in range(6):
+        client.debate_reply("AI", "pro", [], f"Argument {i}")
+
+    # Unmeasured backends are tried first, then the fastest one wins.
+    assert backend_requests.value(backend="slow", outcome="ok") == 1
+    assert backend_requests.value(backend="fast", outcome="ok") == 5
+    assert router.stats()["slow"]["latency"]["debate_reply"] > 0.01
+
+
+def test_retry_after_a_timeout_goes_to_another_backend():
+    router = Router(
+        [LocalBackend("stuck", latency=5), LocalBackend("healthy", latency=0.01)],
+        breaker_failures=1,
+    )
+    client = OpenAIClient(policy=make_policy(attempt_timeout=0.05), router=router)
+
+    reply = client.debate_reply("AI", "pro", [], "AI is great")
+
+    assert reply != FALLBACK_REPLY["en"]
+    stats = router.stats()
+    assert stats["stuck"]["breaker"] == "open"
+    assert stats["stuck"]["error_rate"] > 0
+    assert stats["healthy"]["error_rate"] == 0
+
+
+def test_open_breakers_answer_with_the_fallback():
+    router = Router([LocalBackend("stuck", latency=5)], breaker_failures=1)
+    client = OpenAIClient(policy=make_policy(attempt_timeout=0.01), router=router)
+
+    assert client.debate_reply("AI", "pro", [], "AI is great") == FALLBACK_REPLY["en"]
+    with pytest.raises(NoBackendAvailable):
+        router.acquire("debate_reply")
+    assert client.debate_reply("AI", "pro", [], "AI is great") == FALLBACK_REPLY["en"]
+
+
+def test_concurrency_caps_are_respected():
+    router = Router(
+        [LocalBackend("a", max_concurrency=1), LocalBackend("b", max_concurrency=1)]
+    )
+
+    first, second = router.acquire("op"), router.acquire("op")
+
+    assert {first.backend.name, second.backend.name} == {"a", "b"}
+    with pytest.raises(BackendsBusy):
+        router.acquire("op")
+    router.free(first)
+    assert router.acquire("op") is first
+
+
+def test_local_backend_is_deterministic():
+    client = OpenAIClient(router=Router([LocalBackend()]))
+    history = [{"role": "user", "content": "Remote work"}]
+
+    first = client.debate_reply("Remote work", "con", list(history), "It's cheaper")
+    second = client.debate_reply("Remote work", "con", list(history), "It's cheaper")
+    topic, stance, _ = client.get_topic_and_stance("Remote work is the future")
+
+    assert first == second
+    assert first != client.debate_reply("Remote work", "con", [], "Commutes")
+    assert (topic, stance) == ("Remote work is the", "con")
+
+
+def test_local_backend_answers_the_turn_schema():
+    resp = LocalBackend(model="local-model").create(
+        {"model": "gpt", "input": [{"role": "user", "content": "Taxes"}], "text": {}}
+    )
+
+    data = json.loads(resp.output_text)
+    assert set(data) == set(TURN_SCHEMA["schema"]["properties"])
+    assert resp.model == "gpt"
+    assert LocalBackend(model="local-model").prepare({"model": "gpt"}) == {
+        "model": "local-model"
+    }
+
+
+def test_stream_holds_its_slot_until_closed():
+    router = Router([LocalBackend(asynchronous=True, max_concurrency=1)])
+    client = AsyncOpenAIClient(router=router)
+
+    async def read():
+        deltas = []
+        async for delta in client.stream_debate_reply("AI", "con", [], "Hi"):
+            deltas.append(delta)
+            assert router.stats()["local"]["in_flight"] == 1
+        return deltas
+
+    deltas = asyncio.run(read())
+
+    assert len(deltas) > 1
+    assert "".join(deltas) == asyncio.run(client.debate_reply("AI", "con", [], "Hi"))
+    assert router.stats()["local"]["in_flight"] == 0
+
+
+def test_exhausted_or_dropped_streams_free_their_slot():
+    router = Router([LocalBackend(asynchronous=True, max_concurrency=1)])
+    request = {"input": [{"role": "user", "content": "Hi"}]}
+
+    async def exhaust():
+        stream = await router.acreate("stream_debate_reply", request, stream=True)
+        events = [event async for event in stream]
+        assert router.stats()["local"]["in_flight"] == 0
+        return events
+
+    assert asyncio.run(exhaust())[-1].type == "response.completed"
+
+    stream = asyncio.run(router.acreate("stream_debate_reply", request, stream=True))
+    # Dropped while the router lock is held, as from a GC pass in acquire.
+    with router.lock:
+        del stream
+    assert router.stats()["local"]["in_flight"] == 0
+
+
+def test_local_backend_streams_synchronously():
+    backend = LocalBackend()
+    request = {"input": [{"role": "user", "content": "Taxes"}]}
+
+    with backend.create(request, stream=True) as stream:
+        events = list(stream)
+
+    assert events[-1].type == "response.completed"
+    text = "".join(event.delta for event in events[:-1])
+    assert text == backend.create(request).output_text
+
+
+def test_backends_from_settings(settings):
+    settings.API_KEY = "default-key"
+    settings.LLM_BACKENDS = [
+        {"name": "primary", "max_concurrency": 8},
+        {"name": "vllm", "base_url": "http://vllm:8000/v1", "model": "llama"},
+        {"name": "local", "kind": "local", "latency": 0.1},
+    ]
+
+    primary, vllm, local = backends.from_settings()
+
+    assert isinstance(primary, OpenAIBackend)
+    assert (primary.client.api_key, primary.max_concurrency) == ("default-key", 8)
+    assert (str(vllm.client.base_url), vllm.model) == ("http://vllm:8000/v1/", "llama")
+    assert isinstance(local, LocalBackend) and local.latency == 0.1
+
+    settings.LLM_BACKENDS = [{"name": "x", "kind": "grpc"}]
+    with pytest.raises(ValueError):
+        backends.from_settings()